@@ -1,7 +1,9 @@
-import os, io, json, zipfile, re, tempfile, shutil
+import os, json, time, zipfile, re, tempfile, shutil, sqlite3, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 from datetime import datetime
 from pathlib import Path
-from flask import Flask, render_template, request, send_file, abort
+from flask import Flask, Request, render_template, request, send_file, abort, make_response, jsonify
 from dotenv import load_dotenv, find_dotenv
 
 # ---------- .env + cleanup ----------
@@ -36,16 +38,33 @@ if os.path.exists(dotenv_override):
 print("DOTENV used from:", dotenv_main or "NOT FOUND")
 
 # ---------- Flask ----------
+UPLOAD_MAX_MB = int(os.getenv("UPLOAD_MAX_MB") or 25)
+UPLOAD_SPOOL_KB = int(os.getenv("UPLOAD_SPOOL_KB") or 512)
+
+class SpooledRequest(Request):
+    # uploads πάνω από UPLOAD_SPOOL_KB πάνε σε temp file αντί για RAM
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_KB * 1024, mode="rb+")
+
 app = Flask(__name__)
+app.request_class = SpooledRequest
 app.secret_key = os.getenv("SECRET_KEY") or "dev-secret"
+app.config["MAX_CONTENT_LENGTH"] = UPLOAD_MAX_MB * 1024 * 1024
+
+# ---------- HTTP caching (fingerprinted static, immutable outputs, ETag/Range) ----------
+from http_cache import init_app as init_http_cache
+init_http_cache(app)
 
 # ---------- OpenAI ----------
-from openai import OpenAI
+from openai_client import make_openai_client, make_timeout, start_warm_up, pool_stats as openai_pool_stats
+from openai_limits import create_completion, limits_stats
+from openai_hedge import hedged_completion, hedge_stats, OPENAI_HEDGE
+from local_captions import generate_local
 _raw_key = os.getenv("OPENAI_API_KEY")
 OPENAI_KEY = _clean_val(_raw_key)
 _bad = [(i, hex(ord(c))) for i,c in enumerate(OPENAI_KEY) if (ord(c)>127 or c.isspace())]
 print(f"OPENAI DEBUG len={len(OPENAI_KEY)} last6={OPENAI_KEY[-6:] if OPENAI_KEY else 'EMPTY'} bad={_bad if _bad else 'OK'}")
-client = OpenAI(api_key=OPENAI_KEY) if OPENAI_KEY else None
+client = make_openai_client(OPENAI_KEY)   # pooled/keep-alive transport (openai_client.py)
 
 # ---------- Cloudinary ----------
 import cloudinary, cloudinary.uploader
@@ -66,6 +85,8 @@ STATIC_DIR = BASE_DIR / "static"
 OUTPUT_DIR = STATIC_DIR / "outputs"
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 LOG_PATH = BASE_DIR / "logs.json"  # JSON array
+OUTPUT_EXTS = (".jpg", ".webp", ".avif")
+GALLERY_PAGE_SIZE = int(os.getenv("GALLERY_PAGE_SIZE") or 48)
 
 ASPECT_SIZES = {
     "1:1": (1024,1024), "9:16": (1024,1820), "4:5": (1024,1280), "16:9": (1280,720),
@@ -122,22 +143,54 @@ def _json_safety(txt: str):
         txt = re.sub(r"^```(?:json)?\s*|\s*```$", "", txt.strip(), flags=re.MULTILINE)
     return txt.strip()
 
-def generate_captions(topic, n=6, platform="Instagram", kind="all", lang="el",
-                      tone="energetic", keywords="", want_emojis=True, want_hashtags=True,
-                      model="gpt-4o-mini"):
+CAPTION_SYSTEM = ("You are a concise social media copywriter. "
+                  "Always answer with STRICT JSON only, no explanations, no markdown fences.")
+
+def _caption_counts(n):
+    return max(2, min(6, (n+1)//2)), n, max(2, min(6, (n+1)//2))   # hooks, captions, ctas
+
+def _complete(user, model, read_timeout=None, est_output=800):
+    """Μία JSON-mode κλήση (limiter + προαιρετικό hedging). Επιστρέφει (raw text, usage, latency)."""
     if not client:
         raise RuntimeError("OPENAI_API_KEY is missing")
+    req = dict(model=model, temperature=0.7, response_format={"type":"json_object"},
+               messages=[{"role":"system","content":CAPTION_SYSTEM},{"role":"user","content":user}],
+               est_output=est_output)
+    if read_timeout:
+        req["timeout"] = make_timeout(read=read_timeout)
+    t0 = time.perf_counter()
+    # hedging: δεύτερη ίδια κλήση αν η πρώτη αργεί πάνω από το pXX (openai_hedge.py)
+    resp = hedged_completion(client, **req) if OPENAI_HEDGE else create_completion(client, **req)
+    return _json_safety(resp.choices[0].message.content or ""), resp.usage, time.perf_counter() - t0
+
+def _caption_lists(j):
+    """JSON object με hooks/captions/ctas/hashtags → καθαρές λίστες (ValueError αν δεν είναι object)."""
+    if not isinstance(j, dict):
+        raise ValueError("not a JSON object")
+    data = {}
+    data["hooks"]    = [s.strip() for s in j.get("hooks",[]) if isinstance(s,str) and s.strip()]
+    data["captions"] = [s.strip() for s in j.get("captions",[]) if isinstance(s,str) and s.strip()]
+    data["ctas"]     = [s.strip() for s in j.get("ctas",[]) if isinstance(s,str) and s.strip()]
+    tags = [s.strip().lstrip("#").replace(" ","") for s in j.get("hashtags",[]) if isinstance(s,str)]
+    tags = [re.sub(r"[^A-Za-z0-9_άέήίόύώΆΈΉΊΌΎΏα-ωΑ-Ω]", "", t) for t in tags]
+    tags = [t for t in tags if t]
+    data["hashtags"] = tags[:15]
+    return data
 
-    n_hooks = max(2, min(6, (n+1)//2))
-    n_ctas  = max(2, min(6, (n+1)//2))
-    n_caps  = n
+def _trim(data, n):
+    n_hooks, n_caps, n_ctas = _caption_counts(n)
+    return {"hooks": data["hooks"][:n_hooks], "captions": data["captions"][:n_caps],
+            "ctas": data["ctas"][:n_ctas], "hashtags": data["hashtags"][:15]}
+
+def generate_captions(topic, n=6, platform="Instagram", kind="all", lang="el",
+                      tone="energetic", keywords="", want_emojis=True, want_hashtags=True,
+                      model="gpt-4o-mini", read_timeout=None):
+    n_hooks, n_caps, n_ctas = _caption_counts(n)
 
     language = "Greek" if lang=="el" else "English"
     include_emojis   = "yes" if want_emojis else "no"
     include_hashtags = "yes" if want_hashtags else "no"
 
-    sys = ("You are a concise social media copywriter. "
-           "Always answer with STRICT JSON only, no explanations, no markdown fences.")
     user = f"""
 Generate social content for {platform}.
 Language: {language}. Tone: {tone}. Topic: {topic}.
@@ -156,21 +209,10 @@ Constraints:
 - If Include emojis=no, do not put emojis in lines.
 - Hashtags must be ONLY the words (no #, no punctuation).
 """
-    resp = client.chat.completions.create(
-        model=model, temperature=0.7, response_format={"type":"json_object"},
-        messages=[{"role":"system","content":sys},{"role":"user","content":user}],
-    )
-    raw = _json_safety(resp.choices[0].message.content or "")
-    data = {"hooks":[], "captions":[], "ctas":[], "hashtags":[]}
+    raw, usage, latency = _complete(user, model, read_timeout)
+    _single_calls.append((latency, usage.prompt_tokens if usage else None, usage.completion_tokens if usage else None))
     try:
-        j = json.loads(raw)
-        data["hooks"]    = [s.strip() for s in j.get("hooks",[]) if isinstance(s,str) and s.strip()]
-        data["captions"] = [s.strip() for s in j.get("captions",[]) if isinstance(s,str) and s.strip()]
-        data["ctas"]     = [s.strip() for s in j.get("ctas",[]) if isinstance(s,str) and s.strip()]
-        tags = [s.strip().lstrip("#").replace(" ","") for s in j.get("hashtags",[]) if isinstance(s,str)]
-        tags = [re.sub(r"[^A-Za-z0-9_άέήίόύώΆΈΉΊΌΎΏα-ωΑ-Ω]", "", t) for t in tags]
-        tags = [t for t in tags if t]
-        data["hashtags"] = tags[:15]
+        data = _caption_lists(json.loads(raw))
     except Exception:
         # Fallback parser (σπάνιο)
         lines = [ln.strip().lstrip("•-").lstrip("0123456789. ").strip() for ln in raw.splitlines() if ln.strip()]
@@ -183,14 +225,171 @@ Constraints:
                 hooks.append(ln)
             else:
                 caps.append(ln)
-        data["hooks"], data["captions"], data["ctas"], data["hashtags"] = hooks, caps, ctas, []
+        data = {"hooks": hooks, "captions": caps, "ctas": ctas, "hashtags": []}
 
-    # trim
-    data["hooks"]    = data["hooks"][:n_hooks]
-    data["captions"] = data["captions"][:n_caps]
-    data["ctas"]     = data["ctas"][:n_ctas]
-    data["hashtags"] = data["hashtags"][:15]
-    return data
+    return _trim(data, n)
+
+# ---------- Captions: πολλά variants (tone × lang) σε μία κλήση ----------
+# Μία JSON απάντηση με key ανά variant αντί για N κλήσεις που επαναλαμβάνουν όλο το prompt.
+# Ό,τι variant λείπει ή δεν διαβάζεται, ξαναζητιέται μόνο του (generate_captions).
+PACKED_MAX_VARIANTS = int(os.getenv("CAPTIONS_PACKED_MAX_VARIANTS") or 6)
+_single_calls = deque(maxlen=50)   # (latency, prompt_tokens, completion_tokens) των απλών κλήσεων
+_fallback_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="captions-fallback")
+
+def variant_key(tone, lang):
+    return f"{tone}|{lang}"
+
+def _packed_call(topic, variants, n, platform, keywords, want_emojis, want_hashtags, model, read_timeout):
+    """Μία packed κλήση για έως PACKED_MAX_VARIANTS variants. Επιστρέφει ({key: data}, report της κλήσης)."""
+    n_hooks, n_caps, n_ctas = _caption_counts(n)
+    specs = "\n".join(f'- "{variant_key(t, l)}": language {"Greek" if l=="el" else "English"}, tone {t}'
+                       for t, l in variants)
+    user = f"""
+Generate social content for {platform}. Topic: {topic}.
+Keywords to weave naturally: {keywords or "none"}.
+Include emojis in lines: {"yes" if want_emojis else "no"}. Include hashtags in lines: {"yes" if want_hashtags else "no"}.
+
+VARIANTS (one per key, each in its own language and tone):
+{specs}
+
+Return a single JSON object whose keys are EXACTLY the variant keys above. Each value is an object with:
+- "hooks": array of {n_hooks} short hook lines.
+- "captions": array of {n_caps} post lines (no numbering, 1 line each).
+- "ctas": array of {n_ctas} call-to-action lines.
+- "hashtags": array of 8-15 relevant hashtags WITHOUT the # sign (just words), in the variant's language.
+
+Constraints:
+- Do not include section headers in the lines.
+- Keep each line short and punchy; variants must differ in tone, not just translate each other.
+- If Include emojis=no, do not put emojis in lines.
+- Hashtags must be ONLY the words (no #, no punctuation).
+"""
+    report, results = {"error": None}, {}
+    try:
+        raw, usage, latency = _complete(user, model, read_timeout, est_output=800 * len(variants))
+        report.update(latency_s=latency,
+                      prompt_tokens=usage.prompt_tokens if usage else None,
+                      completion_tokens=usage.completion_tokens if usage else None)
+        j = json.loads(raw)
+        for t, l in variants:
+            try:
+                data = _trim(_caption_lists(j.get(variant_key(t, l))), n)
+            except Exception:
+                continue
+            if data["captions"]:
+                results[variant_key(t, l)] = data
+    except json.JSONDecodeError as e:
+        report["error"] = f"packed JSON: {e}"
+    except Exception as e:   # RateLimited κ.λπ.: τα variants ξαναδοκιμάζονται ένα-ένα
+        report["error"] = f"{e}"
+    return results, report
+
+def generate_caption_variants(topic, variants, n=6, platform="Instagram", keywords="",
+                              want_emojis=True, want_hashtags=True, model="gpt-4o-mini", read_timeout=None):
+    """
+    variants: [(tone, lang), …]. Επιστρέφει ({key: data}, report) με report για latency/tokens:
+    packed κλήση vs εκτίμηση για N ξεχωριστές (από τις πρόσφατες απλές κλήσεις, αλλιώς από τα μεγέθη prompt).
+    Πάνω από PACKED_MAX_VARIANTS: πολλές packed κλήσεις παράλληλα, μία ανά κομμάτι (κανένα variant δεν χάνεται).
+    """
+    variants = list(dict.fromkeys(variants))
+    chunks = [variants[i:i + PACKED_MAX_VARIANTS] for i in range(0, len(variants), PACKED_MAX_VARIANTS)]
+    args = (n, platform, keywords, want_emojis, want_hashtags, model, read_timeout)
+    report = {"variants": len(variants), "packed": True, "packed_calls": len(chunks), "fallback": [], "error": None}
+    results = {}
+    t0 = time.perf_counter()
+    if len(chunks) == 1:
+        calls = [_packed_call(topic, chunks[0], *args)]
+    else:
+        calls = [fu.result() for fu in [_fallback_pool.submit(_packed_call, topic, c, *args) for c in chunks]]
+    for res, rep in calls:
+        results.update(res)
+    errors = [rep["error"] for _, rep in calls if rep["error"]]
+    report["error"] = "; ".join(errors) or None
+    done = [rep for _, rep in calls if "latency_s" in rep]
+    if done:
+        # παράλληλες κλήσεις: latency = η πιο αργή, tokens = το άθροισμα
+        report["latency_s"] = round(max(rep["latency_s"] for rep in done), 2)
+        for k in ("prompt_tokens", "completion_tokens"):
+            vals = [rep[k] for rep in done]
+            report[k] = sum(vals) if None not in vals else None
+
+    missing = [(t, l) for t, l in variants if variant_key(t, l) not in results]
+    if missing:
+        report["fallback"] = [variant_key(t, l) for t, l in missing]
+        futs = {variant_key(t, l): _fallback_pool.submit(generate_captions, topic, n, platform, "all", l, t, keywords,
+                                                         want_emojis, want_hashtags, model, read_timeout)
+                for t, l in missing}
+        for k, fu in futs.items():
+            try:
+                results[k] = fu.result()
+            except Exception as e:
+                report.setdefault("errors", {})[k] = f"{e}"
+    report["total_s"] = round(time.perf_counter() - t0, 2)
+
+    # σύγκριση με ξεχωριστές κλήσεις: μέσοι όροι από πρόσφατες απλές κλήσεις αυτού του process.
+    # Tokens: μόνο για τα variants που έδωσε η packed κλήση (τα fallback κοστίζουν ό,τι και πριν).
+    singles = [s for s in _single_calls if s[1] is not None]
+    if singles and report.get("prompt_tokens") is not None:
+        avg = lambda i: sum(s[i] for s in singles) / len(singles)
+        served = len(variants) - len(missing)
+        est_prompt, est_completion = avg(1) * served, avg(2) * served
+        report.update(
+            packed_served=served,
+            est_separate_prompt_tokens=round(est_prompt), est_separate_completion_tokens=round(est_completion),
+            saved_tokens=round(est_prompt + est_completion - report["prompt_tokens"] - report["completion_tokens"]),
+            est_separate_latency_s=round(avg(0) * len(variants), 2),   # σειριακά, όπως γινόταν
+            saved_s=round(avg(0) * len(variants) - report["total_s"], 2))
+    return results, report
+
+# ---------- Captions: latency budget + offline fallback ----------
+# Αν το LLM δεν απαντήσει μέσα στο budget (ή αποτύχει), η σελίδα παίρνει αμέσως τα τοπικά
+# (local_captions.py). Η κλήση συνεχίζει· αν τελειώσει, το ίδιο submit σε λίγο παίρνει το αποτέλεσμά της.
+CAPTIONS_BUDGET_MS = int(os.getenv("CAPTIONS_BUDGET_MS") or 8000)   # 0 = χωρίς όριο
+# τόσες LLM κλήσεις σε εξέλιξη/ουρά → τα νέα requests πάνε κατευθείαν στο τοπικό (θα έχαναν το budget ούτως ή άλλως)
+CAPTIONS_LLM_QUEUE_MAX = int(os.getenv("CAPTIONS_LLM_QUEUE_MAX") or 8)
+LATE_TTL_S = 600
+_llm_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="captions-llm")
+_late = {}   # key → (time, αποτέλεσμα που ήρθε μετά το budget)
+_llm_inflight = 0
+_llm_lock = threading.Lock()
+
+def _llm_done(fu):
+    global _llm_inflight
+    with _llm_lock:
+        _llm_inflight -= 1
+
+def _within_budget(key, fn, local_fn, budget_ms):
+    """Επιστρέφει (result, source, note) με source = llm | local."""
+    global _llm_inflight
+    now = time.time()
+    for k in [k for k, (at, _) in list(_late.items()) if now - at > LATE_TTL_S]:
+        _late.pop(k, None)
+    if key in _late:
+        return _late.pop(key)[1], "llm", "από κλήση που ολοκληρώθηκε μετά το προηγούμενο budget"
+    with _llm_lock:
+        busy = _llm_inflight >= CAPTIONS_LLM_QUEUE_MAX
+        if not busy:
+            _llm_inflight += 1
+    fu = None
+    if busy:
+        note = f"Το AI είναι φορτωμένο ({CAPTIONS_LLM_QUEUE_MAX}+ κλήσεις σε εξέλιξη)"
+    else:
+        fu = _llm_pool.submit(fn)
+        fu.add_done_callback(_llm_done)   # τρέχει και όταν το future ακυρωθεί
+    try:
+        if fu:
+            return fu.result(timeout=budget_ms / 1000.0 if budget_ms else None), "llm", None
+    except FuturesTimeout:
+        # ακόμη στην ουρά: ακύρωση, να μην κρατάει worker για αποτέλεσμα που δεν θα δει κανείς
+        if not fu.cancel():
+            fu.add_done_callback(lambda f: f.exception() is None and _late.__setitem__(key, (time.time(), f.result())))
+        note = f"Το AI δεν απάντησε σε {budget_ms} ms"
+    except Exception as e:
+        note = f"Το AI απέτυχε: {e}"
+    t0 = time.perf_counter()
+    res = local_fn()
+    print(f"captions: local fallback σε {(time.perf_counter() - t0) * 1000:.1f} ms ({note})")
+    return res, "local", note
 
 def _filter_by_kind(data: dict, kind: str) -> dict:
     k = (kind or "all").lower()
@@ -218,20 +417,52 @@ def captions():
     keywords = request.form.get("keywords","")
     emojis   = bool(request.form.get("emojis"))
     hashtags = bool(request.form.get("hashtags"))
+    # πολλά variants: tones × langs σε μία (packed) κλήση
+    v_tones  = request.form.getlist("v_tones")
+    v_langs  = request.form.getlist("v_langs")
+    variants = [(t, l) for l in v_langs for t in v_tones]
+    try:
+        budget_ms = int(request.form.get("budget_ms", CAPTIONS_BUDGET_MS))
+    except ValueError:
+        budget_ms = CAPTIONS_BUDGET_MS
+    source, source_note = None, None
+    key = json.dumps([topic, tone, platform, lang, n, keywords, emojis, hashtags, variants])
 
     print("KIND DEBUG →", kind)
 
     results = {"hooks":[], "captions":[], "ctas":[], "hashtags":[]}
     hashtags_line = ""
+    variant_results, packed_report = [], None
     if request.method == "POST":
         if not topic.strip():
             error = "Γράψε θέμα/προϊόν."
+        elif len(variants) > 1:
+            try:
+                (out, packed_report), source, source_note = _within_budget(
+                    key,
+                    lambda: generate_caption_variants(topic=topic, variants=variants, n=n, platform=platform,
+                                                      keywords=keywords, want_emojis=emojis, want_hashtags=hashtags),
+                    lambda: ({variant_key(t_, l_): generate_local(topic, n, platform, l_, t_, keywords, emojis, hashtags)
+                              for t_, l_ in variants}, None),
+                    budget_ms)
+                for t_, l_ in variants:
+                    data = out.get(variant_key(t_, l_))
+                    if data:
+                        data = _filter_by_kind(data, kind)
+                        variant_results.append({"key": variant_key(t_, l_), "tone": t_, "lang": l_, "data": data,
+                                                "hashtags_line": " ".join("#"+h.lower() for h in data.get("hashtags", []))})
+                if not variant_results and packed_report:
+                    error = "; ".join((packed_report.get("errors") or {}).values()) or packed_report.get("error")
+            except Exception as e:
+                error = f"{e}"
         else:
             try:
-                data = generate_captions(
-                    topic=topic, n=n, platform=platform, kind=kind, lang=lang,
-                    tone=tone, keywords=keywords, want_emojis=emojis, want_hashtags=hashtags
-                )
+                data, source, source_note = _within_budget(
+                    key,
+                    lambda: generate_captions(topic=topic, n=n, platform=platform, kind=kind, lang=lang, tone=tone,
+                                              keywords=keywords, want_emojis=emojis, want_hashtags=hashtags),
+                    lambda: generate_local(topic, n, platform, lang, tone, keywords, emojis, hashtags),
+                    budget_ms)
                 results = _filter_by_kind(data, kind)
                 hashtags_line = " ".join("#"+(t or "").strip().lower().replace(" ","")
                                          for t in results.get("hashtags", []))
@@ -241,15 +472,64 @@ def captions():
     return render_template("captions.html",
                            error=error, topic=topic, tone=tone, platform=platform, kind=kind,
                            lang=lang, n=n, keywords=keywords, emojis=emojis, hashtags=hashtags,
-                           results=results, hashtags_line=hashtags_line)
+                           results=results, hashtags_line=hashtags_line,
+                           v_tones=v_tones, v_langs=v_langs, variant_results=variant_results,
+                           packed_report=packed_report, budget_ms=budget_ms,
+                           source=source, source_note=source_note)
 
 @app.route("/gallery")
 def gallery():
+    try:
+        from media_db import output_rows
+        meta = output_rows()
+    except Exception as e:
+        print("gallery meta error:", e)
+        meta = {}
     images = []
-    for p in sorted(OUTPUT_DIR.glob("*.jpg")):
-        images.append({"name":p.name, "path":f"/static/outputs/{p.name}",
-                       "mtime": datetime.fromtimestamp(p.stat().st_mtime).strftime("%Y-%m-%d %H:%M")})
-    return render_template("gallery.html", images=images)
+    def add(name, rel, row, mtime):
+        images.append({"name": name, "path": f"/static/{rel}",
+                       "id": row["id"] if row else None, "pinned": bool(row and row["pinned"]),
+                       "mtime": datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M"),
+                       "upload_status": row["upload_status"] if row else "local",
+                       "cloud_url": row["cloud_url"] if row else None,
+                       "bytes": row["bytes"] if row else None,
+                       "saved_bytes": (row["baseline_bytes"] - row["bytes"])
+                                      if row and row["baseline_bytes"] and row["bytes"] else None,
+                       "encoder": row["encoder"] if row else None})
+    # outputs στο content-addressed layout (outputs/ab/cd/<sha>.ext): η λίστα έρχεται από το media.db
+    for oid, row in sorted(meta.items()):
+        p = STATIC_DIR / row["path"]
+        if not p.exists():
+            continue
+        # ίδια bytes = ίδιο blob για πολλά ids, άρα η ώρα έρχεται από το row, όχι από το mtime
+        add(oid + p.suffix, row["path"], row, datetime.fromisoformat(row["created_at"]).timestamp())
+    # παλιά flat αρχεία χωρίς εγγραφή (πριν το media.db ή πριν τρέξει το migrate_outputs.py)
+    listed = {row["path"] for row in meta.values()}
+    for p in sorted(p for ext in OUTPUT_EXTS for p in OUTPUT_DIR.glob(f"*{ext}")):
+        if f"outputs/{p.name}" not in listed:
+            add(p.name, f"outputs/{p.name}", None, p.stat().st_mtime)
+    # σελίδες + ένα contact-sheet sprite ανά σελίδα (ένα request για όλα τα thumbnails)
+    pages = max(1, (len(images) + GALLERY_PAGE_SIZE - 1) // GALLERY_PAGE_SIZE)
+    page = min(max(1, request.args.get("page", 1, type=int)), pages)
+    images = images[(page - 1) * GALLERY_PAGE_SIZE: page * GALLERY_PAGE_SIZE]
+    # LRU του retention: η προβολή της σελίδας μετράει ως χρήση (sprite + browser cache = σχεδόν κανένα hit)
+    try:
+        from retention import record_access
+        record_access(*(im["path"][len("/static/"):] for im in images))
+    except Exception as e:
+        print("gallery access error:", e)
+    sheet = None
+    if images and request.args.get("sprites") != "0":
+        try:
+            from contact_sheet import sheet_for
+            sheet = sheet_for([im["path"][len("/static/"):] for im in images])
+        except Exception as e:
+            print("gallery sprite error:", e)
+    # ETag από το HTML: ίδιο gallery → 304 χωρίς body (οι εικόνες είναι ήδη immutable στον browser)
+    resp = make_response(render_template("gallery.html", images=images, sheet=sheet, page=page, pages=pages))
+    resp.add_etag()
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
 
 # Use unique function name but keep endpoint="logs" for navbar candidates
 @app.route("/logs", endpoint="logs")
@@ -263,30 +543,89 @@ def logs_page():
             data = []
     return render_template("logs.html", logs=data)
 
+def _sqlite_snapshot(path):
+    """Συνεπές αντίγραφο μιας live sqlite (WAL) βάσης με το backup API, σε temp file."""
+    fd, tmp = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    src, dst = sqlite3.connect(path, timeout=30), sqlite3.connect(tmp)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+    return tmp
+
 # Simple project backup (ολόκληρο project, exclude λίστες)
-@app.route("/backup", endpoint="backup")
-def backup_page():
-    with_env = request.args.get("with_env","0") == "1"
+# Το ZIP χτίζεται μία φορά σε αρχείο στο instance/backups (όχι στη μνήμη) και σερβίρεται με send_file:
+# ένα Range/resume μέσα σε BACKUP_REUSE_S παίρνει το ίδιο αρχείο (ίδιο ETag) αντί να το ξαναχτίσει.
+BACKUP_DIR = BASE_DIR / "instance" / "backups"
+BACKUP_REUSE_S = int(os.getenv("BACKUP_REUSE_SECONDS") or 600)
+
+def _write_backup(dest, with_env):
     project_root = BASE_DIR
-    memory_file = io.BytesIO()
     exclude_dirs = {".git",".venv","__pycache__","_backups"}
+    exclude_rel  = {("instance", "cache"),   # remote/thumb cache και sprites: ξαναφτιάχνονται
+                    ("instance", "tmp"),     # uploads σε επεξεργασία
+                    ("instance", "backups")}
     exclude_ext  = {".pyc",".pyo",".zip"}
-    with zipfile.ZipFile(memory_file,"w",zipfile.ZIP_DEFLATED) as zf:
+    exclude_tail = ("-wal", "-shm", "-journal")   # μέρος της live βάσης, το snapshot τα περιέχει ήδη
+    with zipfile.ZipFile(dest,"w",zipfile.ZIP_DEFLATED) as zf:
         for path in project_root.rglob("*"):
             rel = path.relative_to(project_root)
             if any(part in exclude_dirs for part in rel.parts): continue
+            if rel.parts[:2] in exclude_rel: continue
             if path.is_file():
                 if path.suffix.lower() in exclude_ext: continue
+                if path.name.endswith(exclude_tail): continue
                 if (not with_env) and path.name == ".env": continue
+                if path.suffix.lower() == ".db":
+                    # media.db / openai_limits.db γράφονται συνέχεια: όχι raw copy (torn), αλλά backup API
+                    try:
+                        snap = _sqlite_snapshot(path)
+                    except sqlite3.DatabaseError as e:
+                        print("backup: skip", rel, e)
+                        continue
+                    try:
+                        zf.write(snap, arcname=str(rel))
+                    finally:
+                        os.remove(snap)
+                    continue
                 zf.write(path, arcname=str(rel))
-    memory_file.seek(0)
-    name = f"ai-content-studio_{datetime.now().strftime('%Y%m%d-%H%M%S')}.zip"
-    return send_file(memory_file, as_attachment=True, download_name=name, mimetype="application/zip")
+
+@app.route("/backup", endpoint="backup")
+def backup_page():
+    with_env = request.args.get("with_env","0") == "1"
+    kind = "env" if with_env else "noenv"
+    BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+    built = sorted(BACKUP_DIR.glob(f"backup_{kind}_*.zip"), key=lambda p: p.stat().st_mtime)
+    path = None
+    if "Range" in request.headers and built and time.time() - built[-1].stat().st_mtime < BACKUP_REUSE_S:
+        path = built[-1]   # συνέχεια κομμένου download: ίδιο αρχείο, ίδιο ETag
+    if path is None:
+        fd, tmp = tempfile.mkstemp(dir=BACKUP_DIR, suffix=".part")
+        os.close(fd)
+        try:
+            _write_backup(tmp, with_env)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        path = BACKUP_DIR / f"backup_{kind}_{datetime.now().strftime('%Y%m%d-%H%M%S')}_{Path(tmp).stem}.zip"
+        os.replace(tmp, path)
+        for old in built:
+            try: old.unlink()
+            except OSError: pass   # Windows: σερβίρεται ακόμη, φεύγει στο επόμενο backup
+    name = "ai-content-studio_" + path.name.split("_")[2] + ".zip"
+    return send_file(path, mimetype="application/zip", as_attachment=True, download_name=name,
+                     conditional=True, max_age=0)
 
 @app.route("/__endpoints")
 def __endpoints():
     return "<pre>" + "\n".join(sorted(app.view_functions.keys())) + "</pre>"
 
+@app.route("/openai/pool")
+def openai_pool():
+    return jsonify(dict(openai_pool_stats(client), limits=limits_stats(), hedge=hedge_stats()))
+
 @app.route("/health")
 def health():
     return "ok", 200
@@ -308,6 +647,11 @@ try:
 except Exception as e:
     print("Blueprint: ab ❌", e)
 
+# OpenAI warm-up: ανά worker, μόλις φορτωθεί το app (όχι στα pool children)
+from image_pipeline import in_pool_child
+if not in_pool_child():
+    start_warm_up(client)
+
 # ---------- Main ----------
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,99 @@
+# bench_resize.py — decode+resize χρόνος & peak RSS: baseline vs draft presets
+# Χρήση:  python bench_resize.py [--runs 5] [--src photo.jpg]  (> bench_output.txt)
+import os, sys, time, argparse, tempfile
+from multiprocessing import get_context
+from PIL import Image
+
+from image_pipeline import decode_for_size, resize_to, RESAMPLE_PRESETS
+
+try:
+    import resource   # Linux/macOS μόνο
+except ImportError:
+    resource = None
+
+TARGETS = {"1:1": (1024, 1024), "9:16": (1024, 1820), "16:9": (1280, 720)}
+
+def make_sample(path, size):
+    # χαμηλόσυχνος θόρυβος + gradient + λίγο grain, ώστε το JPEG να μοιάζει με φωτογραφία σε μέγεθος αρχείου
+    w, h = size
+    blobs = Image.merge("RGB", [Image.effect_noise((w // 40, h // 40), 90).resize((w, h), Image.Resampling.BICUBIC)
+                                for _ in range(3)])
+    grad = Image.linear_gradient("L").resize((w, h)).convert("RGB")
+    grain = Image.effect_noise((w, h), 12).convert("RGB")
+    Image.blend(Image.blend(blobs, grad, 0.4), grain, 0.15).save(path, quality=90)
+
+def _baseline(src, size):
+    # ό,τι έκανε το /upload πριν: πλήρες decode + default resize
+    img = Image.open(src).convert("RGB")
+    return img.resize(size)
+
+def _preset(src, size, preset):
+    return resize_to(decode_for_size(src, size, preset), size, preset)
+
+def _peak_rss_kb():
+    if not resource:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss   # macOS: bytes, Linux: KB
+
+def _run_case(src, size, preset, runs, q):
+    # νέο process ανά περίπτωση ώστε το peak RSS να αφορά μόνο αυτή
+    base_rss = _peak_rss_kb()
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        out = _baseline(src, size) if preset == "baseline" else _preset(src, size, preset)
+        times.append((time.perf_counter() - t0) * 1000)
+        assert out.size == size
+    peak = _peak_rss_kb()
+    q.put((min(times), sorted(times)[len(times) // 2],
+           (peak - base_rss) if peak is not None and base_rss is not None else None))
+
+def run_isolated(target, *args):
+    # ξεχωριστό process: στο Linux το ru_maxrss κληρονομείται μέσω exec, άρα ο parent μένει «ελαφρύς»
+    ctx = get_context("spawn")
+    p = ctx.Process(target=target, args=args)
+    p.start()
+    p.join()
+
+def run_case(src, size, preset, runs):
+    ctx = get_context("spawn")
+    q = ctx.Queue()
+    p = ctx.Process(target=_run_case, args=(src, size, preset, runs, q))
+    p.start()
+    res = q.get()
+    p.join()
+    return res
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--src", help="δικό σου JPEG (αλλιώς φτιάχνεται 6000×4000)")
+    args = ap.parse_args()
+
+    src = args.src
+    tmp = None
+    if not src:
+        tmp = tempfile.NamedTemporaryFile(suffix=".jpg", delete=False)
+        tmp.close()
+        src = tmp.name
+        run_isolated(make_sample, src, (6000, 4000))
+    with Image.open(src) as im:
+        print(f"source: {src} {im.size[0]}×{im.size[1]} {os.path.getsize(src)//1024} KB, runs={args.runs}")
+
+    cases = ["baseline"] + list(RESAMPLE_PRESETS)
+    print(f"{'aspect':<7} {'preset':<9} {'min ms':>8} {'median ms':>10} {'peak RSS MB':>12} {'speedup':>8}")
+    try:
+        for name, size in TARGETS.items():
+            base_med = None
+            for preset in cases:
+                tmin, tmed, rss = run_case(src, size, preset, args.runs)
+                base_med = base_med or tmed
+                rss_s = f"{rss/1024:.1f}" if rss is not None else "n/a"
+                print(f"{name:<7} {preset:<9} {tmin:>8.1f} {tmed:>10.1f} {rss_s:>12} {base_med/tmed:>7.1f}x")
+    finally:
+        if tmp:
+            os.remove(src)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# blob_store.py — content-addressed αποθήκευση outputs: static/outputs/ab/cd/<sha256>.<ext>
+# Ίδια bytes → ίδιο αρχείο (dedupe). Το friendly id → blob mapping κρατιέται στο outputs του media.db.
+import os, hashlib, tempfile
+
+BASE_DIR  = os.path.abspath(os.path.dirname(__file__))
+BLOB_ROOT = os.path.join(BASE_DIR, "static", "outputs")
+
+def write_atomic(path, data):
+    """temp file στον ίδιο φάκελο + rename: ποτέ μισογραμμένο αρχείο στο gallery."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+    return path
+
+def blob_path(digest, ext, root=BLOB_ROOT):
+    # 2 επίπεδα × 256 φάκελοι: κανένας φάκελος δεν φτάνει τις 100k εγγραφές
+    return os.path.join(root, digest[:2], digest[2:4], f"{digest}.{ext.lstrip('.')}")
+
+def put_bytes(data, ext, root=BLOB_ROOT):
+    """Γράφει τα bytes (αν δεν υπάρχουν ήδη) και επιστρέφει (abs path, sha256)."""
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(digest, ext, root)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, data)
+    return path, digest
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def put_file(src, ext=None, root=BLOB_ROOT):
+    """Μεταφέρει υπάρχον αρχείο στο layout (migration). Αν το blob υπάρχει ήδη, σβήνει το src."""
+    digest = file_digest(src)
+    path = blob_path(digest, ext or os.path.splitext(src)[1], root)
+    if os.path.exists(path):
+        os.remove(src)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(src, path)
+    return path, digest
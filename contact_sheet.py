@@ -0,0 +1,84 @@
+# contact_sheet.py — ένα sprite (contact sheet) ανά σελίδα gallery + χάρτης συντεταγμένων
+# Το key είναι hash της λίστας αρχείων της σελίδας: νέο/σβησμένο output → νέο key, άρα το
+# παλιό sprite απλώς δεν ξαναζητιέται (invalidation χωρίς να σβήνουμε τίποτα στο request).
+import os, io, json, hashlib
+from PIL import Image, ImageOps
+from blob_store import write_atomic
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+BASE_DIR    = os.path.abspath(os.path.dirname(__file__))
+STATIC_DIR  = os.path.join(BASE_DIR, "static")
+SPRITE_DIR  = os.path.join(BASE_DIR, "instance", "cache", "sprites")
+SPRITE_CELL = _env_int("SPRITE_CELL", 240)    # px, τετράγωνο thumbnail ανά εικόνα
+SPRITE_COLS = _env_int("SPRITE_COLS", 8)
+SPRITE_KEEP = _env_int("SPRITE_KEEP", 64)     # πόσα sprites κρατάμε στον δίσκο
+SPRITE_QUALITY = 80
+
+def _manifest_path(key):
+    return os.path.join(SPRITE_DIR, f"{key}.json")
+
+def sprite_path(key):
+    return os.path.join(SPRITE_DIR, f"{key}.jpg")
+
+def sheet_for(paths, cell=SPRITE_CELL, cols=SPRITE_COLS):
+    """
+    paths: αρχεία της σελίδας, σχετικά με static/. Επιστρέφει key, διαστάσεις και (x, y) ανά εικόνα.
+    Γράφει μόνο το μικρό manifest· το ίδιο το sprite φτιάχνεται όταν ζητηθεί (build_sheet).
+    """
+    key = hashlib.sha1(json.dumps([cell, cols, paths]).encode("utf-8")).hexdigest()[:16]
+    rows = (len(paths) + cols - 1) // cols
+    sheet = {"key": key, "cell": cell, "cols": cols, "width": cell * min(cols, len(paths)), "height": cell * rows,
+             "items": [{"path": p, "x": (i % cols) * cell, "y": (i // cols) * cell} for i, p in enumerate(paths)]}
+    mp = _manifest_path(key)
+    try:
+        os.utime(mp)   # «πρόσφατα σε χρήση» για το _cleanup
+    except OSError:
+        os.makedirs(SPRITE_DIR, exist_ok=True)
+        write_atomic(mp, json.dumps(sheet).encode("utf-8"))
+    return sheet
+
+def load_sheet(key):
+    with open(_manifest_path(key), encoding="utf-8") as f:
+        return json.load(f)
+
+def _thumb(path, cell):
+    with Image.open(path) as im:
+        if im.format == "JPEG":
+            im.draft("RGB", (cell, cell))   # decode σε 1/2…1/8 απευθείας από το libjpeg
+        return ImageOps.fit(im.convert("RGB"), (cell, cell), Image.Resampling.BILINEAR)
+
+def build_sheet(key):
+    """Φτιάχνει (μία φορά) το sprite του key. Τρέχει στο process pool. Επιστρέφει το path."""
+    out = sprite_path(key)
+    if os.path.exists(out):
+        os.utime(out)
+        return out
+    sheet = load_sheet(key)
+    cell = sheet["cell"]
+    canvas = Image.new("RGB", (max(1, sheet["width"]), max(1, sheet["height"])), (240, 240, 240))
+    for it in sheet["items"]:
+        try:
+            canvas.paste(_thumb(os.path.join(STATIC_DIR, it["path"]), cell), (it["x"], it["y"]))
+        except (OSError, ValueError):
+            pass   # σβησμένο/χαλασμένο αρχείο: μένει γκρι κελί
+    buf = io.BytesIO()
+    canvas.save(buf, format="JPEG", quality=SPRITE_QUALITY, optimize=True, progressive=True)
+    write_atomic(out, buf.getvalue())
+    _cleanup()
+    return out
+
+def _cleanup(keep=SPRITE_KEEP):
+    # τα sprites/manifests που δεν ζητήθηκαν πρόσφατα (παλιές εκδοχές σελίδων)
+    try:
+        files = [os.path.join(SPRITE_DIR, f) for f in os.listdir(SPRITE_DIR) if f.endswith((".jpg", ".json"))]
+    except OSError:
+        return
+    files.sort(key=lambda p: os.path.getmtime(p), reverse=True)
+    for p in files[keep * 2:]:
+        try: os.remove(p)
+        except OSError: pass
@@ -0,0 +1,214 @@
+# cse_search.py — Google CSE (image search): TTL cache σε sqlite, πολλές σελίδες παράλληλα, ημερήσιο quota
+import os, json, time
+from datetime import datetime, timezone, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from media_db import get_conn
+from media_fetch import get_session
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+CSE_ENDPOINT      = os.getenv("GOOGLE_CSE_ENDPOINT") or "https://www.googleapis.com/customsearch/v1"
+CSE_CACHE_TTL_S   = _env_int("CSE_CACHE_TTL_SECONDS", 6 * 3600)
+CSE_DAILY_QUOTA   = _env_int("CSE_DAILY_QUOTA", 100)    # δωρεάν όριο του API: 100 queries/ημέρα
+CSE_MAX_PAGES     = max(1, min(10, _env_int("CSE_MAX_PAGES", 5)))   # το API δίνει μέχρι start=91
+CSE_MIN_RESULTS   = _env_int("CSE_MIN_RESULTS", 12)     # πόσα aspect-matching θέλουμε πριν σταματήσουμε
+CSE_PAGE_PARALLEL = _env_int("CSE_PAGE_PARALLEL", 3)
+PAGE_SIZE = 10
+
+# Google μηδενίζει το quota τα μεσάνυχτα Pacific (εδώ σταθερό UTC-8, χωρίς tzdata)
+_QUOTA_TZ = timezone(timedelta(hours=-8))
+
+_pages = ThreadPoolExecutor(max_workers=max(1, CSE_PAGE_PARALLEL), thread_name_prefix="cse-page")
+
+class QuotaExceeded(RuntimeError):
+    pass
+
+def init_db():
+    with get_conn() as con:
+        con.execute("""
+        CREATE TABLE IF NOT EXISTS cse_cache (
+            key TEXT PRIMARY KEY,         -- json [q, imgType, imgSize, safe, start]
+            body TEXT NOT NULL,           -- json items της σελίδας
+            total INTEGER,                -- searchInformation.totalResults
+            fetched_at REAL NOT NULL
+        )""")
+        con.execute("""
+        CREATE TABLE IF NOT EXISTS cse_quota (
+            day TEXT PRIMARY KEY,         -- YYYY-MM-DD (Pacific)
+            used INTEGER NOT NULL
+        )""")
+init_db()
+
+def _today():
+    return datetime.now(_QUOTA_TZ).strftime("%Y-%m-%d")
+
+def quota_status():
+    with get_conn() as con:
+        row = con.execute("SELECT used FROM cse_quota WHERE day=?", (_today(),)).fetchone()
+    used = row["used"] if row else 0
+    return {"used": used, "limit": CSE_DAILY_QUOTA, "left": max(0, CSE_DAILY_QUOTA - used)}
+
+def _take_quota():
+    """Κρατάει ατομικά 1 query από το σημερινό quota (κοινό για όλους τους gunicorn workers)."""
+    con = get_conn()
+    con.isolation_level = None
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        day = _today()
+        row = con.execute("SELECT used FROM cse_quota WHERE day=?", (day,)).fetchone()
+        used = row["used"] if row else 0
+        if used >= CSE_DAILY_QUOTA:
+            con.execute("ROLLBACK")
+            return False
+        con.execute("INSERT INTO cse_quota (day, used) VALUES (?, 1) "
+                    "ON CONFLICT(day) DO UPDATE SET used=used+1", (day,))
+        con.execute("DELETE FROM cse_quota WHERE day<?", (day,))
+        con.execute("COMMIT")
+        return True
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    finally:
+        con.close()
+
+def _cache_key(q, img_type, img_size, safe, start):
+    return json.dumps([q, img_type or "", img_size or "", safe or "", start])
+
+def _cache_get(key):
+    with get_conn() as con:
+        row = con.execute("SELECT body, total FROM cse_cache WHERE key=? AND fetched_at>=?",
+                          (key, time.time() - CSE_CACHE_TTL_S)).fetchone()
+    return (json.loads(row["body"]), row["total"]) if row else None
+
+def _cache_put(key, items, total):
+    now = time.time()
+    with get_conn() as con:
+        con.execute("INSERT OR REPLACE INTO cse_cache (key, body, total, fetched_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(items), total, now))
+        con.execute("DELETE FROM cse_cache WHERE fetched_at<?", (now - CSE_CACHE_TTL_S,))
+
+def fetch_page(key, cx, q, img_type="", img_size="", safe="off", start=1, timeout=20):
+    """
+    Μία σελίδα (10 αποτελέσματα) από cache ή API.
+    Επιστρέφει (items, total, source) με source = cache | live.
+    """
+    ck = _cache_key(q, img_type, img_size, safe, start)
+    hit = _cache_get(ck)
+    if hit:
+        return hit[0], hit[1], "cache"
+    if not _take_quota():
+        raise QuotaExceeded(f"Ημερήσιο όριο CSE ({CSE_DAILY_QUOTA} queries) εξαντλήθηκε")
+
+    params = {"key": key, "cx": cx, "q": q, "num": PAGE_SIZE, "start": start, "searchType": "image"}
+    if img_type: params["imgType"] = img_type
+    if img_size: params["imgSize"] = img_size
+    if safe:     params["safe"]    = safe
+    r = get_session().get(CSE_ENDPOINT, params=params, timeout=timeout)
+    data = r.json()
+    if r.status_code != 200 or "error" in data:
+        msg = (data.get("error") or {}).get("message") or f"HTTP {r.status_code}"
+        raise RuntimeError(f"CSE: {msg}")
+    items = data.get("items", [])
+    try:
+        total = int((data.get("searchInformation") or {}).get("totalResults") or 0)
+    except ValueError:
+        total = 0
+    _cache_put(ck, items, total)
+    return items, total, "live"
+
+def search_images(key, cx, q, img_type="", img_size="", safe="off", accept=None, want=CSE_MIN_RESULTS):
+    """
+    Σελίδα 1 και μετά κύματα CSE_PAGE_PARALLEL σελίδων παράλληλα, μέχρι να μαζευτούν `want`
+    αποτελέσματα που περνάνε το accept(item) (π.χ. aspect filter) ή να τελειώσουν οι σελίδες.
+    Επιστρέφει (items, meta): κάθε item έχει "_source" (cache/live) και "_start".
+    """
+    accept = accept or (lambda it: True)
+    out, meta = [], {"cached_pages": 0, "live_pages": 0, "quota_hit": False, "errors": []}
+
+    def take(start, items, source):
+        meta["cached_pages" if source == "cache" else "live_pages"] += 1
+        for it in items:
+            if accept(it):
+                out.append(dict(it, _source=source, _start=start))
+
+    items, total, source = fetch_page(key, cx, q, img_type, img_size, safe, 1)
+    take(1, items, source)
+    last = min(CSE_MAX_PAGES * PAGE_SIZE, total or PAGE_SIZE) if len(items) == PAGE_SIZE else 0
+    starts = list(range(1 + PAGE_SIZE, last + 1, PAGE_SIZE))
+
+    while starts and len(out) < want and not meta["quota_hit"]:
+        wave, starts = starts[:CSE_PAGE_PARALLEL], starts[CSE_PAGE_PARALLEL:]
+        futs = [(s, _pages.submit(fetch_page, key, cx, q, img_type, img_size, safe, s)) for s in wave]
+        for s, fu in futs:   # με σειρά σελίδας, ώστε η κατάταξη να μένει του Google
+            try:
+                items, _, source = fu.result()
+            except QuotaExceeded:
+                meta["quota_hit"] = True
+                continue
+            except Exception as e:   # μια χαμένη σελίδα δεν ακυρώνει όσα ήδη βρέθηκαν
+                meta["errors"].append(f"start={s}: {e}")
+                continue
+            take(s, items, source)
+            if len(items) < PAGE_SIZE:
+                starts = []
+    meta["quota"] = quota_status()
+    return out, meta
+
+# ---------- Πολλά queries μαζί ----------
+CSE_MAX_QUERIES = _env_int("CSE_MAX_QUERIES", 5)
+
+# ξεχωριστό pool από το _pages: κάθε query περιμένει τις δικές του σελίδες εκεί (όχι deadlock)
+_queries = ThreadPoolExecutor(max_workers=max(1, CSE_MAX_QUERIES), thread_name_prefix="cse-query")
+
+def split_queries(text):
+    """'sneakers summer | retro runners' ή ένα query ανά γραμμή → μοναδικά queries, με σειρά."""
+    parts = [p.strip() for p in text.replace("\n", "|").replace(";", "|").split("|")]
+    return list(dict.fromkeys(p for p in parts if p))[:CSE_MAX_QUERIES]
+
+def search_many(key, cx, queries, img_type="", img_size="", safe="off", accept=None, rank=None,
+                want=CSE_MIN_RESULTS):
+    """
+    Τρέχει τα queries παράλληλα (συνολικός χρόνος ≈ ένα search), ενώνει και κάνει dedupe ανά link
+    και thumbnail. Κατάταξη: rank(item) (π.χ. απόκλιση aspect) → σε πόσα queries βγήκε → θέση.
+    Επιστρέφει (items, meta) — κάθε item έχει και "_queries".
+    """
+    rank = rank or (lambda it: 0)
+    futs = [(q, _queries.submit(search_images, key, cx, q, img_type, img_size, safe, accept, want))
+            for q in queries]
+    merged, by_link, by_thumb = [], {}, {}
+    meta = {"cached_pages": 0, "live_pages": 0, "quota_hit": False, "errors": [], "queries": {}}
+    first_error = None
+    for qi, (q, fu) in enumerate(futs):
+        try:
+            items, m = fu.result()
+        except Exception as e:
+            first_error = first_error or e
+            meta["errors"].append(f"{q}: {e}")
+            meta["queries"][q] = {"results": 0, "error": f"{e}"}
+            continue
+        for k in ("cached_pages", "live_pages"):
+            meta[k] += m[k]
+        meta["quota_hit"] |= m["quota_hit"]
+        meta["errors"] += m["errors"]
+        meta["queries"][q] = {"results": len(items)}
+        for pos, it in enumerate(items):
+            link = it.get("link")
+            thumb = (it.get("image") or {}).get("thumbnailLink")
+            seen = by_link.get(link) or (by_thumb.get(thumb) if thumb else None)
+            if seen:
+                seen["_queries"].append(q)
+                continue
+            it = dict(it, _queries=[q], _pos=pos, _qi=qi)
+            merged.append(it)
+            by_link[link] = it
+            if thumb:
+                by_thumb[thumb] = it
+    if not merged and first_error:
+        raise first_error
+    merged.sort(key=lambda it: (round(rank(it), 2), -len(it["_queries"]), it["_pos"], it["_qi"]))
+    meta["quota"] = quota_status()
+    return merged, meta
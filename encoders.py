@@ -0,0 +1,134 @@
+# encoders.py — output encoders (JPEG/progressive JPEG/WebP/AVIF) + target-quality search με SSIM/PSNR
+import io, os, random
+from PIL import Image, features
+
+try:   # AVIF: ενσωματωμένο σε νεότερα Pillow ή μέσω pillow-avif-plugin
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+ENCODERS = {
+    "jpeg":  {"format": "JPEG", "ext": "jpg",  "label": "JPEG (baseline)", "opts": {}},
+    "pjpeg": {"format": "JPEG", "ext": "jpg",  "label": "JPEG progressive + optimized",
+              "opts": {"progressive": True, "optimize": True}},
+    "webp":  {"format": "WEBP", "ext": "webp", "label": "WebP", "opts": {"method": 4}},
+    "avif":  {"format": "AVIF", "ext": "avif", "label": "AVIF", "opts": {"speed": 6}},
+}
+DEFAULT_ENCODER = "jpeg"
+BASELINE_QUALITY = 92   # το παλιό fixed output — μέτρο σύγκρισης για το «bytes saved»
+# το «bytes saved» θέλει ένα επιπλέον JPEG encode ανά rendition: στο target mode πάντα (κάνει ήδη ~6 encodes),
+# αλλιώς σε δείγμα (0 = ποτέ, 1 = πάντα)
+try:
+    BASELINE_SAMPLE = float(os.getenv("ENCODE_BASELINE_SAMPLE") or 0.25)
+except ValueError:
+    BASELINE_SAMPLE = 0.25
+
+# target-quality search: ποιο εύρος quality ψάχνουμε και σε τι ανάλυση μετράμε
+TARGET_Q_MIN, TARGET_Q_MAX = 30, 95
+METRIC_MAX_SIDE = 512
+
+def _supported(name):
+    fmt = ENCODERS[name]["format"]
+    if fmt == "WEBP":
+        return features.check("webp")
+    Image.init()   # το Image.SAVE γεμίζει lazily
+    return fmt in Image.SAVE
+
+def available_encoders():
+    return [k for k in ENCODERS if _supported(k)]
+
+def _encode(img, name, quality):
+    spec = ENCODERS[name]
+    buf = io.BytesIO()
+    img.save(buf, format=spec["format"], quality=int(quality), **spec["opts"])
+    return buf.getvalue()
+
+# ---------- Μετρικές (NumPy, μόνο για target mode) ----------
+def _luma(img):
+    import numpy as np
+    g = img.convert("L")
+    if max(g.size) > METRIC_MAX_SIDE:
+        g = g.reduce(max(1, max(g.size) // METRIC_MAX_SIDE))
+    return np.asarray(g, dtype=np.float64)
+
+def _box_mean(a, k=8):
+    # μέσος όρος k×k παραθύρου με integral image (χωρίς scipy)
+    import numpy as np
+    c = np.pad(a, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+    return (c[k:, k:] - c[:-k, k:] - c[k:, :-k] + c[:-k, :-k]) / (k * k)
+
+def ssim(x, y):
+    """Mean SSIM στη φωτεινότητα με 8×8 παράθυρα (Wang et al. 2004, σταθερές για 8-bit)."""
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    mx, my = _box_mean(x), _box_mean(y)
+    sxx = _box_mean(x * x) - mx * mx
+    syy = _box_mean(y * y) - my * my
+    sxy = _box_mean(x * y) - mx * my
+    s = ((2 * mx * my + c1) * (2 * sxy + c2)) / ((mx * mx + my * my + c1) * (sxx + syy + c2))
+    return float(s.mean())
+
+def psnr(x, y):
+    import numpy as np
+    mse = float(np.mean((x - y) ** 2))
+    return 99.0 if mse == 0 else float(10 * np.log10(255.0 ** 2 / mse))
+
+METRICS = {"ssim": ssim, "psnr": psnr}
+
+def parse_target(value):
+    """'ssim:0.985' / 'psnr:40' → ('ssim', 0.985). Κενό ή λάθος → None."""
+    try:
+        metric, thr = (value or "").split(":", 1)
+        metric = metric.strip().lower()
+        return (metric, float(thr)) if metric in METRICS else None
+    except ValueError:
+        return None
+
+def _score(ref, data, metric):
+    with Image.open(io.BytesIO(data)) as im:
+        return METRICS[metric](ref, _luma(im))
+
+def encode_output(img, encoder=DEFAULT_ENCODER, quality=92, target=None, baseline=None):
+    """
+    Επιστρέφει (bytes, info). Με target=('ssim', 0.985) κάνει binary search στο quality
+    για το μικρότερο αρχείο που περνάει το όριο (το quality του χρήστη μένει ως ανώτατο).
+    info: encoder, ext, quality, bytes, baseline_bytes, saved_bytes, score.
+    baseline: True/False = μέτρηση του JPEG q92 ή όχι, None = πάντα με target, αλλιώς κατά ENCODE_BASELINE_SAMPLE.
+    Χωρίς μέτρηση baseline_bytes=None και saved_bytes=0.
+    """
+    if encoder not in ENCODERS or not _supported(encoder):
+        encoder = DEFAULT_ENCODER
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    score = None
+    if target:
+        metric, thr = target
+        ref = _luma(img)
+        lo, hi = TARGET_Q_MIN, max(TARGET_Q_MIN, min(TARGET_Q_MAX, int(quality)))
+        best_q, best, best_score = hi, None, None
+        while lo <= hi:
+            q = (lo + hi) // 2
+            data = _encode(img, encoder, q)
+            s = _score(ref, data, metric)
+            if s >= thr:
+                best_q, best, best_score = q, data, s
+                hi = q - 1
+            else:
+                lo = q + 1
+        if best is None:   # κανένα quality δεν πιάνει το όριο → το ανώτατο
+            best = _encode(img, encoder, best_q)
+            best_score = _score(ref, best, metric)
+        data, quality, score = best, best_q, round(best_score, 4)
+    else:
+        data = _encode(img, encoder, quality)
+
+    if encoder == "jpeg" and not target and int(quality) == BASELINE_QUALITY:
+        base = len(data)   # είναι ήδη το baseline, δωρεάν
+    elif baseline or (baseline is None and (target or (BASELINE_SAMPLE and random.random() < BASELINE_SAMPLE))):
+        base = len(_encode(img, "jpeg", BASELINE_QUALITY))
+    else:
+        base = None
+    return data, {
+        "encoder": encoder, "ext": ENCODERS[encoder]["ext"], "quality": int(quality),
+        "bytes": len(data), "baseline_bytes": base, "saved_bytes": base - len(data) if base else 0, "score": score,
+    }
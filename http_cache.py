@@ -0,0 +1,57 @@
+# http_cache.py — fingerprinted static URLs, immutable Cache-Control, ETag/304 και Range για downloads
+import os, io, re, hashlib
+from flask import request, send_file
+
+ASSET_MAX_AGE_S = int(os.getenv("ASSET_MAX_AGE_SECONDS") or 365 * 24 * 3600)
+IMMUTABLE = f"public, max-age={ASSET_MAX_AGE_S}, immutable"
+
+# outputs/ab/cd/<sha256>.<ext>: το όνομα είναι το hash του περιεχομένου, άρα δεν αλλάζει ποτέ
+_BLOB_RE = re.compile(r"^/static/outputs/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$")
+
+_versions = {}   # filename → (mtime, size, hash)
+
+def asset_version(static_folder, filename):
+    """Σύντομο hash περιεχομένου· ξαναϋπολογίζεται μόνο όταν αλλάξει mtime/size."""
+    path = os.path.join(static_folder, filename)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    hit = _versions.get(filename)
+    if hit and hit[0] == st.st_mtime and hit[1] == st.st_size:
+        return hit[2]
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    v = h.hexdigest()[:10]
+    _versions[filename] = (st.st_mtime, st.st_size, v)
+    return v
+
+def send_bytes(data, mimetype, download_name=None, last_modified=None):
+    """
+    send_file για bytes στη μνήμη με ETag από το περιεχόμενο: 304 σε If-None-Match,
+    206 σε Range (και If-Range), ώστε ένα κομμένο download να συνεχίζει.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return send_file(io.BytesIO(data), mimetype=mimetype, as_attachment=bool(download_name),
+                     download_name=download_name, conditional=True, last_modified=last_modified,
+                     etag=hashlib.sha1(data).hexdigest()[:20], max_age=0)
+
+def init_app(app):
+    @app.url_defaults
+    def _static_fingerprint(endpoint, values):
+        # url_for('static', filename='style.css') → /static/style.css?v=<hash>
+        if endpoint == "static" and "filename" in values and "v" not in values:
+            v = asset_version(app.static_folder, values["filename"])
+            if v:
+                values["v"] = v
+
+    @app.after_request
+    def _static_cache_headers(resp):
+        if not request.path.startswith("/static/") or resp.status_code not in (200, 206, 304):
+            return resp
+        if request.args.get("v") or _BLOB_RE.match(request.path):
+            resp.headers["Cache-Control"] = IMMUTABLE
+        return resp
@@ -0,0 +1,126 @@
+# idempotency.py — ίδιο αίτημα δύο φορές (double-click, retry του browser) → μία εκτέλεση
+# Το key το στέλνει ο client (Idempotency-Key / idempotency_key) ή βγαίνει από πηγή + επιλογές.
+# Ολοκληρωμένα: το αποτέλεσμα μένει στο media.db και επιστρέφεται αμέσως. Σε εξέλιξη: τα διπλά
+# περιμένουν το πρώτο (και από άλλον gunicorn worker, μέσω sqlite).
+import os, json, time, hashlib, threading
+from media_db import get_conn
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+IDEMPOTENCY_TTL_S   = _env_int("IDEMPOTENCY_TTL_SECONDS", 24 * 3600)   # πόσο κρατάμε ολοκληρωμένα
+IDEMPOTENCY_WAIT_S  = _env_int("IDEMPOTENCY_WAIT_SECONDS", 120)        # πόσο περιμένει ένα διπλό
+IDEMPOTENCY_LEASE_S = _env_int("IDEMPOTENCY_LEASE_SECONDS", 300)       # μετά, «running» θεωρείται νεκρό
+POLL_S = 0.25
+
+_events = {}   # key → Event, για γρήγορο ξύπνημα μέσα στο ίδιο process
+_events_lock = threading.Lock()
+_stats = {"runs": 0, "replayed": 0, "waited": 0, "failed": 0}
+
+class InFlight(RuntimeError):
+    """Το πρώτο αίτημα με το ίδιο key δεν τελείωσε μέσα στο IDEMPOTENCY_WAIT_S."""
+
+def init_db():
+    with get_conn() as con:
+        con.execute("""
+        CREATE TABLE IF NOT EXISTS idempotency (
+            key TEXT PRIMARY KEY,         -- sha256 (client key + πηγή + επιλογές)
+            status TEXT NOT NULL,         -- running / done
+            result TEXT,                  -- json αποτέλεσμα (π.χ. paths των outputs)
+            locked_until REAL,            -- lease όσο τρέχει
+            created_at REAL NOT NULL,
+            finished_at REAL
+        )""")
+init_db()
+
+def derive_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def _event(key):
+    with _events_lock:
+        return _events.setdefault(key, threading.Event())
+
+def _release(key):
+    with _events_lock:
+        ev = _events.pop(key, None)
+    if ev:
+        ev.set()
+
+def _claim(key):
+    """('run', None) αν το πήραμε εμείς, ('done', result) αν υπάρχει αποτέλεσμα, ('wait', None) αν τρέχει αλλού."""
+    now = time.time()
+    con = get_conn()
+    con.isolation_level = None
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        con.execute("DELETE FROM idempotency WHERE status='done' AND finished_at<?", (now - IDEMPOTENCY_TTL_S,))
+        row = con.execute("SELECT * FROM idempotency WHERE key=?", (key,)).fetchone()
+        if row and row["status"] == "done":
+            con.execute("COMMIT")
+            return "done", json.loads(row["result"])
+        if row and row["locked_until"] >= now:
+            con.execute("COMMIT")
+            return "wait", None
+        # καινούργιο ή «running» που έχασε το lease (process πέθανε στη μέση)
+        con.execute("INSERT OR REPLACE INTO idempotency (key, status, locked_until, created_at) "
+                    "VALUES (?, 'running', ?, ?)", (key, now + IDEMPOTENCY_LEASE_S, now))
+        con.execute("COMMIT")
+        return "run", None
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    finally:
+        con.close()
+
+def _finish(key, result):
+    with get_conn() as con:
+        con.execute("UPDATE idempotency SET status='done', result=?, locked_until=NULL, finished_at=? WHERE key=?",
+                    (json.dumps(result), time.time(), key))
+
+def forget(key):
+    with get_conn() as con:
+        con.execute("DELETE FROM idempotency WHERE key=?", (key,))
+
+def run_once(key, fn, wait=IDEMPOTENCY_WAIT_S, valid=None):
+    """
+    Εκτελεί fn() μία φορά ανά key. Επιστρέφει (result, replayed). Το result πρέπει να είναι JSON.
+    valid(result) → False (π.χ. τα outputs σβήστηκαν από το retention): ξανατρέχει.
+    Αν το fn αποτύχει, το key ελευθερώνεται ώστε ένα retry να ξαναδοκιμάσει.
+    """
+    deadline = time.time() + wait
+    waited = False
+    while True:
+        state, result = _claim(key)
+        if state == "done":
+            if valid is None or valid(result):
+                _stats["replayed"] += 1
+                _stats["waited"] += waited
+                return result, True
+            forget(key)
+            continue
+        if state == "run":
+            break
+        waited = True
+        if time.time() >= deadline:
+            raise InFlight("Το ίδιο αίτημα εκτελείται ήδη· δοκίμασε ξανά σε λίγο.")
+        _event(key).wait(POLL_S)   # ίδιο process: ξυπνάει αμέσως· άλλο process: polling
+
+    try:
+        result = fn()
+    except BaseException:
+        _stats["failed"] += 1
+        forget(key)
+        _release(key)
+        raise
+    _finish(key, result)
+    _release(key)
+    _stats["runs"] += 1
+    return result, False
+
+def idempotency_stats():
+    with get_conn() as con:
+        rows = con.execute("SELECT status, COUNT(*) AS n FROM idempotency GROUP BY status").fetchall()
+    return {"process": dict(_stats), "keys": {r["status"]: r["n"] for r in rows}, "ttl_seconds": IDEMPOTENCY_TTL_S}
@@ -0,0 +1,244 @@
+# image_pipeline.py — decode/resize/watermark για το media pipeline (χωρίς Flask imports, τρέχει και σε worker processes)
+import os, threading, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image
+from watermark import add_watermark
+from encoders import encode_output
+from blob_store import put_bytes
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+MAX_IMAGE_PIXELS = _env_int("MAX_IMAGE_PIXELS", 40_000_000)   # ~40MP, π.χ. 8000×5000
+# Το Pillow πετάει DecompressionBombError στο 2× αυτού του ορίου — εμείς κόβουμε ήδη στο 1×.
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+class ImageTooLarge(ValueError):
+    pass
+
+def open_image(fp, max_pixels=MAX_IMAGE_PIXELS):
+    """
+    Ανοίγει εικόνα διαβάζοντας μόνο το header και ελέγχει τα pixels ΠΡΙΝ το πλήρες decode.
+    Επιστρέφει lazy PIL Image (ο caller κάνει convert/load).
+    """
+    try:
+        im = Image.open(fp)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLarge(str(e))
+    w, h = im.size
+    if max_pixels and w * h > max_pixels:
+        im.close()
+        raise ImageTooLarge(f"Image too large: {w}×{h} = {w*h} pixels (limit {max_pixels})")
+    return im
+
+# Resampling presets: ταχύτητα vs ποιότητα.
+#   draft_gap: JPEG decode απευθείας σε 1/2, 1/4 ή 1/8 (libjpeg DCT scaling) μέχρι size×draft_gap
+#   reducing_gap: ακέραιο reduce() πριν το τελικό resample (βλ. Image.resize)
+RESAMPLE_PRESETS = {
+    "fast":     {"draft_gap": 1.0,  "resample": Image.Resampling.BILINEAR, "reducing_gap": 1.5},
+    "balanced": {"draft_gap": 1.0,  "resample": Image.Resampling.BICUBIC,  "reducing_gap": 3.0},
+    "quality":  {"draft_gap": None, "resample": Image.Resampling.LANCZOS,  "reducing_gap": None},
+}
+DEFAULT_PRESET = os.getenv("RESAMPLE_PRESET") or "balanced"
+
+def _preset(name):
+    return RESAMPLE_PRESETS.get(name or DEFAULT_PRESET) or RESAMPLE_PRESETS["balanced"]
+
+def decode_for_size(fp, size=None, preset=None):
+    """
+    Decode σε RGB. Αν ξέρουμε το τελικό size και η πηγή είναι JPEG, ζητάμε από το libjpeg
+    reduced-scale decode (draft) ώστε μια 6000×4000 να μη γίνει ποτέ πλήρες bitmap.
+    """
+    p = _preset(preset)
+    with open_image(fp) as im:
+        if size and p["draft_gap"] and im.format == "JPEG":
+            g = p["draft_gap"]
+            im.draft("RGB", (int(size[0] * g), int(size[1] * g)))
+        return im.convert("RGB")
+
+def resize_to(img, size, preset=None):
+    size = tuple(size)
+    if img.size == size:
+        return img
+    p = _preset(preset)
+    return img.resize(size, resample=p["resample"], reducing_gap=p["reducing_gap"])
+
+def bounding_size(sizes):
+    """Το μικρότερο size που «χωράει» όλα τα targets (None αν κάποιο θέλει την αρχική ανάλυση)."""
+    if not sizes or any(s is None for s in sizes):
+        return None
+    return (max(s[0] for s in sizes), max(s[1] for s in sizes))
+
+def render_one(img, size=None, wm_style="soft", preset=None):
+    out = resize_to(img, size, preset) if size else img
+    # το img μοιράζεται ανάμεσα στα rendition threads: in-place μόνο αν το resize έδωσε νέα εικόνα
+    out = add_watermark(out, style=wm_style, inplace=out is not img)
+    return out if out.mode == "RGB" else out.convert("RGB")
+
+RENDITION_THREADS = _env_int("RENDITION_THREADS", 6)
+_threads = None
+_threads_lock = threading.Lock()
+
+def _get_threads():
+    global _threads
+    with _threads_lock:
+        if _threads is None:
+            _threads = ThreadPoolExecutor(max_workers=RENDITION_THREADS, thread_name_prefix="rendition")
+        return _threads
+
+def _reset_after_fork():
+    # fork από process που είχε ήδη threads: το copy του executor δεν έχει workers
+    global _threads, _threads_lock
+    _threads, _threads_lock = None, threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def render_many(img, sizes, wm_style="soft", preset=None):
+    """Renditions από το ίδιο decoded image, παράλληλα (resize/encode του Pillow αφήνουν το GIL)."""
+    if len(sizes) <= 1:
+        return [render_one(img, s, wm_style, preset) for s in sizes]
+    img.load()
+    return list(_get_threads().map(lambda s: render_one(img, s, wm_style, preset), sizes))
+
+def _render_encoded(src_path, sizes, wm_style, quality, preset, encoder, target, sink, reuse=None):
+    img = decode_for_size(src_path, bounding_size(sizes), preset)
+    img.load()
+    # pHash dedupe με την εικόνα που μόλις έγινε decode: ό,τι βρεθεί έτοιμο δεν ξαναγίνεται
+    h, hits = reuse(img) if reuse else (None, {})
+
+    def one(i):
+        if i in hits:
+            return hits[i]
+        out = render_one(img, sizes[i], wm_style, preset)
+        data, info = encode_output(out, encoder or "jpeg", quality, target)
+        info["width"], info["height"] = out.size
+        return sink(data, info)
+
+    todo = [i for i in range(len(sizes)) if i not in hits]
+    res = [one(i) for i in range(len(sizes))] if len(todo) <= 1 else list(_get_threads().map(one, range(len(sizes))))
+    if h:
+        for info in res:
+            info["phash"] = h
+    return res
+
+def _to_store(data, info):
+    info["path"], info["sha256"] = put_bytes(data, info["ext"])
+    return info
+
+def render_file(src_path, sizes, wm_style="soft", quality=92, preset=None, encoder=None, target=None, reuse=None):
+    """
+    decode (μία φορά) → resize/watermark/encode ανά size, παράλληλα σε threads → blob store.
+    Τρέχει μέσα σε worker process: πάνε/έρχονται μόνο paths και μικρά dicts, όχι pixels.
+    Κάθε info έχει path (content-addressed blob) και sha256.
+    reuse(img) → (phash, {θέση: info}) (βλ. phash.find_renditions): οι θέσεις που βρέθηκαν έτοιμες
+    επιστρέφουν αυτό το info αντί για νέο render, και κάθε info παίρνει "phash" της πηγής.
+    """
+    return _render_encoded(src_path, sizes, wm_style, quality, preset, encoder, target, _to_store, reuse)
+
+def render_bytes(src_path, sizes, wm_style="soft", quality=92, preset=None, encoder=None, target=None):
+    """Όπως το render_file αλλά χωρίς αποθήκευση: [(encoded bytes, info), ...] (π.χ. για batch ZIP)."""
+    return _render_encoded(src_path, sizes, wm_style, quality, preset, encoder, target, lambda d, i: (d, i))
+
+# ---------- Process pool (PIL δουλειά εκτός GIL των request threads) ----------
+MEDIA_PROCESS_WORKERS = _env_int("MEDIA_PROCESS_WORKERS", max(1, min(4, os.cpu_count() or 1)))
+MEDIA_POOL_ENABLED    = (os.getenv("MEDIA_POOL_ENABLED") or "1") != "0"
+MEDIA_POOL_QUEUE      = _env_int("MEDIA_POOL_QUEUE", MEDIA_PROCESS_WORKERS * 2)   # in-flight + αναμονή
+MEDIA_POOL_WAIT_S     = _env_int("MEDIA_POOL_WAIT_S", 30)
+# background δουλειά (/media/batch, bulk import): το πολύ τόσες θέσεις από το MEDIA_POOL_QUEUE,
+# οι υπόλοιπες μένουν πάντα για τα interactive requests (/upload, /media/import, sprite)
+MEDIA_POOL_BACKGROUND = max(1, min(_env_int("MEDIA_POOL_BACKGROUND", MEDIA_POOL_QUEUE // 2), MEDIA_POOL_QUEUE - 1))
+# forkserver: workers από «καθαρό» process (όχι fork ενός multi-threaded Flask/gunicorn worker)
+MEDIA_POOL_START      = os.getenv("MEDIA_POOL_START") or (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+class PoolBusy(RuntimeError):
+    pass
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(1, MEDIA_POOL_QUEUE))
+_bg_slots = threading.BoundedSemaphore(MEDIA_POOL_BACKGROUND)
+_in_flight = 0
+_stats = {"jobs": 0, "rejected": 0, "broken": 0}
+
+def _warm():
+    # φορτώνει plugins/fonts/encoders μία φορά ανά worker, πριν έρθει πραγματική δουλειά
+    Image.init()
+    from watermark import watermark_tile, WATERMARK_TEXT
+    for w in (1024, 1280):   # πλάτη των ASPECT_SIZES
+        watermark_tile(WATERMARK_TEXT, "soft", w)
+        watermark_tile(WATERMARK_TEXT, "badge", w)
+    encode_output(Image.new("RGB", (64, 64)), "jpeg", 80)
+    return os.getpid()
+
+def in_pool_child():
+    """
+    True μέσα σε pool worker — και ενώ αυτός ξαναφορτώνει το main module (__mp_main__, π.χ. app.py),
+    όπου δεν πρέπει να ξεκινήσουν threads/pools. Οι gunicorn workers (os.fork) μένουν "MainProcess".
+    """
+    return multiprocessing.parent_process() is not None or multiprocessing.current_process().name != "MainProcess"
+
+def get_process_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            ctx = multiprocessing.get_context(MEDIA_POOL_START)
+            if MEDIA_POOL_START == "forkserver":
+                ctx.set_forkserver_preload(["image_pipeline"])
+            _pool = ProcessPoolExecutor(max_workers=MEDIA_PROCESS_WORKERS, mp_context=ctx)
+        return _pool
+
+def warm_pool():
+    """Ξεκινάει όλους τους workers και τους «ζεσταίνει». Επιστρέφει τα pids τους."""
+    if not MEDIA_POOL_ENABLED or in_pool_child():
+        return []
+    pool = get_process_pool()
+    return sorted({f.result() for f in [pool.submit(_warm) for _ in range(MEDIA_PROCESS_WORKERS * 2)]})
+
+def run_in_pool(fn, *args, wait=MEDIA_POOL_WAIT_S, background=False):
+    """
+    Τρέχει fn(*args) σε worker process. Το πλήθος jobs (τρέχοντα + σε αναμονή) είναι φραγμένο
+    από MEDIA_POOL_QUEUE: αν δεν βρεθεί θέση σε `wait` δευτερόλεπτα → PoolBusy (None = περιμένει).
+    background=True: περνάει πρώτα από το MEDIA_POOL_BACKGROUND, ώστε ένα batch να μη γεμίζει την ουρά.
+    """
+    global _pool, _in_flight
+    if not MEDIA_POOL_ENABLED:
+        return fn(*args)
+    if background and not _bg_slots.acquire(timeout=wait):
+        _stats["rejected"] += 1
+        raise PoolBusy(f"Image workers busy ({MEDIA_POOL_BACKGROUND} background jobs queued), try again")
+    try:
+        if not _slots.acquire(timeout=wait):
+            _stats["rejected"] += 1
+            raise PoolBusy(f"Image workers busy ({MEDIA_POOL_QUEUE} jobs queued), try again")
+    except BaseException:
+        if background:
+            _bg_slots.release()
+        raise
+    _in_flight += 1
+    try:
+        try:
+            return get_process_pool().submit(fn, *args).result()
+        except BrokenProcessPool:
+            # worker πέθανε (π.χ. OOM): νέο pool και μία ακόμη προσπάθεια
+            _stats["broken"] += 1
+            with _pool_lock:
+                _pool = None
+            return get_process_pool().submit(fn, *args).result()
+    finally:
+        _in_flight -= 1
+        _stats["jobs"] += 1
+        _slots.release()
+        if background:
+            _bg_slots.release()
+
+def pool_stats():
+    return {"enabled": MEDIA_POOL_ENABLED, "start_method": MEDIA_POOL_START,
+            "workers": MEDIA_PROCESS_WORKERS, "queue_limit": MEDIA_POOL_QUEUE,
+            "background_limit": MEDIA_POOL_BACKGROUND,
+            "in_flight": _in_flight, **_stats}
@@ -0,0 +1,123 @@
+# local_captions.py — offline γεννήτρια captions: templates + snippet library, χωρίς δίκτυο (< 50 ms)
+# Fallback όταν το OpenAI αργεί ή είναι κάτω. Τα snippets (instance/snippets.db) φορτώνονται μία φορά
+# και ξαναδιαβάζονται μόνο όταν αλλάξει το αρχείο· η παραγωγή είναι καθαρά in-memory.
+import os, re, random, sqlite3, threading
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+SNIPPETS_DB = os.path.join(BASE_DIR, "instance", "snippets.db")
+
+KIND_MAP = {"hook": "hooks", "caption": "captions", "cta": "ctas", "mixed": "captions"}
+
+TONE_EMOJIS = {
+    "energetic": ["⚡", "🔥", "🚀", "💥"], "friendly": ["😊", "🙌", "💛", "✨"],
+    "luxury": ["✨", "🖤", "💎", "🥂"], "minimal": ["▫️", "•", "—"],
+    "funny": ["😂", "🙃", "🤪", "😎"], "edgy": ["🖤", "⚡", "🔥", "💀"], "playful": ["🎉", "🌈", "😜", "🎈"],
+}
+
+TEMPLATES = {
+    "el": {
+        "hooks": ["{Topic}: αυτό που έψαχνες {e}", "Σταμάτα το scroll — {topic} {e}", "Μόνο για λίγο: {topic} {e}",
+                  "Το {topic} που θα δεις παντού {e}", "Έτοιμος/η για {topic}; {e}", "{Kw} — και δεν είναι υπερβολή {e}"],
+        "captions": ["{Topic} με {kw} για κάθε μέρα {e}", "Νέα άφιξη: {topic}. {Kw}, όπως το θέλεις {e}",
+                     "Κάθε λεπτομέρεια μετράει — {topic} {e}", "Το {topic} που ταιριάζει στο στιλ σου {e}",
+                     "{Kw} και άνεση σε ένα: {topic} {e}", "Φτιαγμένο για να ξεχωρίζει: {topic} {e}",
+                     "Ανακάλυψε το {topic} — {kw} σε κάθε βήμα {e}", "Λιγότερα λόγια, περισσότερο {topic} {e}",
+                     "{Topic}: ποιότητα που φαίνεται {e}", "Το νέο σου αγαπημένο: {topic} {e}"],
+        "ctas": ["Δες το τώρα στο link στο bio {e}", "Παράγγειλε σήμερα {e}", "Γράψε «θέλω» στα σχόλια {e}",
+                 "Κάνε save για αργότερα {e}", "Στείλ' το σε κάποιον που το χρειάζεται {e}", "Μόνο σήμερα — πάτα το link {e}"],
+    },
+    "en": {
+        "hooks": ["{Topic}: the one you were looking for {e}", "Stop scrolling — {topic} {e}", "For a limited time: {topic} {e}",
+                  "The {topic} everyone will be talking about {e}", "Ready for {topic}? {e}", "{Kw} — no exaggeration {e}"],
+        "captions": ["{Topic} with {kw} for every day {e}", "Just dropped: {topic}. {Kw}, your way {e}",
+                     "Every detail matters — {topic} {e}", "The {topic} that fits your style {e}",
+                     "{Kw} and comfort in one: {topic} {e}", "Made to stand out: {topic} {e}",
+                     "Discover {topic} — {kw} at every step {e}", "Less talk, more {topic} {e}",
+                     "{Topic}: quality you can see {e}", "Your new favourite: {topic} {e}"],
+        "ctas": ["Shop now via the link in bio {e}", "Order yours today {e}", "Comment \"want\" below {e}",
+                 "Save this for later {e}", "Send this to someone who needs it {e}", "Today only — tap the link {e}"],
+    },
+}
+
+_cache = {"mtime": None, "rows": []}
+_cache_lock = threading.Lock()
+
+def _words(text):
+    return [w for w in re.findall(r"[\wάέήίόύώϊϋΐΰ]+", (text or "").lower()) if len(w) > 2]
+
+def _snippets():
+    """Όλα τα snippets στη μνήμη· ξαναφόρτωμα μόνο σε αλλαγή mtime του snippets.db."""
+    try:
+        mtime = os.path.getmtime(SNIPPETS_DB)
+    except OSError:
+        return []
+    with _cache_lock:
+        if _cache["mtime"] != mtime:
+            try:
+                con = sqlite3.connect(f"file:{SNIPPETS_DB}?mode=ro", uri=True)
+                rows = con.execute("SELECT platform, lang, kind, text, tags FROM snippets").fetchall()
+                con.close()
+            except sqlite3.Error:
+                rows = []
+            _cache["rows"] = [{"platform": (p or "").lower(), "lang": (l or "").lower(),
+                               "kind": KIND_MAP.get((k or "caption").lower(), "captions"), "text": t.strip(),
+                               "tags": {x.strip().lower() for x in (tg or "").split(",") if x.strip()}}
+                              for p, l, k, t, tg in rows if t and t.strip()]
+            _cache["mtime"] = mtime
+        return _cache["rows"]
+
+def _pick_snippets(section, words, platform, lang, limit):
+    # ίδια γλώσσα (ή χωρίς γλώσσα)· σκορ: tags/λέξεις του θέματος > πλατφόρμα
+    scored = []
+    for s in _snippets():
+        if s["kind"] != section or (s["lang"] and s["lang"] != lang):
+            continue
+        hit = len(words & s["tags"]) * 2 + len(words & set(_words(s["text"])))
+        if not hit:
+            continue
+        scored.append((hit + (1 if s["platform"] == platform else 0), s["text"]))
+    scored.sort(key=lambda x: -x[0])
+    return [t for _, t in scored[:limit]]
+
+def _fill(tpl, topic, kw, emoji):
+    line = tpl.format(topic=topic, Topic=topic[:1].upper() + topic[1:], kw=kw, Kw=kw[:1].upper() + kw[1:], e=emoji)
+    return re.sub(r"\s+", " ", line).strip()
+
+def generate_local(topic, n=6, platform="Instagram", lang="el", tone="energetic", keywords="",
+                   want_emojis=True, want_hashtags=True):
+    """Ίδιο σχήμα με το generate_captions: {hooks, captions, ctas, hashtags}. Σταθερό για ίδια είσοδο."""
+    topic = (topic or "").strip()
+    lang = lang if lang in TEMPLATES else "en"
+    n_hooks, n_caps, n_ctas = max(2, min(6, (n+1)//2)), n, max(2, min(6, (n+1)//2))
+    kws = [k.strip() for k in re.split(r"[,;]", keywords or "") if k.strip()]
+    words = set(_words(topic)) | {w for k in kws for w in _words(k)}
+    rnd = random.Random(f"{topic}|{lang}|{tone}|{keywords}")
+    emojis = TONE_EMOJIS.get(tone, TONE_EMOJIS["energetic"]) if want_emojis else [""]
+    platform_l = (platform or "").lower()
+
+    out = {}
+    for section, count in (("hooks", n_hooks), ("captions", n_caps), ("ctas", n_ctas)):
+        lines = _pick_snippets(section, words, platform_l, lang, count)
+        tpls = TEMPLATES[lang][section][:]
+        if not kws:   # αλλιώς το {kw} γίνεται ξανά το θέμα: «Retro sneakers with retro sneakers…»
+            tpls = [t for t in tpls if "{kw}" not in t.lower()]
+        rnd.shuffle(tpls)
+        i = 0
+        while len(lines) < count and i < count * 3:
+            kw = kws[i % len(kws)] if kws else ""
+            line = _fill(tpls[i % len(tpls)], topic, kw, rnd.choice(emojis))
+            if line not in lines:
+                lines.append(line)
+            i += 1
+        out[section] = lines[:count]
+
+    tags = []
+    if want_hashtags:
+        for s in _snippets():
+            if words & s["tags"]:
+                tags += [t.replace(" ", "") for t in s["tags"]]
+        tags = [re.sub(r"[^\wάέήίόύώ]", "", t) for t in [topic.replace(" ", "")] + [k.replace(" ", "") for k in kws]
+                + sorted(words) + tags]
+        tags = list(dict.fromkeys(t.lower() for t in tags if t))
+    out["hashtags"] = tags[:15]
+    return out
@@ -0,0 +1,220 @@
+# media_db.py — sqlite για το media pipeline (outputs, upload queue)
+import os, json, time, sqlite3
+from datetime import datetime
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+INSTANCE_DIR = os.path.join(BASE_DIR, "instance")
+os.makedirs(INSTANCE_DIR, exist_ok=True)
+DB_PATH = os.path.join(INSTANCE_DIR, "media.db")
+
+def get_conn():
+    # timeout: πολλά threads/gunicorn workers γράφουν ταυτόχρονα — περιμένουμε το lock αντί για error
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+def _ensure_columns(con, table, cols):
+    # απλό migration: προσθέτει στήλες που λείπουν σε παλιά media.db
+    have = {r["name"] for r in con.execute(f"PRAGMA table_info({table})").fetchall()}
+    for name, decl in cols.items():
+        if name not in have:
+            con.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+def init_db():
+    with get_conn() as con:
+        con.execute("""
+        CREATE TABLE IF NOT EXISTS outputs (
+            id TEXT PRIMARY KEY,          -- public_id (= όνομα αρχείου χωρίς extension)
+            path TEXT NOT NULL,           -- σχετικό με static/, π.χ. outputs/ab/cd/<sha256>.jpg
+            kind TEXT,                    -- upload / import
+            aspect TEXT,
+            wm_style TEXT,
+            group_id TEXT,
+            bytes INTEGER,
+            created_at TEXT NOT NULL,
+            upload_status TEXT NOT NULL,  -- local / pending / uploading / done / failed
+            cloud_url TEXT
+        )""")
+        _ensure_columns(con, "outputs", {"encoder": "TEXT", "quality": "INTEGER", "baseline_bytes": "INTEGER",
+                                         "sha256": "TEXT",    # blob στο content-addressed store
+                                         "last_access": "REAL", "pinned": "INTEGER NOT NULL DEFAULT 0"})
+        con.execute("CREATE INDEX IF NOT EXISTS ix_outputs_sha256 ON outputs(sha256)")
+        con.execute("CREATE INDEX IF NOT EXISTS ix_outputs_path ON outputs(path)")
+        con.execute("""
+        CREATE TABLE IF NOT EXISTS upload_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            output_id TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            tags TEXT,                    -- comma separated
+            status TEXT NOT NULL,         -- pending / running / done / failed
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            locked_until REAL,
+            last_error TEXT,
+            created_at TEXT NOT NULL
+        )""")
+        con.execute("CREATE INDEX IF NOT EXISTS ix_upload_queue_due ON upload_queue(status, next_attempt_at)")
+        con.execute("""
+        CREATE TABLE IF NOT EXISTS source_hashes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            phash TEXT NOT NULL,          -- 64-bit perceptual hash της πηγής, 16 hex
+            aspect TEXT NOT NULL,
+            wm_style TEXT NOT NULL,
+            output_id TEXT NOT NULL,      -- outputs.id που βγήκε από αυτή την πηγή
+            src TEXT,
+            created_at TEXT NOT NULL
+        )""")
+        # encoder/quality/target/resample του output (phash.render_key): reuse μόνο για ίδιο format
+        _ensure_columns(con, "source_hashes", {"render": "TEXT"})
+        con.execute("""
+        CREATE TABLE IF NOT EXISTS bulk_jobs (
+            id TEXT PRIMARY KEY,
+            aspect TEXT NOT NULL,
+            wm_style TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            finished_at REAL
+        )""")
+        con.execute("""
+        CREATE TABLE IF NOT EXISTS bulk_items (
+            job_id TEXT NOT NULL,
+            idx INTEGER NOT NULL,
+            src TEXT NOT NULL,
+            status TEXT NOT NULL,         -- queued / downloading / processing / done / error
+            paths TEXT,                   -- json λίστα με /static/... URLs
+            bytes INTEGER,
+            saved_bytes INTEGER,
+            reused INTEGER,
+            error TEXT,
+            elapsed_ms INTEGER,
+            PRIMARY KEY (job_id, idx)
+        )""")
+init_db()
+
+def record_output(output_id, path, kind, aspect, wm_style, group_id=None, info=None, upload_status="local"):
+    info = info or {}
+    with get_conn() as con:
+        # UPSERT, όχι INSERT OR REPLACE: το replace ξαναγράφει το row με pinned=0
+        con.execute("""INSERT INTO outputs
+            (id, path, kind, aspect, wm_style, group_id, bytes, created_at, upload_status,
+             encoder, quality, baseline_bytes, sha256, last_access)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                path=excluded.path, kind=excluded.kind, aspect=excluded.aspect, wm_style=excluded.wm_style,
+                group_id=excluded.group_id, bytes=excluded.bytes, created_at=excluded.created_at,
+                upload_status=excluded.upload_status, encoder=excluded.encoder, quality=excluded.quality,
+                baseline_bytes=excluded.baseline_bytes, sha256=excluded.sha256, last_access=excluded.last_access""",
+            (output_id, path, kind, aspect, wm_style, group_id, info.get("bytes"),
+             info.get("created_at") or datetime.now().isoformat(timespec="seconds"), upload_status,
+             info.get("encoder"), info.get("quality"), info.get("baseline_bytes"), info.get("sha256"),
+             time.time()))
+
+def set_upload_status(output_id, status, cloud_url=None):
+    with get_conn() as con:
+        con.execute("UPDATE outputs SET upload_status=?, cloud_url=COALESCE(?, cloud_url) WHERE id=?",
+                    (status, cloud_url, output_id))
+
+def output_rows():
+    """{id: row} για το gallery."""
+    with get_conn() as con:
+        return {r["id"]: r for r in con.execute("SELECT * FROM outputs").fetchall()}
+
+def set_output_blob(output_id, path, sha256):
+    with get_conn() as con:
+        con.execute("UPDATE outputs SET path=?, sha256=? WHERE id=?", (path, sha256, output_id))
+
+def set_queue_file(old_path, new_path):
+    # pending uploads που δείχνουν σε αρχείο που μετακινήθηκε
+    with get_conn() as con:
+        con.execute("UPDATE upload_queue SET file_path=? WHERE file_path=? AND status IN ('pending','running')",
+                    (new_path, old_path))
+
+def get_output(output_id):
+    with get_conn() as con:
+        return con.execute("SELECT * FROM outputs WHERE id=?", (output_id,)).fetchone()
+
+def add_source_hash(phash, aspect, wm_style, output_id, src=None, render=None):
+    with get_conn() as con:
+        con.execute("""INSERT INTO source_hashes (phash, aspect, wm_style, output_id, src, created_at, render)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    (phash, aspect, wm_style, output_id, src, datetime.now().isoformat(timespec="seconds"), render))
+
+def source_hashes_since(last_id):
+    """Νέες εγγραφές (και από άλλους gunicorn workers) για incremental ενημέρωση του index."""
+    with get_conn() as con:
+        return con.execute("SELECT * FROM source_hashes WHERE id>? ORDER BY id", (last_id,)).fetchall()
+
+# ---------- Retention ----------
+def touch_paths(accessed):
+    """accessed = {path (σχετικό με static/): timestamp} — ένα UPDATE batch για πολλά hits."""
+    with get_conn() as con:
+        con.executemany("UPDATE outputs SET last_access=MAX(COALESCE(last_access, 0), ?) WHERE path=?",
+                        [(ts, path) for path, ts in accessed.items()])
+
+def set_pinned(output_id, pinned):
+    with get_conn() as con:
+        return con.execute("UPDATE outputs SET pinned=? WHERE id=?", (1 if pinned else 0, output_id)).rowcount
+
+def delete_outputs(ids):
+    """
+    Σβήνει rows (+ hashes, εκκρεμή uploads). Επιστρέφει τα paths που δεν τα χρησιμοποιεί πια
+    κανένα άλλο output (ίδιο blob μπορεί να ανήκει σε πολλά ids) — αυτά τα σβήνει ο caller.
+    """
+    if not ids:
+        return []
+    marks = ",".join("?" * len(ids))
+    with get_conn() as con:
+        paths = {r["path"] for r in con.execute(f"SELECT path FROM outputs WHERE id IN ({marks})", ids)}
+        con.execute(f"DELETE FROM outputs WHERE id IN ({marks})", ids)
+        con.execute(f"DELETE FROM source_hashes WHERE output_id IN ({marks})", ids)
+        con.execute(f"DELETE FROM upload_queue WHERE output_id IN ({marks}) AND status='pending'", ids)
+        still = {r["path"] for r in con.execute(
+            f"SELECT DISTINCT path FROM outputs WHERE path IN ({','.join('?' * len(paths))})", list(paths))}
+    return sorted(paths - still)
+
+# ---------- Bulk import jobs (κοινά για όλους τους gunicorn workers: το poll πέφτει σε οποιονδήποτε) ----------
+def create_bulk_job(job_id, aspect, wm_style, srcs, created_at):
+    with get_conn() as con:
+        con.execute("INSERT INTO bulk_jobs (id, aspect, wm_style, created_at) VALUES (?, ?, ?, ?)",
+                    (job_id, aspect, wm_style, created_at))
+        con.executemany("INSERT INTO bulk_items (job_id, idx, src, status) VALUES (?, ?, ?, 'queued')",
+                        [(job_id, i, s) for i, s in enumerate(srcs)])
+
+_BULK_ITEM_FIELDS = {"status", "paths", "bytes", "saved_bytes", "reused", "error", "elapsed_ms"}
+
+def update_bulk_item(job_id, idx, **fields):
+    fields = {k: v for k, v in fields.items() if k in _BULK_ITEM_FIELDS}
+    if "paths" in fields:
+        fields["paths"] = json.dumps(fields["paths"])
+    if not fields:
+        return
+    with get_conn() as con:
+        con.execute(f"UPDATE bulk_items SET {', '.join(f'{k}=?' for k in fields)} WHERE job_id=? AND idx=?",
+                    (*fields.values(), job_id, idx))
+
+def finish_bulk_job(job_id, finished_at):
+    with get_conn() as con:
+        con.execute("UPDATE bulk_jobs SET finished_at=? WHERE id=?", (finished_at, job_id))
+
+def get_bulk_job(job_id):
+    """(job row, [item dicts]) ή None."""
+    with get_conn() as con:
+        job = con.execute("SELECT * FROM bulk_jobs WHERE id=?", (job_id,)).fetchone()
+        if not job:
+            return None
+        items = con.execute("SELECT * FROM bulk_items WHERE job_id=? ORDER BY idx", (job_id,)).fetchall()
+    out = []
+    for r in items:
+        it = {k: r[k] for k in r.keys() if r[k] is not None and k not in ("job_id", "idx")}
+        if "paths" in it:
+            it["paths"] = json.loads(it["paths"])
+        out.append(it)
+    return job, out
+
+def delete_bulk_jobs_before(ts):
+    with get_conn() as con:
+        old = [r["id"] for r in con.execute("SELECT id FROM bulk_jobs WHERE created_at<?", (ts,))]
+        if old:
+            marks = ",".join("?" * len(old))
+            con.execute(f"DELETE FROM bulk_items WHERE job_id IN ({marks})", old)
+            con.execute(f"DELETE FROM bulk_jobs WHERE id IN ({marks})", old)
@@ -0,0 +1,225 @@
+# media_fetch.py — κοινό HTTP session (keep-alive pool) + on-disk cache για remote εικόνες
+import os, time, hashlib, sqlite3, threading, tempfile
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+BASE_DIR  = os.path.abspath(os.path.dirname(__file__))
+CACHE_DIR = os.path.join(BASE_DIR, "instance", "cache")
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+HTTP_POOL_CONNECTIONS = _env_int("HTTP_POOL_CONNECTIONS", 16)   # πόσα διαφορετικά hosts κρατάμε
+HTTP_POOL_MAXSIZE     = _env_int("HTTP_POOL_MAXSIZE", 32)       # keep-alive sockets ανά host
+HTTP_RETRIES          = _env_int("HTTP_RETRIES", 2)
+REMOTE_CACHE_MAX_MB   = _env_int("REMOTE_CACHE_MAX_MB", 512)
+REMOTE_CACHE_FRESH_S  = _env_int("REMOTE_CACHE_FRESH_SECONDS", 3600)  # όταν ο server δεν δίνει max-age
+REMOTE_MAX_BYTES      = _env_int("REMOTE_MAX_MB", 25) * 1024 * 1024     # όριο ανά download
+THUMB_CACHE_MAX_MB    = _env_int("THUMB_CACHE_MAX_MB", 64)
+THUMB_FRESH_S         = _env_int("THUMB_FRESH_SECONDS", 7 * 24 * 3600)   # τα CSE thumbnails δεν αλλάζουν
+THUMB_MAX_BYTES       = _env_int("THUMB_MAX_KB", 512) * 1024
+USER_AGENT = "ai-content-studio/1.0 (+requests)"
+
+# ---------- Session ----------
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """Ένα Session ανά process: επαναχρησιμοποιεί TCP/TLS συνδέσεις ανάμεσα στα requests."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                retry = Retry(total=HTTP_RETRIES, backoff_factor=0.3,
+                              status_forcelist=(502, 503, 504), allowed_methods=("GET", "HEAD"))
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS,
+                                      pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=retry)
+                s.mount("http://", adapter)
+                s.mount("https://", adapter)
+                s.headers["User-Agent"] = USER_AGENT
+                _session = s
+    return _session
+
+class RemoteTooLarge(ValueError):
+    pass
+
+# ---------- On-disk cache ----------
+class CachedFile:
+    def __init__(self, path, content_type, size, status):
+        self.path = path
+        self.content_type = content_type or ""
+        self.size = size
+        self.status = status   # hit | revalidated | miss
+
+def _freshness(resp, default_s):
+    cc = (resp.headers.get("Cache-Control") or "").lower()
+    if "no-store" in cc or "no-cache" in cc:
+        return 0
+    for part in cc.split(","):
+        part = part.strip()
+        if part.startswith("max-age="):
+            try:
+                return max(0, int(part[8:]))
+            except ValueError:
+                break
+    exp = resp.headers.get("Expires")
+    if exp:
+        try:
+            return max(0, int(parsedate_to_datetime(exp).timestamp() - time.time()))
+        except Exception:
+            pass
+    return default_s
+
+class RemoteCache:
+    """
+    Cache αρχείων ανά URL με ETag/Last-Modified revalidation, όριο μεγέθους και LRU eviction.
+    Το index είναι sqlite μέσα στον φάκελο ώστε να μοιράζεται ανάμεσα σε gunicorn workers.
+    """
+    def __init__(self, root, max_bytes, fresh_seconds=REMOTE_CACHE_FRESH_S, max_item_bytes=REMOTE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.fresh_seconds = fresh_seconds
+        self.max_item_bytes = max_item_bytes
+        os.makedirs(root, exist_ok=True)
+        self.db_path = os.path.join(root, "index.db")
+        with self._conn() as con:
+            con.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                fname TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                content_type TEXT,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )""")
+            con.execute("CREATE INDEX IF NOT EXISTS ix_entries_access ON entries(last_access)")
+
+    def _conn(self):
+        con = sqlite3.connect(self.db_path, timeout=30)
+        con.row_factory = sqlite3.Row
+        con.execute("PRAGMA journal_mode=WAL")
+        return con
+
+    def _path(self, fname):
+        return os.path.join(self.root, fname)
+
+    def lookup(self, url):
+        with self._conn() as con:
+            row = con.execute("SELECT * FROM entries WHERE url=?", (url,)).fetchone()
+        if row and not os.path.exists(self._path(row["fname"])):
+            return None
+        return row
+
+    def fetch(self, url, timeout=30):
+        now = time.time()
+        row = self.lookup(url)
+        if row and row["expires_at"] > now:
+            self._touch(url, now)
+            return CachedFile(self._path(row["fname"]), row["content_type"], row["size"], "hit")
+
+        headers = {}
+        if row and row["etag"]:
+            headers["If-None-Match"] = row["etag"]
+        if row and row["last_modified"]:
+            headers["If-Modified-Since"] = row["last_modified"]
+
+        with get_session().get(url, headers=headers, timeout=timeout, stream=True) as r:
+            if r.status_code == 304 and row:
+                expires = now + _freshness(r, self.fresh_seconds)
+                with self._conn() as con:
+                    con.execute("UPDATE entries SET fetched_at=?, expires_at=?, last_access=? WHERE url=?",
+                                (now, expires, now, url))
+                return CachedFile(self._path(row["fname"]), row["content_type"], row["size"], "revalidated")
+            r.raise_for_status()
+            limit = self.max_item_bytes
+            try:
+                declared = int(r.headers.get("Content-Length") or 0)
+            except ValueError:
+                declared = 0
+            if limit and declared > limit:
+                raise RemoteTooLarge(f"Remote file too large: {declared} bytes (limit {limit})")
+
+            fname = hashlib.sha256(url.encode("utf-8")).hexdigest()[:40] + ".bin"
+            fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".part")
+            size = 0
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    for chunk in r.iter_content(chunk_size=64 * 1024):
+                        if chunk:
+                            size += len(chunk)
+                            if limit and size > limit:
+                                raise RemoteTooLarge(f"Remote file exceeds {limit} bytes")
+                            out.write(chunk)
+                os.replace(tmp, self._path(fname))
+            except BaseException:
+                try: os.remove(tmp)
+                except OSError: pass
+                raise
+
+            content_type = r.headers.get("Content-Type", "")
+            with self._conn() as con:
+                con.execute("""INSERT OR REPLACE INTO entries
+                    (url, fname, etag, last_modified, content_type, size, fetched_at, expires_at, last_access)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (url, fname, r.headers.get("ETag"), r.headers.get("Last-Modified"), content_type,
+                     size, now, now + _freshness(r, self.fresh_seconds), now))
+
+        self.evict(keep=url)
+        return CachedFile(self._path(fname), content_type, size, "miss")
+
+    def _touch(self, url, now):
+        with self._conn() as con:
+            con.execute("UPDATE entries SET last_access=? WHERE url=?", (now, url))
+
+    def evict(self, keep=None):
+        """Σβήνει τα λιγότερο πρόσφατα χρησιμοποιημένα μέχρι να χωράμε στο max_bytes."""
+        with self._conn() as con:
+            total = con.execute("SELECT COALESCE(SUM(size),0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            freed = 0
+            for row in con.execute("SELECT url, fname, size FROM entries ORDER BY last_access ASC").fetchall():
+                if total - freed <= self.max_bytes:
+                    break
+                if row["url"] == keep:
+                    continue
+                try:
+                    os.remove(self._path(row["fname"]))
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue   # Windows: ανοιχτό αρχείο από άλλο request, το ξαναπιάνουμε αργότερα
+                con.execute("DELETE FROM entries WHERE url=?", (row["url"],))
+                freed += row["size"]
+            return freed
+
+_remote_cache = None
+
+def get_remote_cache():
+    global _remote_cache
+    if _remote_cache is None:
+        _remote_cache = RemoteCache(os.path.join(CACHE_DIR, "remote"), REMOTE_CACHE_MAX_MB * 1024 * 1024)
+    return _remote_cache
+
+_thumb_cache = None
+
+def get_thumb_cache():
+    """Ξεχωριστό (μικρό) cache για thumbnails, ώστε να μη σπρώχνουν έξω τις πλήρεις εικόνες."""
+    global _thumb_cache
+    if _thumb_cache is None:
+        _thumb_cache = RemoteCache(os.path.join(CACHE_DIR, "thumbs"), THUMB_CACHE_MAX_MB * 1024 * 1024,
+                                   fresh_seconds=THUMB_FRESH_S, max_item_bytes=THUMB_MAX_BYTES)
+    return _thumb_cache
+
+def fetch_remote(url, timeout=30):
+    """Κατεβάζει (ή δίνει από cache) ένα remote αρχείο και επιστρέφει CachedFile με τοπικό path."""
+    return get_remote_cache().fetch(url, timeout=timeout)
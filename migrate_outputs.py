@@ -0,0 +1,61 @@
+# migrate_outputs.py — μεταφέρει τα παλιά flat static/outputs/*.jpg|webp|avif στο content-addressed layout
+# Χρήση:  python migrate_outputs.py [--dry-run]
+# Ίδια bytes → ένα blob. Το id (όνομα χωρίς extension) μένει ίδιο στο media.db, άρα gallery/Cloudinary δεν αλλάζουν.
+import os, sys, argparse
+from datetime import datetime
+from blob_store import BLOB_ROOT, put_file, file_digest, blob_path
+from media_db import output_rows, record_output, set_output_blob, set_queue_file
+from routes_media import ASPECT_SIZES
+
+EXTS = (".jpg", ".jpeg", ".png", ".webp", ".avif")
+# όπως τα γράφει το _public_id: "1:1" → "1x1", "Facebook" → "Facebook"
+_ASPECT_BY_SAFE = {a.replace(":", "x").lower(): a for a in ASPECT_SIZES}
+
+def _guess(stem):
+    # upload_1x1_20250101_120000 / import_20250101_120000_ab12cd_Facebook → (kind, aspect)
+    parts = stem.split("_")
+    kind = parts[0] if parts and parts[0] in ("upload", "import") else "legacy"
+    aspect = next((_ASPECT_BY_SAFE[p.lower()] for p in parts[1:] if p.lower() in _ASPECT_BY_SAFE), "")
+    return kind, aspect
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+
+    rows = output_rows()
+    files = sorted(f for f in os.listdir(BLOB_ROOT)
+                   if os.path.isfile(os.path.join(BLOB_ROOT, f)) and f.lower().endswith(EXTS))
+    moved = dup = 0
+    seen = set()
+    for name in files:
+        src = os.path.join(BLOB_ROOT, name)
+        stem, ext = os.path.splitext(name)
+        ext = ext.lower().lstrip(".")
+        size = os.path.getsize(src)
+        created = datetime.fromtimestamp(os.path.getmtime(src)).isoformat(timespec="seconds")
+        if args.dry_run:
+            digest = file_digest(src)
+            dup += digest in seen
+            seen.add(digest)
+            print(f"{name} → {os.path.relpath(blob_path(digest, ext), BLOB_ROOT)}")
+            continue
+        path, digest = put_file(src, ext)
+        existed = digest in seen
+        seen.add(digest)
+        dup += existed
+        rel = os.path.relpath(path, os.path.dirname(BLOB_ROOT)).replace(os.sep, "/")
+        if stem in rows:
+            set_output_blob(stem, rel, digest)
+        else:
+            kind, aspect = _guess(stem)
+            record_output(stem, rel, kind, aspect, None,
+                          info={"bytes": size, "sha256": digest, "created_at": created})
+        set_queue_file(src, path)
+        moved += 1
+        print(f"{name} → {rel}" + (" (duplicate bytes)" if existed else ""))
+    print(f"{'would move' if args.dry_run else 'moved'} {len(files) if args.dry_run else moved} files, "
+          f"{dup} with identical bytes")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+# openai_client.py — OpenAI client με ρυθμιζόμενο httpx transport: pool, keep-alive, HTTP/2, timeouts, warm-up
+# Ένας client ανά process (gunicorn worker), φτιαγμένος μετά το fork· οι συνδέσεις μένουν ζεστές
+# ανάμεσα στα requests αντί για DNS + TLS + connect σε κάθε caption.
+import os, time, threading
+import httpx
+from openai import OpenAI, AsyncOpenAI
+
+try:   # HTTP/2: μόνο αν υπάρχει το h2 (pip install "httpx[http2]")
+    import h2  # noqa: F401
+    _HAVE_H2 = True
+except ImportError:
+    _HAVE_H2 = False
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+OPENAI_BASE_URL        = (os.getenv("OPENAI_BASE_URL") or "").strip() or None   # π.χ. τοπικός stub server
+OPENAI_MAX_CONNECTIONS = _env_int("OPENAI_MAX_CONNECTIONS", 20)
+OPENAI_MAX_KEEPALIVE   = _env_int("OPENAI_MAX_KEEPALIVE", 10)
+OPENAI_KEEPALIVE_S     = _env_float("OPENAI_KEEPALIVE_SECONDS", 60)
+OPENAI_HTTP2           = (os.getenv("OPENAI_HTTP2") or "0") != "0"
+OPENAI_CONNECT_TIMEOUT = _env_float("OPENAI_CONNECT_TIMEOUT", 5)
+OPENAI_READ_TIMEOUT    = _env_float("OPENAI_READ_TIMEOUT", 60)
+OPENAI_WRITE_TIMEOUT   = _env_float("OPENAI_WRITE_TIMEOUT", 10)
+OPENAI_POOL_TIMEOUT    = _env_float("OPENAI_POOL_TIMEOUT", 5)    # αναμονή για ελεύθερη σύνδεση
+OPENAI_MAX_RETRIES     = _env_int("OPENAI_MAX_RETRIES", 2)
+OPENAI_WARMUP          = (os.getenv("OPENAI_WARMUP") or "1") != "0"
+
+_stats = {"requests": 0, "errors": 0, "latency_ms_total": 0.0, "last_latency_ms": None,
+          "connects": 0, "tls_handshakes": 0,   # νέες συνδέσεις· requests - connects = keep-alive reuse
+          "http_versions": {}, "warmup_ms": None, "warmup_error": None}
+_stats_lock = threading.Lock()
+
+def make_timeout(connect=None, read=None):
+    """Timeout ανά κλήση: client.chat.completions.create(..., timeout=make_timeout(read=20))."""
+    return httpx.Timeout(connect=connect or OPENAI_CONNECT_TIMEOUT, read=read or OPENAI_READ_TIMEOUT,
+                         write=OPENAI_WRITE_TIMEOUT, pool=OPENAI_POOL_TIMEOUT)
+
+def _trace(event, info):
+    # httpcore "trace" extension (δημόσιο API): ένα connect_tcp ανά νέα σύνδεση, όχι σε reuse
+    if event == "connection.connect_tcp.complete":
+        with _stats_lock:
+            _stats["connects"] += 1
+    elif event == "connection.start_tls.complete":
+        with _stats_lock:
+            _stats["tls_handshakes"] += 1
+
+async def _trace_async(event, info):
+    _trace(event, info)
+
+def _on_request(req):
+    req.extensions["t0"] = time.perf_counter()
+    req.extensions["trace"] = _trace
+
+def _on_response(resp):
+    ms = (time.perf_counter() - resp.request.extensions.get("t0", time.perf_counter())) * 1000
+    with _stats_lock:
+        _stats["requests"] += 1
+        _stats["errors"] += resp.status_code >= 400
+        _stats["latency_ms_total"] += ms
+        _stats["last_latency_ms"] = round(ms, 1)
+        v = resp.http_version
+        _stats["http_versions"][v] = _stats["http_versions"].get(v, 0) + 1
+
+async def _on_request_async(req):
+    _on_request(req)
+    req.extensions["trace"] = _trace_async
+
+async def _on_response_async(resp):
+    _on_response(resp)
+
+def _transport_opts():
+    http2 = OPENAI_HTTP2 and _HAVE_H2
+    if OPENAI_HTTP2 and not _HAVE_H2:
+        print("OpenAI: OPENAI_HTTP2=1 αλλά λείπει το h2 → HTTP/1.1")
+    return {"http2": http2, "timeout": make_timeout(),
+            "limits": httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                                   max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+                                   keepalive_expiry=OPENAI_KEEPALIVE_S)}
+
+def make_http_client():
+    return httpx.Client(event_hooks={"request": [_on_request], "response": [_on_response]}, **_transport_opts())
+
+def make_async_openai_client(api_key):
+    """Για το hedging (openai_hedge.py): ίδιες ρυθμίσεις, httpx.AsyncClient· χρήση μόνο μέσα σε ένα event loop."""
+    http = httpx.AsyncClient(event_hooks={"request": [_on_request_async], "response": [_on_response_async]},
+                             **_transport_opts())
+    return AsyncOpenAI(api_key=api_key, base_url=OPENAI_BASE_URL, http_client=http,
+                       max_retries=OPENAI_MAX_RETRIES, timeout=make_timeout())
+
+def make_openai_client(api_key):
+    if not api_key:
+        return None
+    return OpenAI(api_key=api_key, base_url=OPENAI_BASE_URL, http_client=make_http_client(),
+                  max_retries=OPENAI_MAX_RETRIES, timeout=make_timeout())
+
+def warm_up(client):
+    """Ανοίγει μία σύνδεση (DNS + TLS) με ένα φτηνό GET /models· στο background, λάθη μόνο στα stats."""
+    if not client:
+        return
+    t0 = time.perf_counter()
+    try:
+        client.with_options(max_retries=0).models.list()
+        _stats["warmup_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    except Exception as e:
+        _stats["warmup_error"] = f"{e}"
+
+def start_warm_up(client):
+    if client and OPENAI_WARMUP:
+        threading.Thread(target=warm_up, args=(client,), name="openai-warm", daemon=True).start()
+
+def _pool_connections(client):
+    # Μόνο ενδεικτικό: το httpx δεν δίνει δημόσιο API για το pool, οπότε διαβάζουμε το httpcore.ConnectionPool
+    # του transport (ιδιωτικά attributes). Αν αλλάξουν σε άλλη έκδοση → None· τα connects/keepalive_reused
+    # του pool_stats έρχονται από το trace extension και δεν εξαρτώνται από αυτό.
+    try:
+        conns = client._client._transport._pool.connections
+    except AttributeError:
+        return None
+    return {"open": len(conns),
+            "idle": sum(1 for c in conns if c.is_idle()),
+            "active": sum(1 for c in conns if not c.is_idle() and not c.is_closed()),
+            "http2": sum(1 for c in conns if "HTTP/2" in c.info())}
+
+def pool_stats(client):
+    with _stats_lock:
+        s = dict(_stats, http_versions=dict(_stats["http_versions"]))
+    n = s.pop("latency_ms_total")
+    s["avg_latency_ms"] = round(n / s["requests"], 1) if s["requests"] else None
+    s["keepalive_reused"] = max(0, s["requests"] - s["connects"])
+    s["connections"] = _pool_connections(client) if client else None
+    s["config"] = {"base_url": OPENAI_BASE_URL or "https://api.openai.com/v1", "http2": OPENAI_HTTP2 and _HAVE_H2,
+                   "max_connections": OPENAI_MAX_CONNECTIONS, "max_keepalive": OPENAI_MAX_KEEPALIVE,
+                   "keepalive_seconds": OPENAI_KEEPALIVE_S,
+                   "timeouts": {"connect": OPENAI_CONNECT_TIMEOUT, "read": OPENAI_READ_TIMEOUT,
+                                "write": OPENAI_WRITE_TIMEOUT, "pool": OPENAI_POOL_TIMEOUT}}
+    return s
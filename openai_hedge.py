@@ -0,0 +1,134 @@
+# openai_hedge.py — hedged requests για το ουραίο latency των captions
+# Αν η πρώτη κλήση δεν απάντησε μέχρι το pXX των πρόσφατων latencies, φεύγει δεύτερη ίδια· όποια
+# έρθει πρώτη κερδίζει και η άλλη ακυρώνεται. Τρέχει σε AsyncOpenAI πάνω σε ένα background event
+# loop ανά process, ώστε η χαμένη κλήση να κόβεται πραγματικά (κλείνει η σύνδεση, ελευθερώνει slot).
+import os, time, asyncio, threading
+from collections import deque
+from openai_client import make_async_openai_client
+from openai_limits import acreate_completion, RateLimited, OPENAI_QUEUE_S
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+def _env_float(name, default):
+    try:
+        return float(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+OPENAI_HEDGE          = (os.getenv("OPENAI_HEDGE") or "0") != "0"
+HEDGE_PERCENTILE      = _env_int("OPENAI_HEDGE_PERCENTILE", 90)
+HEDGE_MIN_DELAY_S     = _env_float("OPENAI_HEDGE_MIN_DELAY_SECONDS", 1.5)
+HEDGE_DEFAULT_DELAY_S = _env_float("OPENAI_HEDGE_DEFAULT_DELAY_SECONDS", 6)   # πριν μαζευτούν δείγματα
+HEDGE_MAX_RATE        = _env_float("OPENAI_HEDGE_MAX_RATE", 0.1)   # το πολύ 10% των κλήσεων με hedge
+HEDGE_MIN_SAMPLES     = 20
+WINDOW                = 200
+
+_latencies = deque(maxlen=WINDOW)   # δευτερόλεπτα, μόνο επιτυχημένες κλήσεις
+_hedge_flags = deque(maxlen=WINDOW)   # True/False ανά κλήση, για το rate cap
+_lock = threading.Lock()
+_stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "skipped_rate_cap": 0, "skipped_no_slot": 0,
+          "cancelled": 0, "errors": 0}
+
+_loop = None
+_aclient = None
+_loop_lock = threading.Lock()
+
+def _percentile(values, p):
+    if not values:
+        return None
+    s = sorted(values)
+    return s[min(len(s) - 1, int(round(p / 100.0 * (len(s) - 1))))]
+
+def hedge_delay():
+    with _lock:
+        lat = list(_latencies)
+    if len(lat) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY_S
+    return max(HEDGE_MIN_DELAY_S, _percentile(lat, HEDGE_PERCENTILE))
+
+def _may_hedge():
+    with _lock:
+        n = len(_hedge_flags)
+        return n == 0 or sum(_hedge_flags) / n < HEDGE_MAX_RATE
+
+def _record(latency, hedged):
+    with _lock:
+        if latency is not None:
+            _latencies.append(latency)
+        _hedge_flags.append(hedged)
+
+def _get_loop(api_key):
+    """Ένα event loop σε daemon thread ανά process (lazy: μετά το fork του gunicorn worker)."""
+    global _loop, _aclient
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="openai-hedge-loop", daemon=True).start()
+            _aclient = make_async_openai_client(api_key)
+            _loop = loop
+    return _loop
+
+async def _timed(kwargs, queue_s):
+    t0 = time.perf_counter()
+    resp = await acreate_completion(_aclient, queue_s=queue_s, **kwargs)
+    return resp, time.perf_counter() - t0
+
+async def _hedged(kwargs, delay):
+    first = asyncio.ensure_future(_timed(kwargs, OPENAI_QUEUE_S))
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        resp, lat = first.result()
+        _record(lat, False)
+        return resp
+    if not _may_hedge():
+        _stats["skipped_rate_cap"] += 1
+        resp, lat = await first
+        _record(lat, False)
+        return resp
+
+    # queue_s=0: το hedge δεν περιμένει στην ουρά του limiter — αν δεν υπάρχει slot, δεν γίνεται
+    second = asyncio.ensure_future(_timed(kwargs, 0))
+    pending, error, sent = {first, second}, None, True
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for fu in done:
+            if fu.exception() is None:
+                for other in pending:
+                    other.cancel()
+                    _stats["cancelled"] += 1
+                resp, lat = fu.result()
+                _stats["hedged"] += sent
+                _stats["hedge_wins"] += fu is second
+                _record(lat, sent)
+                return resp
+            if fu is second and isinstance(fu.exception(), RateLimited):
+                sent = False
+                _stats["skipped_no_slot"] += 1
+            else:
+                error = error or fu.exception()
+    _stats["hedged"] += sent
+    _record(None, sent)
+    raise error or RuntimeError("hedged request failed")
+
+def hedged_completion(client, **kwargs):
+    """Σύγχρονο API (για Flask request threads): chat.completions.create με hedging."""
+    loop = _get_loop(client.api_key)
+    _stats["calls"] += 1
+    try:
+        return asyncio.run_coroutine_threadsafe(_hedged(kwargs, hedge_delay()), loop).result()
+    except Exception:
+        _stats["errors"] += 1
+        raise
+
+def hedge_stats():
+    with _lock:
+        lat = list(_latencies)
+        rate = sum(_hedge_flags) / len(_hedge_flags) if _hedge_flags else 0.0
+    pct = lambda p: round(_percentile(lat, p), 3) if lat else None
+    return dict(_stats, enabled=OPENAI_HEDGE, delay_s=round(hedge_delay(), 3), percentile=HEDGE_PERCENTILE,
+                max_rate=HEDGE_MAX_RATE, recent_hedge_rate=round(rate, 3), samples=len(lat),
+                p50_s=pct(50), p90_s=pct(90), p99_s=pct(99))
@@ -0,0 +1,281 @@
+# openai_limits.py — client-side rate limiting για το OpenAI: token buckets (RPM + TPM) και AIMD concurrency
+# Η κατάσταση είναι σε sqlite (instance/openai_limits.db), κοινή για όλους τους gunicorn workers.
+# Ένα burst από /captions περιμένει λίγο στην «ουρά» (μέχρι OPENAI_QUEUE_SECONDS) αντί να φάει 429.
+import os, re, time, uuid, random, sqlite3, asyncio
+from openai import RateLimitError, APIConnectionError, APIStatusError
+from openai_client import OPENAI_MAX_RETRIES
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+INSTANCE_DIR = os.path.join(BASE_DIR, "instance")
+os.makedirs(INSTANCE_DIR, exist_ok=True)
+DB_PATH = os.path.join(INSTANCE_DIR, "openai_limits.db")
+
+OPENAI_LIMITS_ENABLED  = (os.getenv("OPENAI_LIMITS_ENABLED") or "1") != "0"
+OPENAI_RPM             = _env_int("OPENAI_RPM", 500)       # όρια του tier του λογαριασμού
+OPENAI_TPM             = _env_int("OPENAI_TPM", 200000)
+OPENAI_MAX_CONCURRENCY = _env_int("OPENAI_MAX_CONCURRENCY", 8)
+OPENAI_MIN_CONCURRENCY = 1
+OPENAI_QUEUE_S         = _env_int("OPENAI_QUEUE_SECONDS", 15)   # πόσο περιμένει ένα request πριν τα παρατήσει
+LEASE_S                = 120     # slot που δεν ελευθερώθηκε (worker πέθανε) λήγει μετά από τόσο
+POLL_S                 = 0.2
+DECREASE               = 0.5     # multiplicative decrease σε 429
+RETRY_BASE_S           = 0.5     # backoff για transient σφάλματα (όπως το SDK): 0.5, 1, 2, … έως RETRY_MAX_S
+RETRY_MAX_S            = 8.0
+
+class RateLimited(RuntimeError):
+    """Το request δεν χώρεσε στα όρια μέσα στο deadline· μήνυμα για τον χρήστη."""
+
+def get_conn():
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+def init_db():
+    with get_conn() as con:
+        con.execute("""
+        CREATE TABLE IF NOT EXISTS buckets (
+            name TEXT PRIMARY KEY,        -- rpm / tpm
+            tokens REAL NOT NULL,         -- διαθέσιμα τώρα (μπορεί < 0 μετά από διόρθωση usage)
+            updated REAL NOT NULL
+        )""")
+        con.execute("""
+        CREATE TABLE IF NOT EXISTS limiter (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            concurrency REAL NOT NULL,    -- AIMD όριο ταυτόχρονων requests
+            blocked_until REAL NOT NULL,  -- Retry-After / reset headers: κανένα request πριν από αυτό
+            ok INTEGER NOT NULL DEFAULT 0,
+            throttled INTEGER NOT NULL DEFAULT 0,
+            rejected INTEGER NOT NULL DEFAULT 0
+        )""")
+        con.execute("""
+        CREATE TABLE IF NOT EXISTS leases (
+            id TEXT PRIMARY KEY,
+            expires REAL NOT NULL
+        )""")
+        now = time.time()
+        con.execute("INSERT OR IGNORE INTO buckets VALUES ('rpm', ?, ?)", (OPENAI_RPM, now))
+        con.execute("INSERT OR IGNORE INTO buckets VALUES ('tpm', ?, ?)", (OPENAI_TPM, now))
+        con.execute("INSERT OR IGNORE INTO limiter (id, concurrency, blocked_until) VALUES (1, ?, 0)",
+                    (OPENAI_MAX_CONCURRENCY,))
+init_db()
+
+_CAPACITY = {"rpm": OPENAI_RPM, "tpm": OPENAI_TPM}
+
+def _refill(con, now):
+    out = {}
+    for r in con.execute("SELECT * FROM buckets").fetchall():
+        cap = _CAPACITY[r["name"]]
+        out[r["name"]] = min(cap, r["tokens"] + (now - r["updated"]) * cap / 60.0)
+    return out
+
+def _txn(fn):
+    con = get_conn()
+    con.isolation_level = None
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        res = fn(con, time.time())
+        con.execute("COMMIT")
+        return res
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    finally:
+        con.close()
+
+def _try_acquire(est_tokens):
+    """Επιστρέφει (lease_id, 0) ή (None, δευτερόλεπτα αναμονής)."""
+    def step(con, now):
+        con.execute("DELETE FROM leases WHERE expires<?", (now,))
+        st = con.execute("SELECT * FROM limiter WHERE id=1").fetchone()
+        if st["blocked_until"] > now:
+            return None, st["blocked_until"] - now
+        if con.execute("SELECT COUNT(*) FROM leases").fetchone()[0] >= int(st["concurrency"]):
+            return None, POLL_S
+        tok = _refill(con, now)
+        need = min(est_tokens, OPENAI_TPM)   # ένα τεράστιο prompt δεν πρέπει να περιμένει για πάντα
+        if tok["rpm"] < 1 or tok["tpm"] < need:
+            wait_r = (1 - tok["rpm"]) * 60.0 / OPENAI_RPM if tok["rpm"] < 1 else 0
+            wait_t = (need - tok["tpm"]) * 60.0 / OPENAI_TPM if tok["tpm"] < need else 0
+            return None, max(wait_r, wait_t)
+        con.execute("UPDATE buckets SET tokens=?, updated=? WHERE name='rpm'", (tok["rpm"] - 1, now))
+        con.execute("UPDATE buckets SET tokens=?, updated=? WHERE name='tpm'", (tok["tpm"] - need, now))
+        lease = uuid.uuid4().hex
+        con.execute("INSERT INTO leases (id, expires) VALUES (?, ?)", (lease, now + LEASE_S))
+        return lease, 0
+    return _txn(step)
+
+def acquire(est_tokens, deadline):
+    while True:
+        lease, wait = _try_acquire(est_tokens)
+        if lease:
+            return lease
+        if time.time() + wait > deadline:
+            _txn(lambda con, now: con.execute("UPDATE limiter SET rejected=rejected+1 WHERE id=1"))
+            raise RateLimited(f"Πολλά αιτήματα στο OpenAI αυτή τη στιγμή — δοκίμασε ξανά σε ~{max(1, round(wait))} s.")
+        time.sleep(min(max(wait, 0.01), POLL_S * 5))
+
+def _duration(v):
+    """'1s', '6m0s', '250ms', '0.5' → δευτερόλεπτα (μορφή των x-ratelimit-reset-* headers)."""
+    if not v:
+        return None
+    try:
+        return float(v)
+    except ValueError:
+        pass
+    total, found = 0.0, False
+    for num, unit in re.findall(r"([\d.]+)(ms|h|m|s)", v):
+        total += float(num) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+        found = True
+    return total if found else None
+
+def release(lease, est_tokens, used_tokens=None, headers=None, throttled=False, failed=False):
+    """
+    Ελευθερώνει το slot. AIMD: +1/concurrency σε επιτυχία (≈ +1 ανά «γύρο»), ×DECREASE σε 429.
+    failed=True (σφάλμα δικτύου/5xx/ακύρωση): μόνο επιστροφή slot και tokens, το concurrency δεν μεγαλώνει.
+    Retry-After και x-ratelimit-remaining-*/reset-* μπλοκάρουν όλους τους workers μέχρι το reset.
+    """
+    headers = headers or {}
+    def step(con, now):
+        if lease:
+            con.execute("DELETE FROM leases WHERE id=?", (lease,))
+        st = con.execute("SELECT * FROM limiter WHERE id=1").fetchone()
+        conc, blocked = st["concurrency"], st["blocked_until"]
+        if throttled:
+            conc = max(OPENAI_MIN_CONCURRENCY, conc * DECREASE)
+            blocked = max(blocked, now + (_duration(headers.get("retry-after")) or 1.0))
+            con.execute("UPDATE limiter SET throttled=throttled+1 WHERE id=1")
+        elif not failed:
+            conc = min(OPENAI_MAX_CONCURRENCY, conc + 1.0 / conc)
+            con.execute("UPDATE limiter SET ok=ok+1 WHERE id=1")
+        for kind in ("requests", "tokens"):
+            if headers.get(f"x-ratelimit-remaining-{kind}") == "0":
+                reset = _duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                if reset:
+                    blocked = max(blocked, now + reset)
+        con.execute("UPDATE limiter SET concurrency=?, blocked_until=? WHERE id=1", (conc, blocked))
+        if used_tokens is not None and used_tokens != est_tokens:
+            # διόρθωση της εκτίμησης με το πραγματικό usage (επιστροφή ή επιπλέον χρέωση)
+            tok = _refill(con, now)["tpm"]
+            con.execute("UPDATE buckets SET tokens=?, updated=? WHERE name='tpm'",
+                        (min(OPENAI_TPM, tok + est_tokens - used_tokens), now))
+    _txn(step)
+
+def estimate_tokens(messages, max_output=800):
+    # συντηρητικά ~3 χαρακτήρες ανά token (τα ελληνικά βγάζουν περισσότερα)· το release το διορθώνει
+    return sum(len(m.get("content") or "") for m in messages) // 3 + max_output
+
+def _retry_delay(e, attempt):
+    """
+    Backoff πριν από το επόμενο retry ενός transient σφάλματος (timeout/σύνδεση, 408, 409, 5xx),
+    ή None αν το σφάλμα δεν ξαναδοκιμάζεται ή τελείωσαν τα OPENAI_MAX_RETRIES.
+    """
+    if attempt >= OPENAI_MAX_RETRIES:
+        return None
+    if isinstance(e, APIStatusError):
+        if e.status_code not in (408, 409) and e.status_code < 500:
+            return None
+        hinted = _duration(e.response.headers.get("retry-after"))
+        if hinted is not None and 0 < hinted <= 60:
+            return hinted
+    elif not isinstance(e, APIConnectionError):   # περιλαμβάνει και το APITimeoutError
+        return None
+    return min(RETRY_MAX_S, RETRY_BASE_S * 2 ** attempt) * random.uniform(0.75, 1.0)
+
+def create_completion(client, queue_s=OPENAI_QUEUE_S, est_output=800, **kwargs):
+    """
+    chat.completions.create μέσα από τα όρια. Τα retries τα κάνουμε εμείς (όχι το SDK): κάθε 429
+    μειώνει το concurrency και σέβεται το Retry-After μέχρι το deadline, και τα transient σφάλματα
+    (timeout, 5xx) ξαναδοκιμάζονται έως OPENAI_MAX_RETRIES φορές με backoff, με νέο slot κάθε φορά.
+    """
+    if not OPENAI_LIMITS_ENABLED:
+        return client.chat.completions.create(**kwargs)
+    est = estimate_tokens(kwargs.get("messages") or [], est_output)
+    deadline = time.time() + queue_s
+    api = client.with_options(max_retries=0)
+    attempt = 0
+    while True:
+        lease = acquire(est, deadline)
+        try:
+            raw = api.chat.completions.with_raw_response.create(**kwargs)
+        except RateLimitError as e:
+            release(lease, est, 0, e.response.headers, throttled=True)
+            if time.time() >= deadline:
+                raise RateLimited("Το OpenAI περιορίζει τα αιτήματα (429) — δοκίμασε ξανά σε λίγο.") from e
+            continue
+        except Exception as e:
+            release(lease, est, 0, failed=True)
+            delay = _retry_delay(e, attempt)
+            if delay is None:
+                raise
+            attempt += 1
+            time.sleep(delay)
+            deadline = max(deadline, time.time() + queue_s)   # το retry δικαιούται κανονική αναμονή για slot
+            continue
+        resp = raw.parse()
+        used = resp.usage.total_tokens if getattr(resp, "usage", None) else None
+        release(lease, est, used, raw.headers)
+        return resp
+
+async def acreate_completion(client, queue_s=OPENAI_QUEUE_S, est_output=800, **kwargs):
+    """
+    Το ίδιο για AsyncOpenAI (hedging). Τα sqlite βήματα τρέχουν σε thread για να μη σταματάει το loop.
+    queue_s=0: κανένα περιθώριο — αν δεν υπάρχει slot τώρα, RateLimited αμέσως.
+    Αν το task ακυρωθεί (χαμένο hedge), το slot ελευθερώνεται.
+    """
+    if not OPENAI_LIMITS_ENABLED:
+        return await client.chat.completions.create(**kwargs)
+    est = estimate_tokens(kwargs.get("messages") or [], est_output)
+    deadline = time.time() + queue_s
+    api = client.with_options(max_retries=0)
+    attempt = 0
+    while True:
+        fut = asyncio.get_running_loop().run_in_executor(None, acquire, est, deadline)
+        try:
+            lease = await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            # το acquire συνεχίζει στο thread· ό,τι slot πάρει το επιστρέφουμε
+            fut.add_done_callback(lambda f: f.cancelled() or f.exception() or release(f.result(), est, 0, failed=True))
+            raise
+        try:
+            raw = await api.chat.completions.with_raw_response.create(**kwargs)
+        except RateLimitError as e:
+            await asyncio.to_thread(release, lease, est, 0, e.response.headers, True)
+            if time.time() >= deadline:
+                raise RateLimited("Το OpenAI περιορίζει τα αιτήματα (429) — δοκίμασε ξανά σε λίγο.") from e
+            continue
+        except Exception as e:
+            await asyncio.to_thread(release, lease, est, 0, None, False, True)
+            delay = _retry_delay(e, attempt)
+            if delay is None:
+                raise
+            attempt += 1
+            await asyncio.sleep(delay)
+            deadline = max(deadline, time.time() + queue_s)
+            continue
+        except BaseException:
+            release(lease, est, 0, failed=True)   # CancelledError: σύντομο, χωρίς await
+            raise
+        resp = raw.parse()
+        used = resp.usage.total_tokens if getattr(resp, "usage", None) else None
+        await asyncio.to_thread(release, lease, est, used, raw.headers)
+        return resp
+
+def limits_stats():
+    def step(con, now):
+        st = dict(con.execute("SELECT * FROM limiter WHERE id=1").fetchone())
+        tok = _refill(con, now)
+        inflight = con.execute("SELECT COUNT(*) FROM leases WHERE expires>=?", (now,)).fetchone()[0]
+        return st, tok, inflight
+    st, tok, inflight = _txn(step)
+    return {"enabled": OPENAI_LIMITS_ENABLED, "rpm": OPENAI_RPM, "tpm": OPENAI_TPM,
+            "rpm_available": round(tok["rpm"], 1), "tpm_available": round(tok["tpm"]),
+            "concurrency": round(st["concurrency"], 2), "max_concurrency": OPENAI_MAX_CONCURRENCY,
+            "inflight": inflight, "blocked_for_s": round(max(0, st["blocked_until"] - time.time()), 2),
+            "ok": st["ok"], "throttled": st["throttled"], "rejected": st["rejected"], "queue_seconds": OPENAI_QUEUE_S}
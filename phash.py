@@ -0,0 +1,130 @@
+# phash.py — perceptual hash πηγών (pHash με NumPy DCT) + BK-tree για near-duplicate lookup
+import os, threading
+from PIL import Image
+from media_db import get_output, add_source_hash, source_hashes_since
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+PHASH_DEDUPE       = (os.getenv("PHASH_DEDUPE") or "1") != "0"
+PHASH_MAX_DISTANCE = _env_int("PHASH_MAX_DISTANCE", 6)   # bits από 64· ~<10 = ίδια φωτογραφία
+STATIC_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), "static")
+
+_dct = None
+
+def _dct_matrix(n=32):
+    import numpy as np
+    global _dct
+    if _dct is None:
+        k = np.arange(n)[:, None]
+        m = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+        m[0] /= np.sqrt(2.0)
+        _dct = m
+    return _dct
+
+def phash(img):
+    """64-bit pHash: 32×32 γκρι → 2D DCT → 8×8 χαμηλές συχνότητες → bit ανά τιμή > median."""
+    import numpy as np
+    g = np.asarray(img.convert("L").resize((32, 32), Image.Resampling.LANCZOS), dtype=np.float64)
+    d = _dct_matrix()
+    low = (d @ g @ d.T)[:8, :8].flatten()
+    bits = low > np.median(low[1:])   # χωρίς το DC, που κυριαρχεί
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+def image_hash(img):
+    """pHash (16 hex) εικόνας που έχει ήδη γίνει decode· πρώτα φτηνό reduce() κοντά στα 128 px."""
+    f = min(img.size) // 128
+    return f"{phash(img.reduce(f) if f > 1 else img):016x}"
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+class BKTree:
+    """Burkhard-Keller tree στη Hamming απόσταση: lookup σε ακτίνα r χωρίς να σαρώνει όλα τα hashes."""
+    def __init__(self):
+        self.root = None   # [hash, payloads, {distance: child}]
+        self.size = 0
+
+    def add(self, h, payload):
+        self.size += 1
+        if self.root is None:
+            self.root = [h, [payload], {}]
+            return
+        node = self.root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                node[1].append(payload)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [h, [payload], {}]
+                return
+            node = child
+
+    def search(self, h, radius):
+        """[(distance, payload), ...] ταξινομημένα από το πιο κοντινό."""
+        out, stack = [], [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= radius:
+                out.extend((d, p) for p in node[1])
+            for cd, child in node[2].items():
+                if d - radius <= cd <= d + radius:
+                    stack.append(child)
+        return sorted(out, key=lambda x: x[0])
+
+def render_key(encoder, quality, target, resample):
+    """Ό,τι αλλάζει το αρχείο πέρα από aspect/watermark: reuse μόνο αν το output βγήκε με τα ίδια."""
+    return f"{encoder}|q{quality}|{'%s:%g' % tuple(target) if target else '-'}|{resample}"
+
+class HashIndex:
+    """BK-tree ανά (aspect, wm_style, render_key), γεμίζει incrementally από το source_hashes του media.db."""
+    def __init__(self):
+        self._trees = {}
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        for r in source_hashes_since(self._last_id):
+            key = (r["aspect"], r["wm_style"], r["render"])   # render NULL: παλιές εγγραφές, χωρίς reuse
+            self._trees.setdefault(key, BKTree()).add(int(r["phash"], 16), r["output_id"])
+            self._last_id = r["id"]
+
+    def find(self, h, aspect, wm_style, render, radius=PHASH_MAX_DISTANCE, usable=None):
+        """(row του outputs, distance) για το πλησιέστερο output που περνάει το usable(row), ή None."""
+        with self._lock:
+            self._refresh()
+            tree = self._trees.get((aspect, wm_style, render))
+            hits = tree.search(int(h, 16), radius) if tree else []
+        for d, output_id in hits:
+            row = get_output(output_id)
+            if row and (usable is None or usable(row)):
+                return row, d
+        return None
+
+    def add(self, h, aspect, wm_style, render, output_id, src=None):
+        add_source_hash(h, aspect, wm_style, output_id, src, render)
+
+hash_index = HashIndex()
+
+def _output_exists(row):
+    return os.path.exists(os.path.join(STATIC_DIR, row["path"]))
+
+def find_renditions(aspects, wm_style, render, img):
+    """
+    reuse για το render_file: τρέχει στον pool worker με την εικόνα που έγινε ήδη decode εκεί
+    (το index γεμίζει από το media.db και σε αυτό το process). render = render_key του request. Επιστρέφει
+    (hash, {θέση στο aspects: {"reused": row dict, "distance": d}}) για όσα υπάρχουν ήδη.
+    """
+    h = image_hash(img)
+    hits = {}
+    for i, a in enumerate(aspects):
+        hit = hash_index.find(h, a, wm_style, render, usable=_output_exists)
+        if hit:
+            hits[i] = {"reused": dict(hit[0]), "distance": hit[1]}
+    return h, hits
@@ -0,0 +1,166 @@
+# retention.py — όριο χώρου/ηλικίας για static/outputs: LRU eviction σε μικρά βήματα, στο background
+import os, time, threading
+from media_db import get_conn, touch_paths, delete_outputs
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+BASE_DIR   = os.path.abspath(os.path.dirname(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+
+RETENTION_MAX_MB       = _env_int("RETENTION_MAX_MB", 0)         # 0 = χωρίς όριο χώρου (opt-in: σβήνει outputs)
+RETENTION_MAX_AGE_DAYS = _env_int("RETENTION_MAX_AGE_DAYS", 0)   # 0 = χωρίς όριο ηλικίας
+RETENTION_INTERVAL_S   = _env_int("RETENTION_INTERVAL_SECONDS", 300)
+RETENTION_BATCH        = _env_int("RETENTION_BATCH", 100)        # outputs ανά βήμα (κρατάει τα locks σύντομα)
+TOUCH_FLUSH_S          = 5
+
+# last access: τα hits μαζεύονται στη μνήμη και γράφονται batch από το background thread
+_accessed = {}
+_accessed_lock = threading.Lock()
+_started = False
+_start_lock = threading.Lock()
+_stats = {"runs": 0, "evicted": 0, "reclaimed_bytes": 0, "last_run": None, "last_reclaimed_bytes": 0}
+
+def init_db():
+    with get_conn() as con:
+        con.execute("""
+        CREATE TABLE IF NOT EXISTS retention_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            at REAL NOT NULL,
+            reason TEXT NOT NULL,         -- age / budget
+            evicted INTEGER NOT NULL,     -- outputs (ids)
+            files INTEGER NOT NULL,       -- blobs που σβήστηκαν από τον δίσκο
+            reclaimed_bytes INTEGER NOT NULL
+        )""")
+init_db()
+
+def record_access(*rel_paths):
+    """
+    rel_paths σχετικά με static/, π.χ. outputs/ab/cd/<sha>.jpg. Χωρίς DB εδώ.
+    Από after_request (hits στο /static/outputs) και από το gallery: οι σελίδες δείχνουν sprites και
+    ο browser κρατάει τα immutable outputs, άρα τα hits μόνα τους σχεδόν ποτέ δεν φτάνουν στον server.
+    """
+    now = time.time()
+    with _accessed_lock:
+        for p in rel_paths:
+            _accessed[p] = now
+
+def flush_access():
+    with _accessed_lock:
+        if not _accessed:
+            return 0
+        batch = dict(_accessed)
+        _accessed.clear()
+    touch_paths(batch)
+    return len(batch)
+
+# στήλη «τελευταία χρήση»: last_access ή, για παλιά rows, η ώρα δημιουργίας
+_LRU = "COALESCE(last_access, CAST(strftime('%s', created_at) AS REAL))"
+
+def usage():
+    with get_conn() as con:
+        r = con.execute("""SELECT COALESCE(SUM(bytes), 0) AS total FROM
+                             (SELECT path, MAX(COALESCE(bytes, 0)) AS bytes FROM outputs GROUP BY path)""").fetchone()
+        pinned = con.execute("SELECT COUNT(*) AS n FROM outputs WHERE pinned=1").fetchone()
+        count = con.execute("SELECT COUNT(*) AS n FROM outputs").fetchone()
+    return {"bytes": r["total"], "outputs": count["n"], "pinned": pinned["n"]}
+
+def _remove_files(paths):
+    files = freed = 0
+    for rel in paths:
+        p = os.path.join(STATIC_DIR, rel)
+        try:
+            size = os.path.getsize(p)
+            os.remove(p)
+        except FileNotFoundError:
+            continue
+        except OSError:
+            continue   # Windows: ανοιχτό αρχείο — το row έχει φύγει, θα το δει το επόμενο scan του gallery
+        files += 1
+        freed += size
+    return files, freed
+
+def _evict(ids, reason):
+    paths = delete_outputs(ids)
+    files, freed = _remove_files(paths)
+    with get_conn() as con:
+        con.execute("INSERT INTO retention_log (at, reason, evicted, files, reclaimed_bytes) VALUES (?, ?, ?, ?, ?)",
+                    (time.time(), reason, len(ids), files, freed))
+    _stats["evicted"] += len(ids)
+    _stats["reclaimed_bytes"] += freed
+    print(f"retention: {reason} evicted {len(ids)} outputs, {files} files, {freed} bytes")
+    return freed
+
+def run_once(max_bytes=None, max_age_days=None, batch=RETENTION_BATCH):
+    """
+    Ένα βήμα: πρώτα ό,τι είναι πιο παλιό από max_age, μετά LRU μέχρι να χωράμε στο budget.
+    Τα pinned δεν σβήνονται ποτέ. Επιστρέφει bytes που ελευθερώθηκαν.
+    """
+    max_bytes = RETENTION_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+    max_age_days = RETENTION_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    flush_access()
+    freed = 0
+
+    if max_age_days:
+        cutoff = time.time() - max_age_days * 86400
+        with get_conn() as con:
+            ids = [r["id"] for r in con.execute(
+                f"SELECT id FROM outputs WHERE pinned=0 AND {_LRU}<? ORDER BY {_LRU} LIMIT ?", (cutoff, batch))]
+        freed += _evict(ids, "age") if ids else 0
+
+    if max_bytes:
+        over = usage()["bytes"] - max_bytes
+        if over > 0:
+            ids, acc, seen = [], 0, set()
+            with get_conn() as con:
+                rows = con.execute(f"SELECT id, path, bytes FROM outputs WHERE pinned=0 ORDER BY {_LRU} LIMIT ?",
+                                   (batch,)).fetchall()
+            for r in rows:
+                ids.append(r["id"])
+                if r["path"] not in seen:
+                    seen.add(r["path"])
+                    acc += r["bytes"] or 0
+                if acc >= over:
+                    break
+            freed += _evict(ids, "budget") if ids else 0
+
+    _stats["runs"] += 1
+    _stats["last_run"] = time.time()
+    _stats["last_reclaimed_bytes"] = freed
+    return freed
+
+def _worker():
+    next_run = 0
+    while True:
+        try:
+            flush_access()
+            if time.time() >= next_run:
+                # όσο βρίσκει κάτι να σβήσει ξανατρέχει σύντομα· αλλιώς μέχρι το επόμενο interval
+                freed = run_once()
+                next_run = time.time() + (1 if freed else RETENTION_INTERVAL_S)
+        except Exception as e:
+            print("retention error:", e)
+            next_run = time.time() + RETENTION_INTERVAL_S
+        time.sleep(TOUCH_FLUSH_S)
+
+def start_retention():
+    """Ένα background thread ανά process."""
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        threading.Thread(target=_worker, name="retention", daemon=True).start()
+        _started = True
+
+def retention_stats():
+    with get_conn() as con:
+        total = con.execute("SELECT COALESCE(SUM(reclaimed_bytes), 0) AS b, COALESCE(SUM(evicted), 0) AS n "
+                            "FROM retention_log").fetchone()
+        recent = con.execute("SELECT * FROM retention_log ORDER BY id DESC LIMIT 10").fetchall()
+    return {"budget_bytes": RETENTION_MAX_MB * 1024 * 1024, "max_age_days": RETENTION_MAX_AGE_DAYS,
+            "usage": usage(), "process": dict(_stats),
+            "total_evicted": total["n"], "total_reclaimed_bytes": total["b"],
+            "recent": [dict(r) for r in recent]}
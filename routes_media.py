@@ -1,7 +1,24 @@
-import os, io, requests
+import os, re, uuid, time, functools, shutil, hashlib, tempfile, threading, zipfile
 from datetime import datetime
-from PIL import Image, ImageDraw, ImageFont
-from flask import Blueprint, render_template, request, redirect, url_for, current_app
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+from flask import (Blueprint, Response, render_template, request, redirect, url_for, current_app, jsonify,
+                   send_file, stream_with_context)
+from media_fetch import fetch_remote, get_thumb_cache, RemoteTooLarge
+from media_db import (record_output, set_pinned, create_bulk_job, update_bulk_item, finish_bulk_job,
+                      get_bulk_job, delete_bulk_jobs_before)
+from contact_sheet import build_sheet, load_sheet
+from http_cache import IMMUTABLE, ASSET_MAX_AGE_S
+from idempotency import run_once as run_idempotent, derive_key, InFlight, idempotency_stats
+from blob_store import file_digest
+from retention import start_retention, record_access, run_once, retention_stats
+from upload_queue import enqueue_upload, start_upload_workers, queue_stats
+from image_pipeline import (render_file, render_bytes, run_in_pool, warm_pool, pool_stats, in_pool_child, PoolBusy, MEDIA_POOL_WAIT_S,
+                            MEDIA_PROCESS_WORKERS,
+                            ImageTooLarge, RESAMPLE_PRESETS, DEFAULT_PRESET)
+from phash import find_renditions, hash_index, render_key, PHASH_DEDUPE
+from cse_search import search_many, split_queries, quota_status
+from encoders import available_encoders, parse_target, ENCODERS, DEFAULT_ENCODER
 
 media_bp = Blueprint("media", __name__)
 
@@ -10,6 +27,10 @@ BASE_DIR   = os.path.abspath(os.path.dirname(__file__))
 STATIC_DIR = os.path.join(BASE_DIR, "static")
 OUTPUT_DIR = os.path.join(STATIC_DIR, "outputs")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+# ιδιωτικό scratch (όχι κάτω από static/): uploads όσο γίνεται η επεξεργασία
+TMP_DIR    = os.path.join(BASE_DIR, "instance", "tmp")
+TMP_STALE_S = 6 * 3600   # ό,τι έμεινε από process που πέθανε στη μέση
+os.makedirs(TMP_DIR, exist_ok=True)
 
 # Aspect presets
 ASPECT_SIZES = {
@@ -36,53 +57,11 @@ CLOUDINARY_FOLDER = (os.getenv("CLOUDINARY_FOLDER") or "ai-content-studio-1").st
 if CLOUDINARY_URL:
     cloudinary.config(cloudinary_url=CLOUDINARY_URL)
 
-def add_watermark(pil_img, text="Sneakerness.eu", style="soft"):
-    if style == "none" or not text:
-        return pil_img
-    img = pil_img.convert("RGBA")
-    w, h = img.size
-    overlay = Image.new("RGBA", img.size, (0,0,0,0))
-    draw = ImageDraw.Draw(overlay)
-    try:
-        font = ImageFont.truetype("arial.ttf", max(18, w // 40))
-    except:
-        font = ImageFont.load_default()
-    bbox = draw.textbbox((0,0), text, font=font)
-    text_w, text_h = bbox[2], bbox[3]
-    pad = max(8, w // 200)
-    if style == "badge":
-        box_w = text_w + pad*3
-        box_h = text_h + pad*2
-        x1 = w - box_w - pad
-        y1 = h - box_h - pad
-        radius = max(10, box_h // 2)
-        draw.rounded_rectangle([x1, y1, x1+box_w, y1+box_h], radius=radius, fill=(0,0,0,120))
-        draw.text((x1 + pad*1.5, y1 + pad), text, font=font, fill=(255,255,255,230))
-    else:
-        x = w - text_w - pad
-        y = h - text_h - pad
-        draw.text((x+1, y+1), text, font=font, fill=(0,0,0,120))
-        draw.text((x, y), text, font=font, fill=(255,255,255,220))
-    return Image.alpha_composite(img, overlay).convert("RGB")
-
-def _pil_to_bytes(pil_img, fmt="jpg", quality=92):
-    buf = io.BytesIO()
-    fmt = (fmt or "jpg").lower()
-    if fmt in ("jpg","jpeg"):
-        if pil_img.mode != "RGB": pil_img = pil_img.convert("RGB")
-        pil_img.save(buf, format="JPEG", quality=quality)
-    else:
-        if pil_img.mode != "RGBA": pil_img = pil_img.convert("RGBA")
-        pil_img.save(buf, format="PNG")
-    buf.seek(0)
-    return buf
-
-def upload_pil_to_cloudinary(pil_img, public_id, fmt="jpg", tags=None):
+def upload_bytes_to_cloudinary(data, public_id, tags=None):
     if not CLOUDINARY_URL:
         return None
-    buf = _pil_to_bytes(pil_img, fmt=fmt, quality=92)
     res = cloudinary.uploader.upload(
-        buf,
+        data,
         folder=CLOUDINARY_FOLDER,
         public_id=public_id,
         overwrite=True,
@@ -91,65 +70,206 @@ def upload_pil_to_cloudinary(pil_img, public_id, fmt="jpg", tags=None):
     )
     return res.get("secure_url")
 
+# Τα uploads γίνονται από background workers (upload_queue), όχι μέσα στο request
+@media_bp.record_once
+def _start_uploads(state):
+    if CLOUDINARY_URL and not in_pool_child():   # όχι μέσα σε pool workers / forkserver
+        start_upload_workers(upload_bytes_to_cloudinary)
+
+def _register_output(public_id, out_path, kind, aspect, wm_style, group=None, info=None):
+    """Γράφει το output στο media.db και (αν υπάρχει Cloudinary) το βάζει στην ουρά upload."""
+    rel = os.path.relpath(out_path, STATIC_DIR).replace(os.sep, "/")
+    record_output(public_id, rel, kind, aspect, wm_style, group_id=group, info=info,
+                  upload_status="pending" if CLOUDINARY_URL else "local")
+    if CLOUDINARY_URL:
+        tags = [f"aspect:{aspect.replace(':', 'x')}", f"type:{kind}", f"wm:{wm_style}"]
+        if group: tags.append(f"group:{group}")
+        enqueue_upload(public_id, out_path, tags)
+
+# ---------- Renditions / αποθήκευση ----------
+def _parse_aspects(form):
+    """aspect=all → όλα τα ASPECT_SIZES, aspects=… (πολλαπλά) → υποσύνολο, αλλιώς το ένα aspect."""
+    picked = [a for a in form.getlist("aspects") if a in ASPECT_SIZES]
+    aspect = (form.get("aspect") or "1:1").strip()
+    if aspect == "all":
+        return list(ASPECT_SIZES.keys())
+    return picked or [aspect]
+
+def _parse_opts(data):
+    """Κοινές επιλογές pipeline από form ή JSON payload."""
+    try:
+        quality = int(data.get("quality") or 92)
+    except:
+        quality = 92
+    encoder = (data.get("encoder") or DEFAULT_ENCODER).strip()
+    return {
+        "wm_style": (data.get("wm_style") or "soft").strip(),
+        "quality":  quality,
+        "resample": (data.get("resample") or DEFAULT_PRESET).strip(),
+        "encoder":  encoder if encoder in available_encoders() else DEFAULT_ENCODER,
+        "target":   parse_target(data.get("target")),
+        "dedupe":   str(data.get("dedupe", "1")).lower() not in ("0", "false", "off"),
+    }
+
+def _public_id(kind, aspect, ts, group=None):
+    safe_aspect = aspect.replace(":", "x")
+    # group: κοινό prefix για renditions της ίδιας πηγής· χωρίς group, τυχαίο suffix ώστε
+    # δύο saves στο ίδιο δευτερόλεπτο να μην πατάνε το ίδιο id
+    return f"{kind}_{ts}_{group}_{safe_aspect}" if group else f"{kind}_{safe_aspect}_{ts}_{uuid.uuid4().hex[:4]}"
+
+def _reused_info(row, distance):
+    return {"path": os.path.join(STATIC_DIR, row["path"]), "bytes": row["bytes"] or 0, "saved_bytes": 0,
+            "encoder": row["encoder"], "quality": row["quality"], "reused": row["id"], "distance": distance}
+
+def _render_and_save(src_path, kind, aspects, opts, ts=None, group=None, wait=MEDIA_POOL_WAIT_S, src=None,
+                     background=False):
+    """
+    Ένα decode για όλα τα aspects στο process pool (render_file), αποθήκευση/upload ως group.
+    Στον worker πάει μόνο το path της πηγής· πίσω έρχονται paths + info, όχι pixels.
+    Το pHash βγαίνει επίσης στον worker, από το ίδιο decode: aspects που υπάρχουν ήδη για
+    (σχεδόν) ίδια εικόνα με το ίδιο watermark και τα ίδια encoder/quality/target/resample δεν ξαναγίνονται.
+    """
+    ts = ts or datetime.now().strftime("%Y%m%d_%H%M%S")
+    if group is None and len(aspects) > 1:
+        group = uuid.uuid4().hex[:6]
+    render = render_key(opts["encoder"], opts["quality"], opts["target"], opts["resample"])
+    reuse = (functools.partial(find_renditions, aspects, opts["wm_style"], render)
+             if PHASH_DEDUPE and opts.get("dedupe", True) else None)
+
+    out = run_in_pool(render_file, src_path, [ASPECT_SIZES.get(a) for a in aspects], opts["wm_style"], opts["quality"],
+                      opts["resample"], opts["encoder"], opts["target"], reuse, wait=wait, background=background)
+    res = []
+    for a, info in zip(aspects, out):
+        if info.get("reused"):
+            row = info["reused"]
+            print(f"reuse {row['id']} for {a} (pHash distance {info['distance']})")
+            res.append(_reused_info(row, info["distance"]))
+            continue
+        pid = _public_id(kind, a, ts, group)
+        # ένα encode: τα ίδια bytes στον δίσκο (atomic) και, από την ουρά, στο Cloudinary
+        _register_output(pid, info["path"], kind, a, opts["wm_style"], group=group, info=info)
+        if info.get("phash"):
+            hash_index.add(info["phash"], a, opts["wm_style"], render, pid, src)
+        print(f"saved {pid} → {os.path.basename(info['path'])}: {info['bytes']} bytes ({info['encoder']} q{info['quality']})"
+              + (f", saved {info['saved_bytes']} vs baseline JPEG" if info.get("baseline_bytes") else ""))
+        res.append(info)
+    return res
+
+def _spool_upload(f):
+    """Το uploaded stream σε ιδιωτικό temp file (TMP_DIR), ώστε ο worker process να το ανοίξει με path."""
+    fd, tmp = tempfile.mkstemp(dir=TMP_DIR, suffix=".upload")
+    with os.fdopen(fd, "wb") as out:
+        shutil.copyfileobj(f.stream, out, 1024 * 1024)
+    return tmp
+
+# Idempotency: double-click/retry του ίδιου upload/import → το αποτέλεσμα της πρώτης εκτέλεσης
+def _idem_key(kind, src, aspects, opts):
+    client = (request.headers.get("Idempotency-Key") or request.form.get("idempotency_key") or "").strip()[:200]
+    return derive_key(client, kind, src, aspects, opts["wm_style"], opts["quality"],
+                      opts["encoder"], opts["target"], opts["resample"])
+
+def _output_paths(infos):
+    return [os.path.relpath(i["path"], STATIC_DIR).replace(os.sep, "/") for i in infos]
+
+def _outputs_exist(paths):
+    return all(os.path.exists(os.path.join(STATIC_DIR, p)) for p in paths)
+
+def _replayed(resp, replayed):
+    if replayed:
+        resp.headers["Idempotent-Replayed"] = "true"
+    return resp
+
+# Retention: όριο χώρου/ηλικίας για τα outputs, LRU με βάση τα hits στο /static/outputs
+@media_bp.record_once
+def _start_retention(state):
+    if not in_pool_child():
+        start_retention()
+
+@media_bp.after_app_request
+def _track_output_access(resp):
+    if request.path.startswith("/static/outputs/") and resp.status_code in (200, 206, 304):
+        record_access(request.path[len("/static/"):])
+    return resp
+
+@media_bp.record_once
+def _sweep_tmp(state):
+    now = time.time()
+    for name in os.listdir(TMP_DIR):
+        p = os.path.join(TMP_DIR, name)
+        try:
+            if now - os.path.getmtime(p) < TMP_STALE_S:
+                continue
+            if os.path.isdir(p):
+                shutil.rmtree(p, ignore_errors=True)
+            else:
+                os.remove(p)
+        except OSError:
+            pass
+
+# Process pool: φόρτωση/ζέσταμα των workers στο background μόλις μπει το blueprint
+@media_bp.record_once
+def _warm_media_pool(state):
+    threading.Thread(target=warm_pool, name="media-pool-warm", daemon=True).start()
+
 # ---------- /upload ----------
+def _upload_page(error=None, src=""):
+    return render_template("upload.html",
+                           error=error, src=src, idem=uuid.uuid4().hex,
+                           aspects=list(ASPECT_SIZES.keys()), presets=ASPECT_PRESETS,
+                           resample_presets=list(RESAMPLE_PRESETS), resample=DEFAULT_PRESET,
+                           encoders=[(k, ENCODERS[k]["label"]) for k in available_encoders()],
+                           encoder=DEFAULT_ENCODER)
+
+@media_bp.app_errorhandler(413)
+def too_large(e):
+    # Το MAX_CONTENT_LENGTH (ή το όριο του route, π.χ. /media/batch) κόβει το upload πριν διαβαστεί το body
+    limit_mb = (request.max_content_length or current_app.config.get("MAX_CONTENT_LENGTH") or 0) // (1024 * 1024)
+    error = f"Το αρχείο είναι πολύ μεγάλο (όριο {limit_mb} MB)."
+    if request.endpoint == "media.upload":
+        return _upload_page(error=error), 413
+    return jsonify({"ok": False, "error": error, "limit_mb": limit_mb}), 413
+
 @media_bp.route("/upload", methods=["GET","POST"])
 def upload():
     error = None
     src_url = (request.args.get("src") or request.form.get("src") or "").strip()
     if request.method == "POST":
-        wm_style = (request.form.get("wm_style") or "soft").strip()
-        aspect  = (request.form.get("aspect") or "1:1").strip()
-        try:
-            quality = int(request.form.get("quality") or 92)
-        except:
-            quality = 92
+        aspects = _parse_aspects(request.form)
+        opts    = _parse_opts(request.form)
 
+        tmp = None
         try:
             if src_url:
-                r = requests.get(src_url, timeout=30)
-                r.raise_for_status()
-                img = Image.open(io.BytesIO(r.content)).convert("RGB")
+                key = _idem_key("upload", src_url, aspects, opts)
+                work = lambda: _output_paths(_render_and_save(fetch_remote(src_url, timeout=30).path, "upload",
+                                                              aspects, opts, src=src_url))
             else:
                 f = request.files.get("file")
                 if not f or not f.filename:
-                    error = "Διάλεξε αρχείο ή βάλε URL."
-                    return render_template("upload.html", error=error,
-                                           src=src_url, aspects=list(ASPECT_SIZES.keys()), presets=ASPECT_PRESETS)
-                img = Image.open(f.stream).convert("RGB")
-
-            if aspect in ASPECT_SIZES:
-                w, h = ASPECT_SIZES[aspect]
-                if img.size != (w, h):
-                    img = img.resize((w, h))
-
-            img = add_watermark(img, style=wm_style)
-
-            ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-            safe_aspect = aspect.replace(":", "x")
-            public_id = f"upload_{safe_aspect}_{ts}"
-
-            if CLOUDINARY_URL:
-                _ = upload_pil_to_cloudinary(
-                    img, public_id=public_id, fmt="jpg",
-                    tags=[f"aspect:{safe_aspect}", "type:upload", f"wm:{wm_style}"]
-                )
-
-            out_path = os.path.join(OUTPUT_DIR, f"{public_id}.jpg")
-            if img.mode != "RGB": img = img.convert("RGB")
-            img.save(out_path, quality=quality)
-
-            return redirect(url_for("gallery"))
+                    return _upload_page(error="Διάλεξε αρχείο ή βάλε URL.", src=src_url)
+                tmp = _spool_upload(f)
+                key = _idem_key("upload", file_digest(tmp), aspects, opts)
+                work = lambda: _output_paths(_render_and_save(tmp, "upload", aspects, opts, src=f.filename))
+
+            _, replayed = run_idempotent(key, work, valid=_outputs_exist)
+            return _replayed(redirect(url_for("gallery")), replayed)
+        except InFlight as e:
+            return _upload_page(error=f"{e}", src=src_url), 409
+        except PoolBusy as e:
+            return _upload_page(error=f"{e}", src=src_url), 503
         except Exception as e:
             error = f"{e}"
+        finally:
+            if tmp:
+                try: os.remove(tmp)
+                except OSError: pass
 
-    return render_template("upload.html",
-                           error=error, src=src_url,
-                           aspects=list(ASPECT_SIZES.keys()), presets=ASPECT_PRESETS)
+    return _upload_page(error=error, src=src_url)
 
 # ---------- /cse (Pro) ----------
 @media_bp.route("/cse", methods=["GET","POST"])
 def cse():
-    results, error, q = [], None, ""
+    results, error, q, meta = [], None, "", None
     # keys: προτίμησε app.config, αλλιώς .env
     key = current_app.config.get("GOOGLE_CSE_KEY") or os.getenv("GOOGLE_CSE_KEY") or ""
     cx  = current_app.config.get("GOOGLE_CSE_ID")  or os.getenv("GOOGLE_CSE_ID")  or ""
@@ -173,14 +293,6 @@ def cse():
             error = "Ρύθμισε GOOGLE_CSE_KEY και GOOGLE_CSE_ID στο .env"
         else:
             try:
-                params = {"key": key, "cx": cx, "q": q, "num": 10, "searchType": "image"}
-                if img_type: params["imgType"] = img_type
-                if img_size: params["imgSize"] = img_size
-                if safe:     params["safe"]    = safe
-
-                r = requests.get("https://www.googleapis.com/customsearch/v1", params=params, timeout=20)
-                data = r.json()
-
                 # Aspect filter
                 target_ratio = None
                 tol = 0.06
@@ -188,22 +300,26 @@ def cse():
                     tw, th = ASPECT_SIZES[aspect]
                     target_ratio = tw / th
 
-                for it in data.get("items", []):
+                def aspect_dev(it):
+                    # σχετική απόκλιση από το ζητούμενο aspect (0 = ακριβώς)
                     im = it.get("image", {}) or {}
-                    w = im.get("width")
-                    h = im.get("height")
-                    ok = True
+                    w, h = im.get("width"), im.get("height")
                     if target_ratio and w and h:
-                        ratio = float(w) / float(h)
-                        if abs(ratio - target_ratio) > target_ratio * tol:
-                            ok = False
-                    if ok:
-                        results.append({
-                            "title": it.get("title"),
-                            "link": it.get("link"),
-                            "thumbnail": im.get("thumbnailLink"),
-                            "width": w, "height": h
-                        })
+                        return abs(float(w) / float(h) - target_ratio) / target_ratio
+                    return 0.0
+
+                items, meta = search_many(key, cx, split_queries(q), img_type, img_size, safe,
+                                          accept=lambda it: aspect_dev(it) <= tol, rank=aspect_dev)
+                for it in items:
+                    im = it.get("image", {}) or {}
+                    results.append({
+                        "title": it.get("title"),
+                        "link": it.get("link"),
+                        "thumbnail": im.get("thumbnailLink"),
+                        "width": im.get("width"), "height": im.get("height"),
+                        "source": it["_source"],
+                        "queries": it["_queries"],
+                    })
             except Exception as e:
                 error = f"{e}"
 
@@ -211,48 +327,371 @@ def cse():
                            results=results, error=error, q=q,
                            aspect=aspect,
                            aspects=list(ASPECT_SIZES.keys()),
-                           img_type=img_type, img_size=img_size, safe=safe)
+                           img_type=img_type, img_size=img_size, safe=safe,
+                           meta=meta, quota=meta["quota"] if meta else quota_status(), idem=uuid.uuid4().hex,
+                           encoders=[(k, ENCODERS[k]["label"]) for k in available_encoders()], encoder=DEFAULT_ENCODER)
+
+# ---------- /media/thumb (proxy + cache για τα CSE thumbnails) ----------
+THUMB_MAX_AGE_S = int(os.getenv("THUMB_MAX_AGE_SECONDS") or 30 * 24 * 3600)
+# hosts (ή suffixes) που επιτρέπεται να κάνουμε proxy· "*" = όλοι
+THUMB_PROXY_HOSTS = [h.strip().lower() for h in
+                     (os.getenv("THUMB_PROXY_HOSTS") or "gstatic.com,googleusercontent.com").split(",") if h.strip()]
+
+def _thumb_allowed(url):
+    u = urlparse(url)
+    host = (u.hostname or "").lower()
+    if u.scheme not in ("http", "https") or not host:
+        return False
+    return "*" in THUMB_PROXY_HOSTS or any(host == h or host.endswith("." + h) for h in THUMB_PROXY_HOSTS)
+
+@media_bp.route("/media/thumb", methods=["GET"])
+def thumb():
+    url = (request.args.get("u") or "").strip()
+    if not _thumb_allowed(url):
+        return "thumbnail host not allowed", 403
+    try:
+        cached = get_thumb_cache().fetch(url, timeout=10)
+    except Exception:
+        return redirect(url)   # να φανεί έστω το original
+    if not cached.content_type.startswith("image/"):
+        return "not an image", 415
+    with open(cached.path, "rb") as f:
+        etag = hashlib.sha1(f.read()).hexdigest()[:20]
+    resp = send_file(cached.path, mimetype=cached.content_type, conditional=True, etag=etag,
+                     max_age=THUMB_MAX_AGE_S)
+    resp.cache_control.public = True
+    resp.cache_control.immutable = True
+    resp.headers["X-Cache"] = cached.status
+    return resp
 
 # ---------- /media/import (από CSE) ----------
 @media_bp.route("/media/import", methods=["POST"])
 def import_remote():
     src = (request.form.get("src") or "").strip()
-    aspect   = (request.form.get("aspect") or "1:1").strip()
-    wm_style = (request.form.get("wm_style") or "soft").strip()
-    try:
-        quality = int(request.form.get("quality") or 92)
-    except:
-        quality = 92
+    aspects  = _parse_aspects(request.form)
+    opts     = _parse_opts(request.form)
 
     if not src:
         return redirect(url_for("media.cse"))
 
     try:
-        r = requests.get(src, timeout=30)
-        r.raise_for_status()
-        img = Image.open(io.BytesIO(r.content)).convert("RGB")
-
-        if aspect in ASPECT_SIZES:
-            w, h = ASPECT_SIZES[aspect]
-            if img.size != (w, h):
-                img = img.resize((w, h))
-
-        img = add_watermark(img, style=wm_style)
-
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_aspect = aspect.replace(":", "x")
-        public_id = f"import_{safe_aspect}_{ts}"
-
-        if CLOUDINARY_URL:
-            _ = upload_pil_to_cloudinary(
-                img, public_id=public_id, fmt="jpg",
-                tags=[f"aspect:{safe_aspect}", "type:import", f"wm:{wm_style}"]
-            )
+        # το fetch μέσα στο idempotent κομμάτι: ένα διπλό submit δεν ξανακατεβάζει καν την εικόνα
+        work = lambda: _output_paths(_render_and_save(fetch_remote(src, timeout=30).path, "import", aspects, opts, src=src))
+        _, replayed = run_idempotent(_idem_key("import", src, aspects, opts), work, valid=_outputs_exist)
+        return _replayed(redirect(url_for("gallery")), replayed)
+    except InFlight as e:
+        return f"<pre>Import in progress: {e}</pre>", 409
+    except (RemoteTooLarge, ImageTooLarge) as e:
+        return f"<pre>Import rejected: {e}</pre>", 413
+    except PoolBusy as e:
+        return f"<pre>Import failed: {e}</pre>", 503
+    except Exception as e:
+        return f"<pre>Import failed: {e}</pre>", 500
 
-        out_path = os.path.join(OUTPUT_DIR, f"{public_id}.jpg")
-        if img.mode != "RGB": img = img.convert("RGB")
-        img.save(out_path, quality=quality)
+# ---------- /media/batch (ZIP ή πολλά αρχεία → ZIP, streamed) ----------
+# Μνήμη φραγμένη: η είσοδος είναι σε temp αρχεία, κάθε entry βγαίνει σε temp file μόνο όταν
+# μπαίνει στο pool, και το πολύ BATCH_WINDOW αποτελέσματα περιμένουν να γραφτούν στο response.
+# Στο pool μπαίνει ως background (MEDIA_POOL_BACKGROUND): τα /upload δεν περιμένουν πίσω από ένα batch.
+BATCH_WINDOW       = int(os.getenv("BATCH_WINDOW") or max(2, MEDIA_PROCESS_WORKERS * 2))
+BATCH_ENTRY_MAX_MB = int(os.getenv("BATCH_ENTRY_MAX_MB") or 50)
+BATCH_TOTAL_MAX_MB = int(os.getenv("BATCH_TOTAL_MAX_MB") or 2048)   # όλα τα entries μαζί, αποσυμπιεσμένα
+BATCH_MAX_MB       = int(os.getenv("BATCH_MAX_MB") or 1024)         # το request (ZIP/αρχεία), αντί για UPLOAD_MAX_MB
+BATCH_IMAGE_EXTS   = (".jpg", ".jpeg", ".png", ".webp", ".avif", ".bmp", ".gif", ".tif", ".tiff")
+
+_batch_io = ThreadPoolExecutor(max_workers=BATCH_WINDOW, thread_name_prefix="batch")
+
+class _ZipStream:
+    """Write-only «αρχείο» για το zipfile: ό,τι γράφεται το παίρνει ο generator και το στέλνει."""
+    def __init__(self):
+        self.chunks = []
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+    def flush(self):
+        pass
+    def drain(self):
+        out, self.chunks = b"".join(self.chunks), []
+        return out
+
+def _copy_capped(src, out, limit):
+    """copyfileobj που μετράει όσα γράφτηκαν πραγματικά· το file_size του ZIP header μπορεί να ψεύδεται."""
+    n = 0
+    for chunk in iter(lambda: src.read(1024 * 1024), b""):
+        n += len(chunk)
+        if n > limit:
+            raise RemoteTooLarge(f"πάνω από {limit} bytes")
+        out.write(chunk)
+    return n
+
+def _batch_sources(workdir, files):
+    """(όνομα, path) ανά εικόνα: τα uploads ως έχουν, τα ZIP ανοίγουν entry-entry (lazy)."""
+    entry_max, left = BATCH_ENTRY_MAX_MB * 1024 * 1024, BATCH_TOTAL_MAX_MB * 1024 * 1024
+    for name, path in files:
+        if not zipfile.is_zipfile(path):
+            yield name, path
+            continue
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                base = os.path.basename(info.filename)
+                if info.is_dir() or base.startswith(".") or "__MACOSX" in info.filename:
+                    continue
+                if not base.lower().endswith(BATCH_IMAGE_EXTS):
+                    continue
+                if info.file_size > entry_max:
+                    yield base, RemoteTooLarge(f"{info.file_size} bytes (όριο {BATCH_ENTRY_MAX_MB} MB)")
+                    continue
+                fd, tmp = tempfile.mkstemp(dir=workdir, suffix=os.path.splitext(base)[1])
+                try:
+                    with os.fdopen(fd, "wb") as out, zf.open(info) as src:
+                        left -= _copy_capped(src, out, min(entry_max, left))
+                except RemoteTooLarge:
+                    os.remove(tmp)
+                    if left < entry_max:   # γέμισε το συνολικό όριο: τέλος για όλο το batch
+                        yield info.filename, RemoteTooLarge(f"συνολικό όριο {BATCH_TOTAL_MAX_MB} MB αποσυμπιεσμένα, "
+                                                            "τα υπόλοιπα αρχεία παραλείφθηκαν")
+                        return
+                    yield info.filename, RemoteTooLarge(f"πάνω από {BATCH_ENTRY_MAX_MB} MB αποσυμπιεσμένο")
+                    continue
+                yield info.filename, tmp
+
+def _batch_render(path, sizes, opts):
+    try:
+        return run_in_pool(render_bytes, path, sizes, opts["wm_style"], opts["quality"],
+                           opts["resample"], opts["encoder"], opts["target"], wait=None, background=True)
+    finally:
+        try: os.remove(path)
+        except OSError: pass
+
+def _batch_stream(workdir, files, aspects, opts):
+    sizes = [ASPECT_SIZES.get(a) for a in aspects]
+    zs = _ZipStream()
+    zf = zipfile.ZipFile(zs, "w", zipfile.ZIP_STORED)   # JPEG/WebP δεν συμπιέζονται άλλο
+    errors, used, done = [], set(), 0
+    pending = {}
+
+    def emit(fu):
+        nonlocal done
+        name, path = pending.pop(fu)
+        try:
+            res = fu.result()
+        except Exception as e:
+            errors.append(f"{name}: " + f"{e}".replace(path, os.path.basename(name)))
+            return
+        stem = os.path.splitext(name.replace("\\", "/").replace("/", "_"))[0]
+        for a, (data, info) in zip(aspects, res):
+            arc = f"{stem}_{a.replace(':', 'x')}.{info['ext']}"
+            n = 1
+            while arc in used:
+                n += 1
+                arc = f"{stem}_{a.replace(':', 'x')}_{n}.{info['ext']}"
+            used.add(arc)
+            zf.writestr(arc, data)
+        done += 1
 
-        return redirect(url_for("gallery"))
+    try:
+        for name, path in _batch_sources(workdir, files):
+            if isinstance(path, Exception):
+                errors.append(f"{name}: {path}")
+                continue
+            pending[_batch_io.submit(_batch_render, path, sizes, opts)] = (name, path)
+            while len(pending) >= BATCH_WINDOW:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for fu in finished:
+                    emit(fu)
+                yield zs.drain()
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fu in finished:
+                emit(fu)
+            yield zs.drain()
+        if errors:
+            zf.writestr("errors.txt", "\n".join(errors) + "\n")
+        zf.close()
+        print(f"batch: {done} images × {len(aspects)} aspects, {len(errors)} errors")
+        yield zs.drain()
+    finally:
+        for fu in pending:
+            fu.cancel()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+@media_bp.route("/media/batch", methods=["POST"])
+def batch():
+    # ένας φάκελος φωτογραφιών ξεπερνάει εύκολα το app-wide MAX_CONTENT_LENGTH (UPLOAD_MAX_MB)·
+    # πριν διαβαστεί το form, αλλιώς το όριο έχει ήδη εφαρμοστεί
+    request.max_content_length = BATCH_MAX_MB * 1024 * 1024
+    uploads = [f for f in request.files.getlist("files") + request.files.getlist("file") if f and f.filename]
+    if not uploads:
+        return jsonify({"ok": False, "error": "Στείλε ZIP ή αρχεία εικόνων (files)."}), 400
+    aspects = _parse_aspects(request.form)
+    opts    = _parse_opts(request.form)
+
+    # τα request files κλείνουν στο τέλος του request· το stream συνεχίζει μετά, άρα δικά μας αντίγραφα,
+    # σε ιδιωτικό φάκελο (όχι κάτω από static/) που σβήνεται ό,τι κι αν γίνει
+    workdir = tempfile.mkdtemp(prefix="batch_", dir=TMP_DIR)
+    try:
+        files = []
+        for f in uploads:
+            fd, tmp = tempfile.mkstemp(dir=workdir, suffix=os.path.splitext(f.filename)[1])
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(f.stream, out, 1024 * 1024)
+            files.append((f.filename, tmp))
+
+        name = f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        resp = Response(stream_with_context(_batch_stream(workdir, files, aspects, opts)),
+                        mimetype="application/zip",
+                        headers={"Content-Disposition": f"attachment; filename={name}",
+                                 "Cache-Control": "no-store", "X-Accel-Buffering": "no"})
+    except BaseException:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
+    # και όταν ο client κλείσει πριν ξεκινήσει το stream (τότε το finally του generator δεν τρέχει)
+    resp.call_on_close(lambda: shutil.rmtree(workdir, ignore_errors=True))
+    return resp
+
+# ---------- /media/import_bulk (πολλά CSE αποτελέσματα μαζί) ----------
+# Downloads σε threads (I/O), decode/resize/watermark στο process pool, Cloudinary από την upload ουρά.
+BULK_IO_THREADS = int(os.getenv("BULK_IO_THREADS") or 8)
+BULK_MAX_ITEMS  = int(os.getenv("BULK_MAX_ITEMS") or 30)
+BULK_JOB_TTL_S  = 3600
+
+_bulk_io = ThreadPoolExecutor(max_workers=BULK_IO_THREADS, thread_name_prefix="bulk-io")
+# Η κατάσταση των jobs είναι στο media.db: το poll μπορεί να πέσει σε άλλον gunicorn worker.
+# Στη μνήμη μένουν μόνο όσα χρειάζεται ο worker που τα εκτελεί (aspects, opts).
+
+def _bulk_group(jid, i):
+    return f"{jid[:6]}{i:02d}"
+
+def _bulk_item(job, i, src):
+    t0 = time.perf_counter()
+    try:
+        update_bulk_item(job["id"], i, status="downloading")
+        cached = fetch_remote(src, timeout=30)
+
+        update_bulk_item(job["id"], i, status="processing")
+        # bulk jobs τρέχουν ήδη στο background: περιμένουν σειρά στο pool αντί για 503, και μέσα στο
+        # MEDIA_POOL_BACKGROUND (μαζί με τα batch), ώστε τα BULK_IO_THREADS να μη γεμίζουν την ουρά
+        res = _render_and_save(cached.path, "import", job["aspects"], job["opts"],
+                               ts=job["ts"], group=_bulk_group(job["id"], i), wait=None, src=src, background=True)
+        update_bulk_item(job["id"], i, status="done",
+                         paths=["/static/" + os.path.relpath(r["path"], STATIC_DIR).replace(os.sep, "/") for r in res],
+                         bytes=sum(r["bytes"] for r in res), saved_bytes=sum(r["saved_bytes"] for r in res),
+                         reused=sum(1 for r in res if r.get("reused")),
+                         elapsed_ms=int((time.perf_counter() - t0) * 1000))
     except Exception as e:
-        return f"<pre>Import failed: {e}</pre>", 500
+        update_bulk_item(job["id"], i, status="error", error=f"{e}",
+                         elapsed_ms=int((time.perf_counter() - t0) * 1000))
+
+def _bulk_snapshot(job_id):
+    found = get_bulk_job(job_id)
+    if not found:
+        return None
+    job, items = found
+    for i, it in enumerate(items):
+        it["group"] = _bulk_group(job_id, i)
+    finished = [it for it in items if it["status"] in ("done", "error")]
+    return {
+        "job": job_id, "aspect": job["aspect"], "wm_style": job["wm_style"],
+        "total": len(items), "finished": len(finished),
+        "done": sum(1 for it in items if it["status"] == "done"),
+        "errors": sum(1 for it in items if it["status"] == "error"),
+        "saved_bytes": sum(it.get("saved_bytes", 0) for it in items),
+        "reused": sum(it.get("reused", 0) for it in items),
+        "complete": len(finished) == len(items),
+        "elapsed_ms": int(((job["finished_at"] or time.time()) - job["created_at"]) * 1000),
+        "items": items,
+    }
+
+def _bulk_watch(job, futures):
+    for fu in futures:
+        fu.result()
+    finish_bulk_job(job["id"], time.time())
+
+@media_bp.route("/media/import_bulk", methods=["POST"])
+def import_bulk():
+    payload = request.get_json(silent=True) or {}
+    srcs = payload.get("srcs") or request.form.getlist("src")
+    aspect   = (payload.get("aspect") or request.form.get("aspect") or "1:1").strip()
+    aspects  = list(ASPECT_SIZES.keys()) if aspect == "all" else [aspect]
+    opts     = _parse_opts(payload or request.form)
+
+    srcs = list(dict.fromkeys(s.strip() for s in srcs if s and s.strip()))   # unique, με σειρά
+    if not srcs:
+        return jsonify({"ok": False, "error": "no src"}), 400
+    if len(srcs) > BULK_MAX_ITEMS:
+        return jsonify({"ok": False, "error": f"max {BULK_MAX_ITEMS} items"}), 400
+
+    now = time.time()
+    delete_bulk_jobs_before(now - BULK_JOB_TTL_S)
+
+    jid = uuid.uuid4().hex[:12]
+    job = {"id": jid, "aspects": aspects, "opts": opts, "ts": datetime.now().strftime("%Y%m%d_%H%M%S")}
+    create_bulk_job(jid, aspect, opts["wm_style"], srcs, now)
+    futures = [_bulk_io.submit(_bulk_item, job, i, s) for i, s in enumerate(srcs)]
+    threading.Thread(target=_bulk_watch, args=(job, futures), daemon=True).start()
+
+    snap = _bulk_snapshot(jid)
+    snap.update(ok=True, status_url=url_for("media.import_bulk_status", job_id=jid))
+    return jsonify(snap), 202
+
+@media_bp.route("/media/import_bulk/<job_id>", methods=["GET"])
+def import_bulk_status(job_id):
+    snap = _bulk_snapshot(job_id)
+    if not snap:
+        return jsonify({"ok": False, "error": "unknown job"}), 404
+    snap["ok"] = True
+    return jsonify(snap)
+
+@media_bp.route("/media/pool", methods=["GET"])
+def pool_status():
+    return jsonify({"ok": True, **pool_stats()})
+
+# ---------- Gallery contact sheets ----------
+@media_bp.route("/gallery/sprite/<key>.jpg", methods=["GET"])
+def gallery_sprite(key):
+    if not re.fullmatch(r"[0-9a-f]{16}", key):
+        return "bad key", 404
+    try:
+        path = run_in_pool(build_sheet, key)
+    except FileNotFoundError:
+        return "unknown sheet", 404   # το gallery.html πέφτει σε μεμονωμένα thumbnails
+    except PoolBusy as e:
+        return f"{e}", 503
+    # το key είναι hash των αρχείων της σελίδας: ίδιο URL = ίδιο περιεχόμενο για πάντα
+    resp = send_file(path, mimetype="image/jpeg", conditional=True, max_age=ASSET_MAX_AGE_S)
+    resp.headers["Cache-Control"] = IMMUTABLE
+    return resp
+
+@media_bp.route("/gallery/sprite/<key>.json", methods=["GET"])
+def gallery_sprite_map(key):
+    if not re.fullmatch(r"[0-9a-f]{16}", key):
+        return jsonify({"ok": False, "error": "bad key"}), 404
+    try:
+        sheet = load_sheet(key)
+    except FileNotFoundError:
+        return jsonify({"ok": False, "error": "unknown sheet"}), 404
+    resp = jsonify({"ok": True, "sprite": url_for("media.gallery_sprite", key=key), **sheet})
+    resp.headers["Cache-Control"] = IMMUTABLE
+    return resp
+
+@media_bp.route("/media/pin/<output_id>", methods=["POST"])
+def pin_output(output_id):
+    pinned = (request.form.get("pin") or request.args.get("pin") or "1") != "0"
+    if not set_pinned(output_id, pinned):
+        return jsonify({"ok": False, "error": "unknown output"}), 404
+    if request.is_json or request.accept_mimetypes.best == "application/json":
+        return jsonify({"ok": True, "id": output_id, "pinned": pinned})
+    return redirect(request.referrer or url_for("gallery"))
+
+@media_bp.route("/media/retention", methods=["GET", "POST"])
+def retention_status():
+    # POST: ένα βήμα τώρα (π.χ. μετά από αλλαγή budget) αντί να περιμένουμε το interval
+    reclaimed = run_once() if request.method == "POST" else None
+    return jsonify({"ok": True, "reclaimed_bytes": reclaimed, **retention_stats()})
+
+@media_bp.route("/media/idempotency", methods=["GET"])
+def idempotency_status():
+    return jsonify(idempotency_stats())
+
+@media_bp.route("/media/uploads", methods=["GET"])
+def uploads_status():
+    return jsonify({"ok": True, "cloudinary": bool(CLOUDINARY_URL), **queue_stats()})
@@ -1,7 +1,8 @@
 # routes_snippets.py
 import os, sqlite3, io, csv
 from datetime import datetime
-from flask import Blueprint, render_template, request, jsonify, send_file, make_response, current_app
+from flask import Blueprint, render_template, request, jsonify, send_file, current_app
+from http_cache import send_bytes
 
 snip_bp = Blueprint("snip", __name__)
 
@@ -162,10 +163,7 @@ def export_csv():
     w.writerow(["id","created_at","platform","lang","kind","text","tags"])
     for r in rows:
         w.writerow([r["id"], r["created_at"], r["platform"], r["lang"], r["kind"], r["text"], r["tags"]])
-    resp = make_response(buf.getvalue())
-    resp.headers["Content-Type"] = "text/csv; charset=utf-8"
-    resp.headers["Content-Disposition"] = "attachment; filename=snippets_export.csv"
-    return resp
+    return send_bytes(buf.getvalue(), "text/csv; charset=utf-8", download_name="snippets_export.csv")
 
 @snip_bp.route("/snippets/export.txt", methods=["GET"])
 def export_txt():
@@ -191,12 +189,9 @@ def export_txt():
     for r in rows:
         lines.append(r["text"])
     txt = "\n\n".join(lines)
-    resp = make_response(txt)
-    resp.headers["Content-Type"] = "text/plain; charset=utf-8"
-    resp.headers["Content-Disposition"] = "attachment; filename=snippets_export.txt"
-    return resp
+    return send_bytes(txt, "text/plain; charset=utf-8", download_name="snippets_export.txt")
 
 @snip_bp.route("/snippets/backup", methods=["GET"])
 def backup_db():
-    # Κατεβάζει ΑΥΤΟ το sqlite db όπως είναι
-    return send_file(DB_PATH, as_attachment=True, download_name="snippets.db")
+    # Κατεβάζει ΑΥΤΟ το sqlite db όπως είναι (ETag/Last-Modified από το αρχείο, Range για resume)
+    return send_file(DB_PATH, as_attachment=True, download_name="snippets.db", conditional=True, max_age=0)
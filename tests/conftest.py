@@ -0,0 +1,42 @@
+# Κοινά fixtures: κάθε test με δικό του media.db σε tmp, ώστε να μην αγγίζει το instance/
+import os, sys, threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+os.environ.setdefault("MEDIA_POOL_ENABLED", "0")   # PIL δουλειά inline, χωρίς process pool στα tests
+
+@pytest.fixture
+def media_db(tmp_path, monkeypatch):
+    import media_db as mdb
+    monkeypatch.setattr(mdb, "DB_PATH", str(tmp_path / "media.db"))
+    mdb.init_db()
+    return mdb
+
+@pytest.fixture
+def media_app(media_db, tmp_path, monkeypatch):
+    """Flask app μόνο με το media blueprint, χωρίς background threads (retention, pool warm-up)."""
+    from flask import Flask
+    import routes_media
+    monkeypatch.setattr(routes_media, "start_retention", lambda: None)
+    monkeypatch.setattr(routes_media, "warm_pool", lambda: [])
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+    monkeypatch.setattr(routes_media, "TMP_DIR", str(scratch))
+    app = Flask("test_media", template_folder=os.path.join(ROOT, "templates"))
+    app.register_blueprint(routes_media.media_bp)
+    return app
+
+@pytest.fixture
+def small_pool(monkeypatch):
+    """«Process pool» με threads και 2 θέσεις, από τις οποίες το background παίρνει το πολύ 1."""
+    import image_pipeline as ip
+    pool = ThreadPoolExecutor(max_workers=4)
+    monkeypatch.setattr(ip, "MEDIA_POOL_ENABLED", True)
+    monkeypatch.setattr(ip, "get_process_pool", lambda: pool)
+    monkeypatch.setattr(ip, "_slots", threading.BoundedSemaphore(2))
+    monkeypatch.setattr(ip, "_bg_slots", threading.BoundedSemaphore(1))
+    yield ip
+    pool.shutdown(wait=True)
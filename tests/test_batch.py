@@ -0,0 +1,123 @@
+# /media/batch: ZIP/εικόνες μέσα → ZIP έξω, με ιδιωτικό scratch και όρια
+import io, os, time, threading, zipfile
+import pytest
+from PIL import Image
+
+import routes_media
+
+def _jpeg(w=320, h=240, color=(200, 30, 30)):
+    buf = io.BytesIO()
+    Image.new("RGB", (w, h), color).save(buf, "JPEG")
+    return buf.getvalue()
+
+def _zip(entries):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for name, data in entries.items():
+            zf.writestr(name, data)
+    buf.seek(0)
+    return buf
+
+@pytest.fixture
+def client(media_app):
+    return media_app.test_client()
+
+def _post(client, *files, **form):
+    data = {"aspect": "1:1", **form, "files": [(f, n) for n, f in files]}
+    return client.post("/media/batch", data=data, content_type="multipart/form-data")
+
+def test_batch_zip_in_zip_out(client):
+    r = _post(client, ("shots.zip", _zip({"a.jpg": _jpeg(), "dir/b.jpg": _jpeg(color=(0, 0, 255)),
+                                           "notes.txt": b"skip me"})))
+    assert r.status_code == 200 and r.mimetype == "application/zip"
+    names = zipfile.ZipFile(io.BytesIO(r.data)).namelist()
+    assert sorted(names) == ["a_1x1.jpg", "dir_b_1x1.jpg"]
+    r.close()
+    assert os.listdir(routes_media.TMP_DIR) == []   # το scratch καθάρισε
+    assert not any(n.startswith("batch_") for n in os.listdir(routes_media.OUTPUT_DIR))
+
+def test_copy_capped_counts_real_bytes():
+    out = io.BytesIO()
+    assert routes_media._copy_capped(io.BytesIO(b"x" * 10), out, 10) == 10
+    with pytest.raises(routes_media.RemoteTooLarge):
+        routes_media._copy_capped(io.BytesIO(b"x" * 11), io.BytesIO(), 10)
+
+def test_batch_total_extracted_cap(client, monkeypatch):
+    monkeypatch.setattr(routes_media, "BATCH_TOTAL_MAX_MB", 1)
+    filler = b"\0" * (700 * 1024)   # συμπιέζεται σε λίγα KB
+    r = _post(client, ("bomb.zip", _zip({"a.jpg": _jpeg(), "b.jpg": filler, "c.jpg": filler, "d.jpg": _jpeg()})))
+    zf = zipfile.ZipFile(io.BytesIO(r.data))
+    errors = zf.read("errors.txt").decode("utf-8")
+    assert "c.jpg: συνολικό όριο 1 MB" in errors
+    assert "d.jpg" not in errors and "a_1x1.jpg" in zf.namelist()
+    assert not any(n.startswith("d_") for n in zf.namelist())
+    r.close()
+    assert os.listdir(routes_media.TMP_DIR) == []
+
+def test_batch_entry_cap(client, monkeypatch):
+    monkeypatch.setattr(routes_media, "BATCH_ENTRY_MAX_MB", 1)
+    r = _post(client, ("big.zip", _zip({"big.jpg": b"\0" * (2 * 1024 * 1024), "ok.jpg": _jpeg()})))
+    zf = zipfile.ZipFile(io.BytesIO(r.data))
+    assert "big.jpg" in zf.read("errors.txt").decode("utf-8")
+    assert "ok_1x1.jpg" in zf.namelist()
+    r.close()
+
+def test_batch_has_its_own_request_limit(media_app, monkeypatch):
+    media_app.config["MAX_CONTENT_LENGTH"] = 64 * 1024   # app-wide (UPLOAD_MAX_MB)
+    client = media_app.test_client()
+    big = _jpeg(1200, 900)
+    noise = Image.effect_noise((600, 600), 80).convert("RGB")
+    buf = io.BytesIO()
+    noise.save(buf, "JPEG", quality=95)
+    assert len(buf.getvalue()) > 64 * 1024
+    buf.seek(0)
+    r = _post(client, ("noise.jpg", buf), ("big.jpg", io.BytesIO(big)))
+    assert r.status_code == 200 and "noise_1x1.jpg" in zipfile.ZipFile(io.BytesIO(r.data)).namelist()
+    r.close()
+    # τα άλλα routes κρατάνε το app-wide όριο, και παίρνουν JSON (όχι τη σελίδα του /upload)
+    r = client.post("/media/import_bulk", data={"src": "x" * (65 * 1024)})
+    assert r.status_code == 413 and r.json["limit_mb"] == 0
+
+    monkeypatch.setattr(routes_media, "BATCH_MAX_MB", 0)
+    r = client.post("/media/batch", data={"files": [(io.BytesIO(b"x" * 2048), "a.jpg")]},
+                    content_type="multipart/form-data")
+    assert r.status_code == 413 and r.is_json
+    assert r.json["ok"] is False and r.json["limit_mb"] == 0
+
+def test_upload_not_starved_by_batch(media_app, small_pool, tmp_path, monkeypatch):
+    import idempotency
+    idempotency.init_db()
+    media_app.add_url_rule("/gallery", "gallery", lambda: "gallery")
+    monkeypatch.setattr(routes_media, "_upload_page", lambda error=None, src="": (f"{error}", 599))
+    entered, gate = threading.Event(), threading.Event()
+
+    def slow_render_bytes(path, sizes, *a):
+        entered.set()
+        gate.wait(10)
+        return [(b"data", {"ext": "jpg"}) for _ in sizes]
+
+    out = tmp_path / "out.jpg"
+    out.write_bytes(b"jpeg")
+    fake_info = {"path": str(out), "bytes": 4, "saved_bytes": 0, "encoder": "jpeg", "quality": 92}
+    monkeypatch.setattr(routes_media, "render_bytes", slow_render_bytes)
+    monkeypatch.setattr(routes_media, "render_file", lambda path, sizes, *a: [dict(fake_info) for _ in sizes])
+
+    result = {}
+    def run_batch():
+        r = _post(media_app.test_client(), *((f"{n}.jpg", io.BytesIO(_jpeg())) for n in "abcd"))
+        result["batch"] = (r.status_code, zipfile.ZipFile(io.BytesIO(r.data)).namelist())
+    t = threading.Thread(target=run_batch)
+    t.start()
+    try:
+        assert entered.wait(10)   # το batch τρέχει και περιμένει σειρά για τα υπόλοιπα
+        t0 = time.perf_counter()
+        r = media_app.test_client().post("/upload", data={"aspect": "1:1", "file": (io.BytesIO(_jpeg()), "u.jpg")},
+                                         content_type="multipart/form-data")
+        assert r.status_code == 302, r.data
+        assert time.perf_counter() - t0 < 5
+        assert small_pool.pool_stats()["rejected"] == 0
+    finally:
+        gate.set()
+        t.join(20)
+    status, names = result["batch"]
+    assert status == 200 and sorted(names) == [f"{n}_1x1.jpg" for n in "abcd"]
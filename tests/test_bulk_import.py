@@ -0,0 +1,46 @@
+# /media/import_bulk: jobs στο media.db, render στο pool μέσα στο όριο του background
+import threading, time
+from types import SimpleNamespace
+import pytest
+
+import routes_media
+
+@pytest.fixture
+def bulk(media_app, small_pool, tmp_path, monkeypatch):
+    """fetch_remote/render_file χωρίς δίκτυο και PIL· μετράει πόσα renders τρέχουν ταυτόχρονα."""
+    state = {"now": 0, "max": 0}
+    lock = threading.Lock()
+    src = tmp_path / "src.jpg"
+    src.write_bytes(b"jpeg")
+
+    def render_file(path, sizes, *a):
+        with lock:
+            state["now"] += 1
+            state["max"] = max(state["max"], state["now"])
+        time.sleep(0.05)
+        with lock:
+            state["now"] -= 1
+        return [{"path": str(src), "bytes": 4, "saved_bytes": 0, "encoder": "jpeg", "quality": 92} for _ in sizes]
+
+    monkeypatch.setattr(routes_media, "fetch_remote", lambda url, timeout=None: SimpleNamespace(path=str(src)))
+    monkeypatch.setattr(routes_media, "render_file", render_file)
+    return media_app.test_client(), state
+
+def _wait_complete(client, url, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        snap = client.get(url).json
+        if snap["complete"]:
+            return snap
+        time.sleep(0.05)
+    raise AssertionError("bulk job did not finish")
+
+def test_bulk_import_stays_within_background_slots(bulk, small_pool):
+    client, state = bulk
+    srcs = [f"https://img.example/{i}.jpg" for i in range(6)]
+    r = client.post("/media/import_bulk", json={"srcs": srcs, "aspect": "1:1", "dedupe": False})
+    assert r.status_code == 202 and r.json["total"] == 6
+    snap = _wait_complete(client, r.json["status_url"])
+    assert snap["done"] == 6 and snap["errors"] == 0
+    assert state["max"] == 1   # MEDIA_POOL_BACKGROUND=1: η άλλη θέση μένει για τα /upload
+    assert small_pool.pool_stats()["rejected"] == 0
@@ -0,0 +1,92 @@
+# app.generate_caption_variants: πάνω από PACKED_MAX_VARIANTS → πολλές packed κλήσεις, κανένα variant δεν χάνεται
+import json, re, threading, time
+from types import SimpleNamespace
+import pytest
+
+import app
+
+def _lists(key):
+    return {"hooks": [f"hook {key}"], "captions": [f"caption {key}"], "ctas": ["go"], "hashtags": ["tag"]}
+
+@pytest.fixture
+def packed(monkeypatch):
+    """Fake _complete: απαντά για όσα keys ζητάει το prompt, εκτός από όσα είναι στο `drop`."""
+    calls, drop, lock = [], set(), threading.Lock()
+
+    def fake_complete(user, model, read_timeout=None, est_output=800):
+        keys = re.findall(r'^- "([^"|]+\|[^"]+)":', user, flags=re.MULTILINE)
+        with lock:
+            calls.append(keys)
+        body = {k: _lists(k) for k in keys if k not in drop}
+        return json.dumps(body), SimpleNamespace(prompt_tokens=100, completion_tokens=50 * len(keys)), 0.1 * len(calls)
+
+    monkeypatch.setattr(app, "_complete", fake_complete)
+    monkeypatch.setattr(app, "PACKED_MAX_VARIANTS", 2)
+    monkeypatch.setattr(app, "generate_captions",
+                        lambda topic, n, platform, kind, lang, tone, *a: _lists(app.variant_key(tone, lang)))
+    return calls, drop
+
+VARIANTS = [("fun", "el"), ("calm", "el"), ("bold", "el"), ("fun", "en"), ("calm", "en")]
+
+def test_variants_are_split_into_packed_calls(packed):
+    calls, _ = packed
+    results, report = app.generate_caption_variants("coffee", VARIANTS + [("fun", "el")])
+    assert sorted(len(c) for c in calls) == [1, 2, 2]
+    assert sorted(k for c in calls for k in c) == sorted(app.variant_key(t, l) for t, l in VARIANTS)
+    assert set(results) == {app.variant_key(t, l) for t, l in VARIANTS}
+    assert report["variants"] == 5 and report["packed_calls"] == 3 and report["fallback"] == []
+    assert report["prompt_tokens"] == 300 and report["completion_tokens"] == 250
+    assert report["error"] is None
+
+def test_missing_variant_falls_back_alone(packed):
+    calls, drop = packed
+    drop.add("bold|el")
+    results, report = app.generate_caption_variants("coffee", VARIANTS)
+    assert report["fallback"] == ["bold|el"]
+    assert results["bold|el"]["captions"] == ["caption bold|el"]
+    assert len(results) == 5
+
+def test_single_chunk_stays_one_call(packed):
+    calls, _ = packed
+    results, report = app.generate_caption_variants("coffee", VARIANTS[:2])
+    assert len(calls) == 1 and report["packed_calls"] == 1 and len(results) == 2
+
+# ---------- _within_budget: cancel σε timeout, τοπικό όταν η ουρά είναι βαθιά ----------
+
+@pytest.fixture
+def budget(monkeypatch):
+    monkeypatch.setattr(app, "_llm_pool", app.ThreadPoolExecutor(max_workers=1))
+    monkeypatch.setattr(app, "_late", {})
+    monkeypatch.setattr(app, "_llm_inflight", 0)
+    yield
+    app._llm_pool.shutdown(wait=True)
+
+def test_budget_timeout_cancels_queued_call(budget):
+    gate, ran = threading.Event(), []
+    app._llm_pool.submit(gate.wait)   # ο μόνος worker πιασμένος: η επόμενη κλήση μένει στην ουρά
+    res, source, note = app._within_budget("k", lambda: ran.append(1) or "llm", lambda: "local", 50)
+    assert (res, source) == ("local", "local") and "50 ms" in note
+    gate.set()
+    app._llm_pool.shutdown(wait=True)
+    assert ran == [] and "k" not in app._late and app._llm_inflight == 0
+
+def test_budget_late_result_is_kept(budget):
+    gate = threading.Event()
+    res, source, _ = app._within_budget("k", lambda: gate.wait() and "late", lambda: "local", 50)
+    assert source == "local"
+    gate.set()
+    app._llm_pool.shutdown(wait=True)
+    assert app._within_budget("k", lambda: "new", lambda: "local", 50)[:2] == ("late", "llm")
+
+def test_deep_queue_goes_local(budget, monkeypatch):
+    monkeypatch.setattr(app, "CAPTIONS_LLM_QUEUE_MAX", 1)
+    gate, ran = threading.Event(), []
+    assert app._within_budget("a", gate.wait, lambda: "local", 20)[1] == "local"   # κρατάει 1 slot
+    res, source, note = app._within_budget("b", lambda: ran.append(1), lambda: "local", 1000)
+    assert (res, source) == ("local", "local") and "φορτωμένο" in note and ran == []
+    gate.set()
+    deadline = time.time() + 2
+    while app._llm_inflight and time.time() < deadline:
+        time.sleep(0.01)
+    assert app._llm_inflight == 0
+    assert app._within_budget("c", lambda: "ok", lambda: "local", 1000)[:2] == ("ok", "llm")
@@ -0,0 +1,30 @@
+# encoders.encode_output: το «bytes saved» απέναντι στο JPEG q92 (baseline)
+from PIL import Image
+import pytest
+
+import encoders
+
+@pytest.fixture
+def img():
+    return Image.effect_noise((256, 256), 40).convert("RGB")
+
+def test_default_jpeg_is_its_own_baseline(img):
+    _, info = encoders.encode_output(img, "jpeg", 92)
+    assert info["baseline_bytes"] == info["bytes"] and info["saved_bytes"] == 0
+
+def test_target_mode_always_measures_baseline(img, monkeypatch):
+    monkeypatch.setattr(encoders, "BASELINE_SAMPLE", 0)
+    _, info = encoders.encode_output(img, "jpeg", 92, target=("ssim", 0.9))
+    assert info["quality"] < 92 and info["score"] >= 0.9
+    assert info["baseline_bytes"] and info["saved_bytes"] == info["baseline_bytes"] - info["bytes"] > 0
+
+def test_sampled_baseline(img, monkeypatch):
+    monkeypatch.setattr(encoders, "BASELINE_SAMPLE", 1)
+    _, info = encoders.encode_output(img, "jpeg", 70)
+    assert info["saved_bytes"] == info["baseline_bytes"] - info["bytes"] > 0
+
+    monkeypatch.setattr(encoders, "BASELINE_SAMPLE", 0)
+    _, info = encoders.encode_output(img, "jpeg", 70)
+    assert info["baseline_bytes"] is None and info["saved_bytes"] == 0
+    _, info = encoders.encode_output(img, "jpeg", 70, baseline=True)
+    assert info["baseline_bytes"] is not None
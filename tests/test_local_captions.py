@@ -0,0 +1,27 @@
+# local_captions.generate_local: offline fallback, χωρίς snippets.db
+import pytest
+
+import local_captions as lc
+
+@pytest.fixture(autouse=True)
+def no_snippets(tmp_path, monkeypatch):
+    monkeypatch.setattr(lc, "SNIPPETS_DB", str(tmp_path / "missing.db"))
+
+@pytest.mark.parametrize("lang", ["el", "en"])
+def test_no_keywords_does_not_repeat_topic(lang):
+    out = lc.generate_local("Retro sneakers", n=6, lang=lang, keywords="", want_emojis=False)
+    assert len(out["hooks"]) == 3 and len(out["captions"]) == 6 and len(out["ctas"]) == 3
+    for line in out["hooks"] + out["captions"] + out["ctas"]:
+        assert line.lower().count("retro sneakers") <= 1, line
+        assert "{" not in line
+    assert len(set(out["captions"])) == 6
+
+def test_keywords_are_woven_in():
+    out = lc.generate_local("Retro sneakers", n=6, lang="en", keywords="suede, vintage")
+    text = " ".join(out["hooks"] + out["captions"]).lower()
+    assert "suede" in text or "vintage" in text
+    assert out["hashtags"][:3] == ["retrosneakers", "suede", "vintage"]
+
+def test_stable_for_same_input():
+    args = dict(topic="Retro sneakers", n=4, lang="el", tone="luxury")
+    assert lc.generate_local(**args) == lc.generate_local(**args)
@@ -0,0 +1,16 @@
+# migrate_outputs._guess: kind/aspect από τα παλιά flat ονόματα αρχείων
+import pytest
+
+from migrate_outputs import _guess
+
+@pytest.mark.parametrize("stem, expected", [
+    ("upload_1x1_20250101_120000", ("upload", "1:1")),
+    ("upload_9x16_20250101_120000_ab12", ("upload", "9:16")),
+    ("import_20250101_120000_ab12cd_16x9", ("import", "16:9")),
+    ("import_20250101_120000_ab12cd_Facebook", ("import", "Facebook")),
+    ("upload_Pinterest_20250101_120000_0f3a", ("upload", "Pinterest")),
+    ("photo_2x3", ("legacy", "")),
+    ("holiday", ("legacy", "")),
+])
+def test_guess(stem, expected):
+    assert _guess(stem) == expected
@@ -0,0 +1,124 @@
+# openai_client απέναντι σε τοπικό stub του OpenAI API (OPENAI_BASE_URL): keep-alive, stats, timeouts, warm-up
+import json, time, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import openai
+import pytest
+
+import openai_client as oc
+
+def _completion(content="{}"):
+    return {"id": "chatcmpl-stub", "object": "chat.completion", "created": 0, "model": "stub",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}}
+
+class _Stub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1   # ένα handler ανά TCP σύνδεση
+
+    def _json(self, obj):
+        body = json.dumps(obj).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.requests.append(("GET", self.path))
+        if self.path.endswith("/models"):
+            return self._json({"object": "list", "data": [{"id": "stub", "object": "model", "created": 0,
+                                                           "owned_by": "test"}]})
+        self.send_error(404)
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(("POST", self.path))
+        if payload.get("model") == "slow":
+            time.sleep(1.0)
+        self._json(_completion())
+
+@pytest.fixture
+def stub(monkeypatch):
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Stub)
+    srv.connections, srv.requests = 0, []
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    monkeypatch.setattr(oc, "OPENAI_BASE_URL", f"http://127.0.0.1:{srv.server_address[1]}/v1")
+    monkeypatch.setattr(oc, "_stats", {**oc._stats, "requests": 0, "errors": 0, "latency_ms_total": 0.0,
+                                       "connects": 0, "tls_handshakes": 0, "http_versions": {},
+                                       "warmup_ms": None, "warmup_error": None})
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+def _ask(client, model="stub", **kw):
+    return client.chat.completions.create(model=model, messages=[{"role": "user", "content": "hi"}], **kw)
+
+def test_keepalive_reuse_and_pool_stats(stub):
+    client = oc.make_openai_client("sk-test")
+    for _ in range(3):
+        assert _ask(client).choices[0].message.content == "{}"
+
+    assert stub.connections == 1
+    s = oc.pool_stats(client)
+    assert s["requests"] == 3 and s["errors"] == 0
+    assert s["connects"] == 1 and s["keepalive_reused"] == 2 and s["tls_handshakes"] == 0
+    assert s["http_versions"] == {"HTTP/1.1": 3}
+    assert s["avg_latency_ms"] is not None and s["config"]["base_url"] == oc.OPENAI_BASE_URL
+    # ιδιωτικό path του httpcore pool: αν σπάσει σε νέα έκδοση, εδώ θα φανεί
+    assert s["connections"] == {"open": 1, "idle": 1, "active": 0, "http2": 0}
+    client.close()
+
+def test_pool_connections_missing_internals():
+    class Opaque:
+        _client = object()
+    assert oc._pool_connections(Opaque()) is None
+
+def test_read_timeout(stub):
+    client = oc.make_openai_client("sk-test").with_options(max_retries=0)
+    t = oc.make_timeout(read=0.2)
+    assert (t.connect, t.read, t.write, t.pool) == (oc.OPENAI_CONNECT_TIMEOUT, 0.2,
+                                                     oc.OPENAI_WRITE_TIMEOUT, oc.OPENAI_POOL_TIMEOUT)
+    t0 = time.perf_counter()
+    with pytest.raises(openai.APITimeoutError):
+        _ask(client, model="slow", timeout=t)
+    assert time.perf_counter() - t0 < 0.9
+    assert _ask(client, timeout=t).choices   # η επόμενη κλήση δουλεύει κανονικά
+
+def test_warm_up(stub):
+    client = oc.make_openai_client("sk-test")
+    oc.warm_up(client)
+    assert stub.requests == [("GET", "/v1/models")]
+    assert oc._stats["warmup_ms"] is not None and oc._stats["warmup_error"] is None
+    _ask(client)
+    assert stub.connections == 1   # η πρώτη πραγματική κλήση βρίσκει τη σύνδεση ζεστή
+    assert oc.pool_stats(client)["keepalive_reused"] == 1
+
+def test_warm_up_records_errors(stub, monkeypatch):
+    monkeypatch.setattr(oc, "OPENAI_BASE_URL", "http://127.0.0.1:9/v1")   # κανείς δεν ακούει
+    oc.warm_up(oc.make_openai_client("sk-test"))
+    assert oc._stats["warmup_ms"] is None and oc._stats["warmup_error"]
+
+def test_start_warm_up_respects_flag(stub, monkeypatch):
+    monkeypatch.setattr(oc, "OPENAI_WARMUP", False)
+    oc.start_warm_up(oc.make_openai_client("sk-test"))
+    time.sleep(0.2)
+    assert stub.requests == []
+
+def test_async_client_counts_connections(stub):
+    import asyncio
+
+    async def run():
+        client = oc.make_async_openai_client("sk-test")
+        for _ in range(2):
+            await client.chat.completions.create(model="stub", messages=[{"role": "user", "content": "hi"}])
+        await client.close()
+
+    asyncio.run(run())
+    s = oc.pool_stats(None)
+    assert s["requests"] == 2 and s["connects"] == 1 and s["keepalive_reused"] == 1
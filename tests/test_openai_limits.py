@@ -0,0 +1,91 @@
+# openai_limits: retries σε transient σφάλματα μέσα από τον limiter (όχι από το SDK), με fake client
+import asyncio
+from types import SimpleNamespace
+import httpx
+import openai
+import pytest
+
+import openai_limits as ol
+
+def _status_error(cls, status, headers=None):
+    req = httpx.Request("POST", "https://api.example/v1/chat/completions")
+    return cls("boom", response=httpx.Response(status, headers=headers, request=req), body=None)
+
+def _ok():
+    resp = SimpleNamespace(usage=SimpleNamespace(total_tokens=42), choices=["ok"])
+    return SimpleNamespace(parse=lambda: resp, headers={})
+
+class FakeClient:
+    """Το μέρος του OpenAI client που αγγίζει το create_completion· τα outcomes παίζονται με τη σειρά."""
+    def __init__(self, *outcomes, is_async=False):
+        self.outcomes, self.calls, self.options = list(outcomes), 0, []
+        create = self._acreate if is_async else self._create
+        self.chat = SimpleNamespace(completions=SimpleNamespace(with_raw_response=SimpleNamespace(create=create)))
+
+    def with_options(self, **kw):
+        self.options.append(kw)
+        return self
+
+    def _create(self, **kwargs):
+        self.calls += 1
+        out = self.outcomes.pop(0)
+        if isinstance(out, Exception):
+            raise out
+        return out
+
+    async def _acreate(self, **kwargs):
+        return self._create(**kwargs)
+
+@pytest.fixture
+def limits(tmp_path, monkeypatch):
+    monkeypatch.setattr(ol, "DB_PATH", str(tmp_path / "limits.db"))
+    monkeypatch.setattr(ol, "OPENAI_LIMITS_ENABLED", True)
+    monkeypatch.setattr(ol, "OPENAI_MAX_RETRIES", 2)
+    monkeypatch.setattr(ol, "RETRY_BASE_S", 0.01)
+    ol.init_db()
+    return ol
+
+MSG = [{"role": "user", "content": "hi"}]
+
+def test_transient_errors_are_retried(limits):
+    client = FakeClient(_status_error(openai.InternalServerError, 500),
+                        openai.APITimeoutError(request=httpx.Request("POST", "https://api.example")), _ok())
+    resp = ol.create_completion(client, queue_s=1, model="m", messages=MSG)
+    assert resp.choices == ["ok"] and client.calls == 3
+    assert client.options == [{"max_retries": 0}]
+    s = ol.limits_stats()
+    # οι αποτυχίες δεν μεγαλώνουν το AIMD όριο ούτε μετράνε ως ok, και δεν αφήνουν slot πιασμένο
+    assert s["ok"] == 1 and s["inflight"] == 0 and s["throttled"] == 0
+
+def test_retries_stop_at_max(limits):
+    client = FakeClient(*[_status_error(openai.InternalServerError, 503) for _ in range(3)])
+    with pytest.raises(openai.InternalServerError):
+        ol.create_completion(client, queue_s=1, model="m", messages=MSG)
+    assert client.calls == 3   # 1 + OPENAI_MAX_RETRIES
+    assert ol.limits_stats()["inflight"] == 0
+
+def test_client_errors_are_not_retried(limits):
+    client = FakeClient(_status_error(openai.BadRequestError, 400), _ok())
+    with pytest.raises(openai.BadRequestError):
+        ol.create_completion(client, queue_s=1, model="m", messages=MSG)
+    assert client.calls == 1
+
+def test_failed_release_keeps_concurrency(limits):
+    before = ol.limits_stats()["concurrency"]
+    lease = ol.acquire(100, deadline=ol.time.time() + 1)
+    ol.release(lease, 100, 0, failed=True)
+    s = ol.limits_stats()
+    assert s["concurrency"] == before and s["ok"] == 0 and s["inflight"] == 0
+
+def test_retry_delay(limits):
+    e = _status_error(openai.InternalServerError, 502, {"retry-after": "0.25"})
+    assert ol._retry_delay(e, 0) == 0.25
+    assert ol._retry_delay(e, 2) is None
+    assert ol._retry_delay(_status_error(openai.ConflictError, 409), 1) <= 0.02
+    assert ol._retry_delay(ValueError("bug"), 0) is None
+
+def test_async_retry(limits):
+    client = FakeClient(_status_error(openai.InternalServerError, 500), _ok(), is_async=True)
+    resp = asyncio.run(ol.acreate_completion(client, queue_s=1, model="m", messages=MSG))
+    assert resp.choices == ["ok"] and client.calls == 2
+    assert ol.limits_stats()["inflight"] == 0
@@ -0,0 +1,44 @@
+# phash: near-duplicate reuse μόνο για output με ίδιο aspect, watermark και format (render_key)
+from PIL import Image, ImageDraw
+import pytest
+
+import phash
+
+def _img(shift=0):
+    im = Image.new("RGB", (512, 384), (240, 240, 240))
+    d = ImageDraw.Draw(im)
+    d.rectangle((60 + shift, 60, 260 + shift, 300), fill=(200, 30, 30))
+    d.ellipse((300, 100, 460, 260), fill=(30, 30, 200))
+    return im
+
+@pytest.fixture
+def index(media_db, monkeypatch):
+    idx = phash.HashIndex()
+    monkeypatch.setattr(phash, "hash_index", idx)
+    monkeypatch.setattr(phash, "_output_exists", lambda row: True)
+    return idx
+
+WEBP = phash.render_key("webp", 92, None, "balanced")
+JPEG_SSIM = phash.render_key("jpeg", 92, ("ssim", 0.98), "balanced")
+
+def test_render_key():
+    assert WEBP == "webp|q92|-|balanced"
+    assert JPEG_SSIM == "jpeg|q92|ssim:0.98|balanced"
+
+def test_reuse_needs_same_render(index, media_db):
+    media_db.record_output("out_webp", "outputs/a.webp", "upload", "1:1", "soft", info={"encoder": "webp"})
+    h = phash.image_hash(_img())
+    index.add(h, "1:1", "soft", WEBP, "out_webp")
+
+    h2, hits = phash.find_renditions(["1:1", "16:9"], "soft", WEBP, _img(shift=4))
+    assert phash.hamming(int(h, 16), int(h2, 16)) <= phash.PHASH_MAX_DISTANCE
+    assert list(hits) == [0] and hits[0]["reused"]["id"] == "out_webp"
+
+    # ίδια εικόνα, αλλά JPEG με target SSIM: όχι το υπάρχον WebP
+    assert phash.find_renditions(["1:1"], "soft", JPEG_SSIM, _img())[1] == {}
+    assert phash.find_renditions(["1:1"], "badge", WEBP, _img())[1] == {}
+
+def test_legacy_rows_without_render_are_not_reused(index, media_db):
+    media_db.record_output("old", "outputs/old.jpg", "upload", "1:1", "soft")
+    media_db.add_source_hash(phash.image_hash(_img()), "1:1", "soft", "old")
+    assert phash.find_renditions(["1:1"], "soft", WEBP, _img())[1] == {}
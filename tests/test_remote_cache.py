@@ -0,0 +1,138 @@
+# media_fetch.RemoteCache και /media/thumb απέναντι σε τοπικό HTTP server (ETag, Last-Modified, όρια, LRU)
+import os, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+import routes_media
+from media_fetch import RemoteCache, RemoteTooLarge
+
+LAST_MODIFIED = "Wed, 01 Jan 2025 00:00:00 GMT"
+BODY = b"\xff\xd8" + b"x" * 98   # 100 bytes «JPEG»
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b"", headers=None, length=True):
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        if length:
+            self.send_header("Content-Length", str(len(body)))
+        else:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.hits.append((self.path, dict(self.headers)))
+        path = self.path.split("?")[0]
+        if path == "/etag.jpg":
+            if self.headers.get("If-None-Match") == '"v1"':
+                return self._send(304, headers={"ETag": '"v1"', "Cache-Control": "max-age=0"})
+            return self._send(200, BODY, {"Content-Type": "image/jpeg", "ETag": '"v1"', "Cache-Control": "max-age=0"})
+        if path == "/lm.jpg":
+            if self.headers.get("If-Modified-Since") == LAST_MODIFIED:
+                return self._send(304, headers={"Cache-Control": "max-age=0"})
+            return self._send(200, BODY, {"Content-Type": "image/jpeg", "Last-Modified": LAST_MODIFIED,
+                                          "Cache-Control": "max-age=0"})
+        if path.startswith("/fresh"):
+            return self._send(200, BODY, {"Content-Type": "image/jpeg", "Cache-Control": "max-age=3600"})
+        if path == "/big.jpg":   # δηλωμένο Content-Length πάνω από το όριο
+            return self._send(200, b"x" * 2000, {"Content-Type": "image/jpeg"})
+        if path == "/stream.jpg":   # χωρίς Content-Length: το όριο πιάνεται στο stream
+            return self._send(200, b"x" * 2000, {"Content-Type": "image/jpeg"}, length=False)
+        if path == "/page.html":
+            return self._send(200, b"<html></html>", {"Content-Type": "text/html"})
+        self._send(404)
+
+@pytest.fixture(scope="module")
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    srv.hits = []
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+
+@pytest.fixture
+def base(server):
+    server.hits.clear()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+@pytest.fixture
+def cache(tmp_path):
+    return RemoteCache(str(tmp_path / "cache"), max_bytes=10_000, fresh_seconds=0, max_item_bytes=1000)
+
+def test_miss_then_hit(cache, base, server):
+    first = cache.fetch(f"{base}/fresh.jpg")
+    assert first.status == "miss" and first.size == len(BODY)
+    assert first.content_type == "image/jpeg"
+    with open(first.path, "rb") as f:
+        assert f.read() == BODY
+    second = cache.fetch(f"{base}/fresh.jpg")
+    assert second.status == "hit" and second.path == first.path
+    assert len(server.hits) == 1   # το hit δεν πάει στον server
+
+def test_revalidate_with_etag(cache, base, server):
+    assert cache.fetch(f"{base}/etag.jpg").status == "miss"
+    again = cache.fetch(f"{base}/etag.jpg")
+    assert again.status == "revalidated" and again.size == len(BODY)
+    assert server.hits[-1][1].get("If-None-Match") == '"v1"'
+    with open(again.path, "rb") as f:
+        assert f.read() == BODY
+
+def test_revalidate_with_last_modified(cache, base, server):
+    assert cache.fetch(f"{base}/lm.jpg").status == "miss"
+    again = cache.fetch(f"{base}/lm.jpg")
+    assert again.status == "revalidated"
+    headers = server.hits[-1][1]
+    assert headers.get("If-Modified-Since") == LAST_MODIFIED
+    assert "If-None-Match" not in headers
+
+@pytest.mark.parametrize("path", ["/big.jpg", "/stream.jpg"])
+def test_too_large(cache, base, path):
+    with pytest.raises(RemoteTooLarge):
+        cache.fetch(f"{base}{path}")
+    assert cache.lookup(f"{base}{path}") is None
+    assert [p for p in os.listdir(cache.root) if p.endswith((".part", ".bin"))] == []
+
+def test_lru_eviction(tmp_path, base):
+    small = RemoteCache(str(tmp_path / "lru"), max_bytes=300, fresh_seconds=3600)   # χωράνε 3 × 100 bytes
+    a, b, c, d = (f"{base}/fresh-{n}.jpg" for n in "abcd")
+    for url in (a, b, c):
+        assert small.fetch(url).status == "miss"
+    assert small.fetch(a).status == "hit"   # το a γίνεται το πιο πρόσφατο, το b το πιο παλιό
+
+    assert small.fetch(d).status == "miss"
+    assert small.lookup(b) is None
+    assert all(small.lookup(u) is not None for u in (a, c, d))
+    assert len([p for p in os.listdir(small.root) if p.endswith(".bin")]) == 3
+    with small._conn() as con:
+        assert con.execute("SELECT SUM(size) FROM entries").fetchone()[0] <= 300
+
+@pytest.fixture
+def thumb_client(media_app, cache, monkeypatch):
+    monkeypatch.setattr(routes_media, "THUMB_PROXY_HOSTS", ["127.0.0.1"])
+    monkeypatch.setattr(routes_media, "get_thumb_cache", lambda: cache)
+    return media_app.test_client()
+
+def test_thumb_route(thumb_client, base):
+    r = thumb_client.get("/media/thumb", query_string={"u": f"{base}/etag.jpg"})
+    assert r.status_code == 200 and r.data == BODY
+    assert r.headers["X-Cache"] == "miss" and r.mimetype == "image/jpeg"
+    assert "immutable" in r.headers["Cache-Control"]
+
+    r2 = thumb_client.get("/media/thumb", query_string={"u": f"{base}/etag.jpg"})
+    assert r2.headers["X-Cache"] == "revalidated"
+    r3 = thumb_client.get("/media/thumb", query_string={"u": f"{base}/etag.jpg"},
+                          headers={"If-None-Match": r.headers["ETag"]})
+    assert r3.status_code == 304
+
+def test_thumb_route_rejects(thumb_client, base):
+    assert thumb_client.get("/media/thumb", query_string={"u": "http://example.com/a.jpg"}).status_code == 403
+    assert thumb_client.get("/media/thumb", query_string={"u": f"{base}/page.html"}).status_code == 415
+    # too large / σφάλμα: redirect στο original
+    r = thumb_client.get("/media/thumb", query_string={"u": f"{base}/big.jpg"})
+    assert r.status_code == 302 and r.location == f"{base}/big.jpg"
@@ -0,0 +1,41 @@
+# retention: pinned outputs και LRU με βάση τα accesses (και από το gallery)
+import time
+import retention
+
+def _out(media_db, oid, size=100, created="2025-01-01T00:00:00"):
+    media_db.record_output(oid, f"outputs/{oid}.jpg", "upload", "1:1", "soft",
+                           info={"bytes": size, "created_at": created})
+    with media_db.get_conn() as con:   # όπως παλιά rows: μόνο η ώρα δημιουργίας μετράει
+        con.execute("UPDATE outputs SET last_access=NULL WHERE id=?", (oid,))
+
+def test_record_output_keeps_pinned(media_db):
+    _out(media_db, "a")
+    assert media_db.set_pinned("a", True) == 1
+    media_db.record_output("a", "outputs/a2.jpg", "upload", "1:1", "soft", info={"bytes": 5})
+    row = media_db.get_output("a")
+    assert row["pinned"] == 1
+    assert row["path"] == "outputs/a2.jpg" and row["bytes"] == 5
+
+def test_access_orders_lru_eviction(media_db, monkeypatch):
+    monkeypatch.setattr(retention, "_accessed", {})
+    retention.init_db()
+    _out(media_db, "old", created="2025-01-01T00:00:00")
+    _out(media_db, "new", created="2025-06-01T00:00:00")
+    _out(media_db, "kept", created="2024-01-01T00:00:00")
+    media_db.set_pinned("kept", True)
+
+    retention.record_access("outputs/old.jpg")   # π.χ. το gallery έδειξε τη σελίδα του
+    assert retention.flush_access() == 1
+    assert media_db.get_output("old")["last_access"] >= time.time() - 5
+
+    retention.run_once(max_bytes=200, max_age_days=0)   # 300 bytes, budget 200: φεύγει ένα
+    assert media_db.get_output("new") is None
+    assert media_db.get_output("old") is not None and media_db.get_output("kept") is not None
+
+def test_retention_is_off_by_default(media_db, monkeypatch):
+    monkeypatch.setattr(retention, "_accessed", {})
+    retention.init_db()
+    assert retention.RETENTION_MAX_MB == 0 and retention.RETENTION_MAX_AGE_DAYS == 0
+    _out(media_db, "old", size=10**9, created="2020-01-01T00:00:00")
+    assert retention.run_once() == 0
+    assert media_db.get_output("old") is not None
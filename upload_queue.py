@@ -0,0 +1,116 @@
+# upload_queue.py — persistent (sqlite) ουρά για Cloudinary uploads, workers σε background threads
+import os, time, random, threading
+from datetime import datetime
+from cloudinary.exceptions import BadRequest, NotFound, AlreadyExists
+from media_db import get_conn, set_upload_status
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name) or default)
+    except ValueError:
+        return default
+
+UPLOAD_WORKERS      = _env_int("CLOUDINARY_UPLOAD_WORKERS", 2)
+UPLOAD_MAX_ATTEMPTS = _env_int("CLOUDINARY_UPLOAD_MAX_ATTEMPTS", 6)
+BACKOFF_BASE_S      = 2      # 2, 4, 8, 16, 32 … (+jitter)
+BACKOFF_MAX_S       = 600
+LEASE_S             = 300    # αν ένας worker πεθάνει στη μέση, το job ξαναπιάνεται μετά από τόσο
+# σφάλματα που δεν διορθώνονται με retry: λείπει το αρχείο, 400/404/409 από το Cloudinary (π.χ. «Invalid image file»).
+# 420 (RateLimited), 5xx, σφάλματα δικτύου/parse και 401/403 (ρυθμίσεις που μπορεί να διορθωθούν) ξαναδοκιμάζονται.
+PERMANENT_ERRORS    = (FileNotFoundError, BadRequest, NotFound, AlreadyExists)
+
+_wakeup = threading.Event()
+_started = False
+_start_lock = threading.Lock()
+_upload_fn = None
+
+def enqueue_upload(output_id, file_path, tags=None):
+    with get_conn() as con:
+        con.execute("""INSERT INTO upload_queue (output_id, file_path, tags, status, next_attempt_at, created_at)
+                       VALUES (?, ?, ?, 'pending', ?, ?)""",
+                    (output_id, file_path, ",".join(tags or []), time.time(),
+                     datetime.now().isoformat(timespec="seconds")))
+    set_upload_status(output_id, "pending")
+    _wakeup.set()
+
+def _claim():
+    """Παίρνει ατομικά το επόμενο due job (ασφαλές και ανάμεσα σε gunicorn workers)."""
+    now = time.time()
+    con = get_conn()
+    con.isolation_level = None
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        row = con.execute("""SELECT * FROM upload_queue
+                             WHERE (status='pending' AND next_attempt_at<=?)
+                                OR (status='running' AND locked_until<?)
+                             ORDER BY next_attempt_at LIMIT 1""", (now, now)).fetchone()
+        if row:
+            con.execute("UPDATE upload_queue SET status='running', locked_until=? WHERE id=?",
+                        (now + LEASE_S, row["id"]))
+        con.execute("COMMIT")
+        return row
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    finally:
+        con.close()
+
+def _backoff(attempts):
+    return min(BACKOFF_MAX_S, BACKOFF_BASE_S * (2 ** (attempts - 1))) * random.uniform(0.8, 1.2)
+
+def _run_one(row):
+    set_upload_status(row["output_id"], "uploading")
+    try:
+        with open(row["file_path"], "rb") as f:
+            data = f.read()
+        url = _upload_fn(data, row["output_id"], [t for t in (row["tags"] or "").split(",") if t])
+    except Exception as e:
+        attempts = row["attempts"] + 1
+        final = attempts >= UPLOAD_MAX_ATTEMPTS or isinstance(e, PERMANENT_ERRORS)
+        with get_conn() as con:
+            con.execute("""UPDATE upload_queue SET status=?, attempts=?, next_attempt_at=?, locked_until=NULL,
+                           last_error=? WHERE id=?""",
+                        ("failed" if final else "pending", attempts, time.time() + _backoff(attempts),
+                         f"{e}"[:500], row["id"]))
+        set_upload_status(row["output_id"], "failed" if final else "pending")
+        print(f"Cloudinary upload {row['output_id']} attempt {attempts} failed: {e}")
+        return
+    with get_conn() as con:
+        con.execute("UPDATE upload_queue SET status='done', attempts=attempts+1, locked_until=NULL WHERE id=?",
+                    (row["id"],))
+    set_upload_status(row["output_id"], "done", cloud_url=url)
+
+def _worker():
+    while True:
+        try:
+            row = _claim()
+        except Exception as e:
+            print("upload_queue claim error:", e)
+            row = None
+        if row:
+            try:
+                _run_one(row)
+            except Exception as e:
+                print("upload_queue worker error:", e)   # το lease θα το ξαναδώσει αργότερα
+            continue
+        _wakeup.wait(timeout=1.0)
+        _wakeup.clear()
+
+def start_upload_workers(upload_fn):
+    """upload_fn(data: bytes, public_id, tags) -> url. Ξεκινάει μία φορά ανά process."""
+    global _started, _upload_fn
+    with _start_lock:
+        if _started:
+            return
+        _upload_fn = upload_fn
+        for i in range(max(1, UPLOAD_WORKERS)):
+            threading.Thread(target=_worker, name=f"cloudinary-upload-{i}", daemon=True).start()
+        _started = True
+
+def queue_stats():
+    with get_conn() as con:
+        rows = con.execute("SELECT status, COUNT(*) AS n FROM upload_queue GROUP BY status").fetchall()
+        failed = con.execute("""SELECT output_id, attempts, last_error FROM upload_queue
+                                WHERE status='failed' ORDER BY id DESC LIMIT 20""").fetchall()
+    return {"counts": {r["status"]: r["n"] for r in rows},
+            "recent_failures": [dict(r) for r in failed]}
@@ -0,0 +1,66 @@
+# watermark.py — watermark engine: cached fonts, pre-rendered tiles, composite μόνο στη γωνία
+import os, threading
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+
+WATERMARK_TEXT = os.getenv("WATERMARK_TEXT") or "Sneakerness.eu"
+WATERMARK_FONT = os.getenv("WATERMARK_FONT") or "arial.ttf"
+
+_font_lock = threading.Lock()
+
+@lru_cache(maxsize=64)
+def get_font(size, name=WATERMARK_FONT):
+    # το truetype() διαβάζει/κάνει parse το .ttf από τον δίσκο — μία φορά ανά size
+    with _font_lock:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            return ImageFont.load_default()
+
+@lru_cache(maxsize=256)
+def watermark_tile(text, style, width):
+    """
+    Pre-rendered RGBA tile για (text, style, πλάτος εικόνας) + η θέση του μετρημένη από την
+    κάτω-δεξιά γωνία. Ίδια γεωμετρία με το παλιό full-frame overlay.
+    """
+    font = get_font(max(18, width // 40))
+    bbox = ImageDraw.Draw(Image.new("RGBA", (1, 1))).textbbox((0, 0), text, font=font)
+    text_w, text_h = bbox[2], bbox[3]
+    pad = max(8, width // 200)
+    if style == "badge":
+        box_w = text_w + pad*3
+        box_h = text_h + pad*2
+        tile = Image.new("RGBA", (box_w + pad, box_h + pad), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(tile)
+        radius = max(10, box_h // 2)
+        draw.rounded_rectangle([0, 0, box_w, box_h], radius=radius, fill=(0, 0, 0, 120))
+        draw.text((pad*1.5, pad), text, font=font, fill=(255, 255, 255, 230))
+    else:
+        tile = Image.new("RGBA", (text_w + pad, text_h + pad), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(tile)
+        draw.text((1, 1), text, font=font, fill=(0, 0, 0, 120))
+        draw.text((0, 0), text, font=font, fill=(255, 255, 255, 220))
+    return tile
+
+def add_watermark(pil_img, text=WATERMARK_TEXT, style="soft", inplace=False):
+    """
+    Composite μόνο του bounding box του watermark πάνω στην RGB εικόνα.
+    inplace=True: ο caller δίνει εικόνα που του ανήκει (π.χ. φρέσκο resize) και γλιτώνουμε το copy.
+    """
+    if style == "none" or not text:
+        return pil_img
+    if pil_img.mode != "RGB":
+        img = pil_img.convert("RGB")
+    else:
+        img = pil_img if inplace else pil_img.copy()
+    w, h = img.size
+    tile = watermark_tile(text, style, w)
+    x, y = w - tile.width, h - tile.height
+    if x < 0 or y < 0:
+        # εικόνα μικρότερη από το tile: κόβουμε το tile (κρατάμε την κάτω-δεξιά γωνία)
+        tile = tile.crop((max(0, -x), max(0, -y), tile.width, tile.height))
+        x, y = max(0, x), max(0, y)
+    box = (x, y, x + tile.width, y + tile.height)
+    region = Image.alpha_composite(img.crop(box).convert("RGBA"), tile).convert("RGB")
+    img.paste(region, box)
+    return img